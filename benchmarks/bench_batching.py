@@ -0,0 +1,67 @@
+"""
+Consultas por segundo del motor de búsqueda con micro-lotes frente a una
+consulta por pasada (EMBEDDING_BATCH_SIZE=1), con 1, 8 y 64 hilos consultando
+al mismo tiempo. Requiere el índice generado por `preprocess_files.py`.
+
+    python benchmarks/bench_batching.py --queries-per-caller 20
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from services.retrieval_engine import RetrievalEngine
+
+QUERIES = [
+    "Quiero empezar a diseñar un programa",
+    "juegos para la Manada sobre la Flor Roja",
+    "actividad de nudos para Tropa",
+    "insignia Kon-tiki para Comunidad",
+    "cómo organizar un consejo de patrulla",
+    "juego de observación con brújula",
+    "reflexión final sobre la ley scout",
+    "actividades en el agua seguras",
+]
+
+
+def measure(engine: RetrievalEngine, callers: int, queries_per_caller: int) -> float:
+    def caller(offset: int):
+        for i in range(queries_per_caller):
+            engine.search(QUERIES[(offset + i) % len(QUERIES)] + f" {offset}-{i}")
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return callers * queries_per_caller / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries-per-caller", type=int, default=20)
+    parser.add_argument("--callers", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    per_call = RetrievalEngine(batch_size=1)
+    batched = RetrievalEngine(batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms)
+    for engine in (per_call, batched):
+        if not engine.warmup():
+            sys.exit(f"No se pudo cargar el motor de búsqueda: {engine.error}")
+        engine.search(QUERIES[0])  # calentamiento del modelo
+
+    print(f"{'hilos':>6} {'una por pasada (q/s)':>22} {'micro-lotes (q/s)':>19}")
+    for callers in args.callers:
+        single = measure(per_call, callers, args.queries_per_caller)
+        grouped = measure(batched, callers, args.queries_per_caller)
+        print(f"{callers:>6} {single:>22.1f} {grouped:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
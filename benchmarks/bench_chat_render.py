@@ -0,0 +1,146 @@
+"""
+Bytes enviados por el websocket de Flet y tiempo del servidor por acción en una
+conversación larga, y al volver a /chat (Flet reenvía la vista completa), con
+`ChatView` actual (ventana de mensajes y una actualización por acción) y con el
+esquema anterior (todos los mensajes como controles y un `page.update()` por cada
+mensaje agregado).
+
+Usa la página sin cliente de `fake_flet.py` y respuestas fijas en lugar del modelo,
+así que el tiempo es solo el del servidor (calcular y serializar los cambios); el
+del navegador crece con los controles vivos, que también se reportan.
+
+    python benchmarks/bench_chat_render.py --messages 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("API_KEY", "stub")
+
+from fake_flet import RecordingConnection, create_page
+
+RESPONSE = """### Programa: Orientación con brújula (Tropa, 2 horas)
+
+**Territorios:** Corporalidad y Creatividad. **Insignia:** Jaguar.
+
+| Hora | Actividad | Tipo | Materiales |
+|------|-----------|------|------------|
+| 0:00 | Apertura: oración, revisión del equipo de bolsillo | Apertura | Ninguno |
+| 0:15 | Juego de la serpiente | Desfogue | Paliacates |
+| 0:30 | Rumbos y azimuts por patrullas | Técnica | Brújulas, hojas |
+| 0:45 | Carrera de relevos con consignas | Desfogue | Conos |
+| 1:00 | Recorrido con balizas | Habilidad | Balizas, mapa |
+
+> Recuerda ajustar los tiempos si llueve.
+"""
+DELTAS = 12
+
+
+class CannedController:
+    """Sustituye a `ChatController`: responde siempre el mismo texto, en varios deltas."""
+    async def stream_ai_response(self, user_prompt: str):
+        size = len(RESPONSE) // DELTAS + 1
+        for start in range(0, len(RESPONSE), size):
+            yield RESPONSE[start:start + size]
+
+    def clear(self):
+        pass
+
+
+def legacy_view_class():
+    from components.message_component import ChatMessage
+    from models.chat_model import Message
+    from views.chat_view import ChatView
+
+    class LegacyChatView(ChatView):
+        """Esquema anterior: sin ventana y con una actualización por mensaje agregado."""
+        def add_message(self, msg_type: str, user_name: str, text: str) -> ChatMessage:
+            chat_message = ChatMessage(Message(user_name=user_name, text=text, message_type=msg_type))
+            self.chat_list.controls.append(chat_message)
+            self.page.update()
+            return chat_message
+
+        async def send_message_click(self, e):
+            user_message = self.new_message_field.value
+            self.new_message_field.value = ""
+            self.new_message_field.disabled = True
+            self.page.update()
+            self.add_message("user_message", "Tú", user_message)
+            bot_message = self.add_message("bot_message", "Scout Program Builder", "")
+            async for delta in self.controller.stream_ai_response(user_message):
+                bot_message.append_text(delta)
+            self.new_message_field.disabled = False
+            self.page.update()
+
+    return LegacyChatView
+
+
+async def run(view_class, messages: int) -> dict:
+    loop = asyncio.get_running_loop()
+    conn = RecordingConnection()
+    page = create_page(loop, conn)
+    view = view_class(page)
+    view.controller = CannedController()
+    page.views.append(view)
+    page.update()
+
+    action_bytes, action_times = [], []
+    for turn in range(messages // 2):
+        conn.reset_counters()
+        view.new_message_field.value = f"Pregunta número {turn + 1} sobre el programa"
+        start = time.perf_counter()
+        await view.send_message_click(None)
+        action_times.append((time.perf_counter() - start) * 1000)
+        action_bytes.append(conn.bytes_sent)
+
+    # Volver a /chat desde otra ruta (main.route_change) vuelve a enviar toda la vista
+    conn.reset_counters()
+    start = time.perf_counter()
+    page.views.clear()
+    page.update()
+    page.views.append(view)
+    page.update()
+    reopen_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "total_kib": sum(action_bytes) / 1024,
+        "first_kib": statistics.mean(action_bytes[:10]) / 1024,
+        "last_kib": statistics.mean(action_bytes[-10:]) / 1024,
+        "first_ms": statistics.mean(action_times[:10]),
+        "last_ms": statistics.mean(action_times[-10:]),
+        "live": len(view.chat_list.controls),
+        "reopen_kib": conn.bytes_sent / 1024,
+        "reopen_ms": reopen_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    from views.chat_view import CHAT_WINDOW_SIZE, ChatView
+
+    async def both():
+        return await run(legacy_view_class(), args.messages), await run(ChatView, args.messages)
+
+    legacy, windowed = asyncio.run(both())
+    print(f"Conversación de {args.messages} mensajes (+ bienvenida), ventana de {CHAT_WINDOW_SIZE} mensajes:")
+    print(f"  {'':<12} {'total':>9} {'KiB/acción':>17} {'ms/acción':>17} {'volver a /chat':>17} {'mensajes':>9}")
+    print(f"  {'':<12} {'KiB':>9} {'inicio':>8} {'final':>8} {'inicio':>8} {'final':>8} {'KiB':>8} {'ms':>8} {'vivos':>9}")
+    for name, result in (("anterior", legacy), ("ventana", windowed)):
+        print(
+            f"  {name:<12} {result['total_kib']:>9.0f} {result['first_kib']:>8.1f} {result['last_kib']:>8.1f} "
+            f"{result['first_ms']:>8.1f} {result['last_ms']:>8.1f} {result['reopen_kib']:>8.0f} "
+            f"{result['reopen_ms']:>8.1f} {result['live']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
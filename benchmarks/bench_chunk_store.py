@@ -0,0 +1,140 @@
+"""
+Tiempo de carga y memoria por proceso del corpus de búsqueda: formato anterior
+(chunks.pkl + índice FAISS leído completo) frente al nuevo (chunks.bin con mmap +
+índice FAISS con mmap). Se lanzan varios procesos a la vez, como las réplicas o
+workers de la app, para ver cuánta memoria comparten.
+
+    python benchmarks/bench_chunk_store.py --chunks 100000 --processes 4
+
+Por proceso se reporta RSS, PSS (memoria compartida repartida entre los procesos
+que la usan) y USS (memoria privada), por encima de la del intérprete sin corpus.
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import faiss
+import numpy as np
+
+from services.chunking import Chunk
+from services.chunk_store import write_chunk_store
+
+DIMENSIONS = 384
+WORDS = (
+    "scout patrulla tropa manada lobatos campamento fogata brújula nudos insignia especialidad "
+    "cabuyería caminata consejo ley promesa servicio naturaleza juego reunión progresión aventura"
+).split()
+
+
+def build_caches(folder: Path, count: int) -> dict[str, Path]:
+    rng = random.Random(0)
+    texts = [" ".join(rng.choices(WORDS, k=70)) for _ in range(count)]
+    vectors = np.random.default_rng(0).standard_normal((count, DIMENSIONS)).astype("float32")
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIMENSIONS))
+    index.add_with_ids(vectors, np.arange(count, dtype="int64"))
+
+    legacy, store = folder / "anterior", folder / "mmap"
+    for cache in (legacy, store):
+        cache.mkdir()
+        faiss.write_index(index, str(cache / "context.faiss"))
+    with open(legacy / "chunks.pkl", "wb") as f:
+        pickle.dump(texts, f)
+    write_chunk_store(store / "chunks.bin", {i: Chunk(text, "manual.pdf", i // 20 + 1) for i, text in enumerate(texts)})
+    meta = {"version": "bench", "index_type": "flat", "normalized": True, "search_params": {}}
+    (store / "index_meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    return {"anterior": legacy, "mmap": store}
+
+
+def memory_kib() -> dict[str, int]:
+    """Rss, Pss y USS (Private_Clean + Private_Dirty) del proceso, en KiB."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def load_legacy(cache: Path):
+    """Carga del formato anterior, que la app ya no lee: índice completo en memoria y la lista de textos."""
+    index = faiss.read_index(str(cache / "context.faiss"))
+    with open(cache / "chunks.pkl", "rb") as f:
+        return index, pickle.load(f)
+
+
+def run_child(cache: Path, searches: int):
+    from services.retrieval_engine import RetrievalEngine
+
+    baseline = memory_kib()
+    start = time.perf_counter()
+    if (cache / "chunks.pkl").exists():
+        index, chunks = load_legacy(cache)
+    else:
+        corpus = RetrievalEngine(cache_folder=cache)._read_corpus()
+        index, chunks = corpus.index, corpus.chunks
+    load_seconds = time.perf_counter() - start
+
+    # Búsquedas como las de la app: el índice se recorre y se leen los fragmentos encontrados
+    queries = np.random.default_rng(1).standard_normal((searches, DIMENSIONS)).astype("float32")
+    faiss.normalize_L2(queries)
+    for query in queries:
+        _, ids = index.search(query[None, :], 3)
+        [chunks[int(i)] for i in ids[0]]
+
+    memory = memory_kib()
+    print(json.dumps({"load_seconds": load_seconds, **{k: memory[k] - baseline[k] for k in memory}}), flush=True)
+    sys.stdin.readline()  # Espera a que el proceso padre mida a todos los demás
+
+
+def measure(mode: str, cache: Path, processes: int, searches: int) -> list[dict]:
+    env = dict(os.environ, INDEX_MMAP="1" if mode == "mmap" else "0")
+    command = [sys.executable, __file__, "--child", str(cache), "--searches", str(searches)]
+    children = [
+        subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+        for _ in range(processes)
+    ]
+    # Los procesos siguen vivos hasta que todos reportan, así el PSS refleja lo que comparten
+    results = [json.loads(child.stdout.readline()) for child in children]
+    for child in children:
+        child.stdin.close()
+        child.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(Path(args.child), args.searches)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caches = build_caches(Path(tmp), args.chunks)
+        sizes = {mode: sum(f.stat().st_size for f in cache.iterdir()) / 2**20 for mode, cache in caches.items()}
+        print(f"{args.chunks} fragmentos, {args.processes} procesos a la vez\n")
+        print(f"  {'formato':<9} {'en disco':>9} {'carga':>8} {'RSS':>9} {'PSS':>9} {'USS':>9}   (MiB por proceso)")
+        for mode, cache in caches.items():
+            results = measure(mode, cache, args.processes, args.searches)
+            mean = {key: sum(r[key] for r in results) / len(results) for key in results[0]}
+            print(f"  {mode:<9} {sizes[mode]:9.1f} {mean['load_seconds']:7.2f}s {mean['rss'] / 1024:9.1f} "
+                  f"{mean['pss'] / 1024:9.1f} {mean['uss'] / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
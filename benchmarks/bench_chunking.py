@@ -0,0 +1,134 @@
+"""
+Compara la división anterior en ventanas fijas (512 caracteres, 50 de superposición)
+con la división por estructura de `services/chunking.py` sobre el texto procesado
+de `context/processed_context.txt`:
+
+- tokens de contexto que se envían al modelo por pregunta (los 3 mejores fragmentos);
+- acierto top-3 en un pequeño conjunto de preguntas etiquetadas
+  (`chunking_questions.json`: la respuesta esperada debe estar en alguno de los 3).
+
+    python benchmarks/bench_chunking.py                     # con el modelo de embeddings
+    python benchmarks/bench_chunking.py --retriever tfidf   # sin modelo (TF-IDF)
+"""
+import argparse
+import json
+import math
+import re
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+SRC = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from services.chunking import Chunk, chunk_document, format_chunk
+from services.retrieval_engine import EMBEDDING_MODEL
+from services.tokens import count_tokens
+from bench_extraction import split_fixed_windows
+
+CORPUS_FILE = Path(__file__).parent.parent / "context" / "processed_context.txt"
+# Marcas con las que el texto procesado separa cada archivo de origen
+FILE_MARKER_RE = re.compile(r"--- (?:INICIO|FIN) DEL ARCHIVO: (.+?) ---\n")
+QUESTIONS_FILE = Path(__file__).parent / "chunking_questions.json"
+TOP_K = 3
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NON_ALNUM_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def split_by_source(full_text: str) -> list[tuple[str, str]]:
+    """Separa el texto procesado en pares (archivo de origen, texto)."""
+    parts = FILE_MARKER_RE.split(full_text)
+    documents = [(CORPUS_FILE.name, parts[0])] if parts[0].strip() else []
+    # Tras el split quedan alternados: nombre, texto, nombre, texto...
+    documents += [(parts[i], parts[i + 1]) for i in range(1, len(parts), 2) if parts[i + 1].strip()]
+    return documents
+
+
+def normalize(text: str) -> str:
+    # El texto de los PDF trae espacios de más ("m ayores"), así que se comparan solo letras y números
+    return _NON_ALNUM_RE.sub("", text.lower())
+
+
+def build_chunkers(documents: list[tuple[str, str]]) -> dict[str, list[Chunk]]:
+    return {
+        "ventanas 512/50": [
+            Chunk(window, source) for source, text in documents for window in split_fixed_windows(text)
+        ],
+        "por estructura": [
+            chunk for source, text in documents for chunk in chunk_document([(None, text)], source)
+        ],
+    }
+
+
+class TfidfRetriever:
+    """Recuperación léxica sin modelo, para comparar los divisores sin descargar MiniLM."""
+    def __init__(self, chunks: list[Chunk]):
+        self.postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+        counts = [Counter(_WORD_RE.findall(chunk.text.lower())) for chunk in chunks]
+        document_frequency = Counter(word for count in counts for word in count)
+        self.idf = {word: math.log(len(chunks) / df) for word, df in document_frequency.items()}
+        for i, count in enumerate(counts):
+            weights = {word: (1 + math.log(tf)) * self.idf[word] for word, tf in count.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for word, weight in weights.items():
+                self.postings[word].append((i, weight / norm))
+
+    def search(self, queries: list[str], top_k: int) -> list[list[int]]:
+        results = []
+        for query in queries:
+            scores: dict[int, float] = defaultdict(float)
+            for word in set(_WORD_RE.findall(query.lower())):
+                for i, weight in self.postings.get(word, ()):
+                    scores[i] += weight * self.idf.get(word, 0.0)
+            results.append(sorted(scores, key=scores.get, reverse=True)[:top_k])
+        return results
+
+
+class EmbeddingRetriever:
+    """Búsqueda exacta por coseno con el mismo modelo que usa la app."""
+    def __init__(self, chunks: list[Chunk], model):
+        self.model = model
+        self.embeddings = model.encode([c.text for c in chunks], batch_size=64, normalize_embeddings=True)
+
+    def search(self, queries: list[str], top_k: int) -> list[list[int]]:
+        scores = self.model.encode(queries, normalize_embeddings=True) @ self.embeddings.T
+        return [list(np.argsort(-row)[:top_k]) for row in scores]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retriever", choices=("embeddings", "tfidf"), default="embeddings")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    documents = split_by_source(CORPUS_FILE.read_text(encoding="utf-8"))
+    questions = json.loads(QUESTIONS_FILE.read_text(encoding="utf-8"))
+    model = None
+    if args.retriever == "embeddings":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+
+    print(f"{len(documents)} documentos, {len(questions)} preguntas, recuperación: {args.retriever}\n")
+    print(f"  {'división':<16} {'fragmentos':>10} {'tokens/frag.':>13} {'tokens de contexto':>19} {'acierto top-3':>14}")
+    for name, chunks in build_chunkers(documents).items():
+        retriever = TfidfRetriever(chunks) if model is None else EmbeddingRetriever(chunks, model)
+        found = retriever.search([q["question"] for q in questions], TOP_K)
+
+        hits, context_tokens = 0, []
+        for question, ids in zip(questions, found):
+            expected = normalize(question["expected"])
+            hits += any(expected in normalize(chunks[i].text) for i in ids)
+            # Igual que el prompt de la app: fragmentos con su origen separados por "---"
+            context_tokens.append(count_tokens("\n---\n".join(format_chunk(chunks[i]) for i in ids)))
+
+        chunk_tokens = sum(count_tokens(c.text) for c in chunks) / len(chunks)
+        print(f"  {name:<16} {len(chunks):>10} {chunk_tokens:>13.0f} {np.mean(context_tokens):>19.0f} "
+              f"{hits:>8}/{len(questions)} ({hits / len(questions):.0%})")
+
+
+if __name__ == "__main__":
+    main()
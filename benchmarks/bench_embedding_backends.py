@@ -0,0 +1,99 @@
+"""
+Backends de embeddings (`services/embeddings.py`) frente a torch:
+
+- tiempo de importar y cargar el modelo en un proceso nuevo (lo que paga el arranque);
+- latencia de codificar una consulta y rendimiento en lotes;
+- similitud mínima con los embeddings de torch y recall@k de la búsqueda en el
+  índice (qué fracción de los k fragmentos que encuentra torch encuentra también
+  el backend, usando fragmentos del índice como consultas).
+
+El modelo necesita sus archivos ONNX (ver `python src/services/embeddings.py export`).
+
+    python benchmarks/bench_embedding_backends.py --cache cache --model models/all-MiniLM-L6-v2
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SRC_FOLDER = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(SRC_FOLDER))
+
+from services.chunk_store import ChunkStore
+from services.embeddings import EMBEDDING_BACKENDS, EMBEDDING_MODEL, load_embedding_model
+from services.retrieval_engine import CHUNKS_FILE, INDEX_FILE
+
+LOAD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from services.embeddings import load_embedding_model
+model = load_embedding_model(sys.argv[1], sys.argv[2])
+model.encode(["consulta de prueba"], batch_size=1, normalize_embeddings=True)
+print(json.dumps({"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules}))
+"""
+
+
+def load_cost(model_name: str, backend: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", LOAD_SCRIPT, model_name, backend],
+        cwd=SRC_FOLDER, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def sample_queries(cache: Path, count: int, seed: int = 0) -> list[str]:
+    store = ChunkStore(cache / CHUNKS_FILE)
+    ids = random.Random(seed).sample(store.ids(), min(count, len(store)))
+    # Una consulta corta por fragmento: sus primeras palabras
+    return [" ".join(store[chunk_id].text.split()[:12]) for chunk_id in ids]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=Path("cache"))
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    import faiss
+
+    index = faiss.read_index(str(args.cache / INDEX_FILE))
+    queries = sample_queries(args.cache, args.queries)
+    reference = load_embedding_model(args.model, "torch")
+    expected = reference.encode(queries, batch_size=32, normalize_embeddings=True)
+    _, expected_ids = index.search(np.asarray(expected, dtype="float32"), args.top_k)
+
+    print(f"{len(queries)} consultas, recall@{args.top_k} frente a torch:")
+    print(f"  {'backend':<10} {'carga':>8} {'torch':>6} {'1 consulta':>11} {'lote 32':>10} {'sim. mín.':>10} {'recall':>8}")
+    for backend in args.backends:
+        cost = load_cost(args.model, backend)
+        model = reference if backend == "torch" else load_embedding_model(args.model, backend)
+
+        single = []
+        for query in queries[:50]:
+            start = time.perf_counter()
+            model.encode([query], batch_size=1, normalize_embeddings=True)
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        embeddings = np.asarray(model.encode(queries, batch_size=32, normalize_embeddings=True), dtype="float32")
+        batch_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        _, ids = index.search(embeddings, args.top_k)
+        recall = statistics.mean(len(set(a) & set(b)) / args.top_k for a, b in zip(ids, expected_ids))
+        worst = float(np.sum(embeddings * expected, axis=1).min())
+        print(
+            f"  {backend:<10} {cost['seconds']:>7.1f}s {'sí' if cost['torch'] else 'no':>6} "
+            f"{statistics.median(single) * 1000:>9.1f}ms {batch_ms:>7.2f}ms/c {worst:>10.5f} {recall:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Rendimiento del preprocesamiento sobre un corpus sintético de PDFs (2,000 páginas
+por defecto): páginas por segundo y pico de memoria (RSS) de la extracción
+anterior (un archivo a la vez, `extract_text()` dos veces por página) frente a la
+extracción en paralelo por rangos de páginas.
+
+    python benchmarks/bench_extraction.py --pages 2000 --workers 1 4
+    python benchmarks/bench_extraction.py --embed   # incluye embeddings en lotes
+
+Cada medición corre en un proceso nuevo para que el pico de RSS sea comparable.
+"""
+import argparse
+import importlib.util
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from synthetic_corpus import build_corpus
+
+PREPROCESS_PATH = Path(__file__).parent.parent / "src" / "AI stuff" / "preprocess_files.py"
+
+
+def load_preprocess():
+    spec = importlib.util.spec_from_file_location("preprocess_files", PREPROCESS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    # Registrado en sys.modules para que el pool de procesos pueda serializar sus funciones
+    sys.modules["preprocess_files"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def split_fixed_windows(text: str, size: int = 512, overlap: int = 50) -> list[str]:
+    """División anterior en ventanas fijas de caracteres, para comparar."""
+    return [text[start:start + size] for start in range(0, len(text), size - overlap)]
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss está en KiB en Linux; se suma el pico de los procesos hijos (el pool)
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) / 1024
+
+
+def run_child(mode: str, folder: Path, workers: int, embed: bool, cache: Path):
+    pre = load_preprocess()
+    archivos = sorted(folder.glob("*.pdf"))
+    pages = sum(pre.count_pdf_pages(a) for a in archivos)
+    start = time.perf_counter()
+
+    if mode == "anterior":
+        import pypdf
+        full_text = []
+        for archivo in archivos:
+            reader = pypdf.PdfReader(archivo, strict=False)
+            texto_paginas = [p.extract_text() for p in reader.pages if p.extract_text()]
+            full_text.append("\n".join(texto_paginas))
+        chunks = split_fixed_windows("\n\n".join(full_text))
+        if embed:
+            from sentence_transformers import SentenceTransformer
+            SentenceTransformer(pre.EMBEDDING_MODEL).encode(chunks)
+    else:
+        pre.EXTRACTION_WORKERS = workers
+        if embed:
+            pre.SOURCE_FOLDER, pre.CACHE_FOLDER = folder, cache
+            pre.update_index(full_rebuild=True)
+        else:
+            for archivo, file_pages in pre.iter_file_texts(archivos, workers):
+                pre.chunk_document(file_pages, source=archivo.name)
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"pages": pages, "seconds": elapsed, "peak_rss_mib": _peak_rss_mib()}))
+
+
+def measure(mode: str, folder: Path, workers: int, embed: bool, cache: Path) -> dict:
+    command = [sys.executable, __file__, "--child", mode, "--dir", str(folder), "--workers", str(workers),
+               "--cache", str(cache)]
+    if embed:
+        command.append("--embed")
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--pages-per-file", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--embed", action="store_true", help="Incluye el cálculo de embeddings.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--cache", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, Path(args.dir), args.workers[0], args.embed, Path(args.cache))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, cache = Path(tmp) / "context", Path(tmp) / "cache"
+        build_corpus(folder, args.pages, args.pages_per_file)
+        print(f"Corpus sintético: {args.pages} páginas en {len(list(folder.iterdir()))} PDFs")
+
+        runs = [("anterior", 1)] + [("paralelo", w) for w in args.workers]
+        for mode, workers in runs:
+            result = measure(mode, folder, workers, args.embed, cache)
+            label = "anterior (secuencial)" if mode == "anterior" else f"paralelo, {workers} procesos"
+            print(f"  {label:<24} {result['pages'] / result['seconds']:8.1f} páginas/s   "
+                  f"pico RSS {result['peak_rss_mib']:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Búsqueda con filtro por sección (`services/scout_metadata.py`) frente a la búsqueda
+en todo el índice, con fragmentos del índice como consultas: cuántos candidatos
+deja cada filtro, latencia de la búsqueda y cuántos de los fragmentos que trae la
+búsqueda sin filtro son de otra sección (contexto desperdiciado en el prompt).
+
+Necesita un índice generado con etiquetas (`preprocess_files.py` actual).
+
+    python benchmarks/bench_filters.py --cache cache --queries 200
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from services.chunk_store import ChunkStore
+from services.chunking import format_chunk
+from services.embeddings import EMBEDDING_MODEL
+from services.retrieval_engine import CHUNKS_FILE, RetrievalEngine
+from services.scout_metadata import SCOUT_PROGRAM, SearchFilter
+from services.tokens import count_tokens
+
+
+def timed_search(engine, queries: list[str], top_k: int, search_filter) -> tuple[float, list[list[str]]]:
+    samples, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(engine.search(query, top_k, search_filter))
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=Path("cache"))
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    args = parser.parse_args()
+
+    store = ChunkStore(args.cache / CHUNKS_FILE)
+    if not store.has_tags:
+        raise SystemExit("El índice no tiene etiquetas: vuelve a ejecutar preprocess_files.py.")
+    ids = random.Random(0).sample(store.ids(), min(args.queries, len(store)))
+    queries = [" ".join(store[i].text.split()[:12]) for i in ids]
+
+    # Una caché de búsquedas vacía para cada filtro: se mide la búsqueda, no la caché
+    engine = RetrievalEngine(cache_folder=args.cache, model_name=args.model)
+    if not engine.warmup():
+        raise SystemExit(f"El motor de búsqueda no cargó: {engine.error}")
+    engine.cache.max_entries = 0
+    base_ms, base_results = timed_search(engine, queries, args.top_k, None)
+
+    print(f"{len(store)} fragmentos, {len(queries)} consultas, top {args.top_k}:")
+    print(f"  {'filtro':<12} {'candidatos':>11} {'mediana':>9} {'sin filtro':>11} {'de otra sección':>16} {'tokens desperdiciados':>22}")
+    for section in SCOUT_PROGRAM:
+        search_filter = SearchFilter(section)
+        allowed = store.matching_ids(search_filter.tags())
+        allowed_texts = {format_chunk(store[int(i)]) for i in allowed}
+        filtered_ms, _ = timed_search(engine, queries, args.top_k, search_filter)
+        # Fragmentos que la búsqueda sin filtro trae de otra sección
+        wasted = [chunk for result in base_results for chunk in result if chunk not in allowed_texts]
+        total = sum(len(result) for result in base_results)
+        print(
+            f"  {section:<12} {len(allowed):>11} {filtered_ms:>7.2f}ms {base_ms:>9.2f}ms "
+            f"{len(wasted) / total:>15.0%} {sum(count_tokens(c) for c in wasted) / len(queries):>17.0f}/turno"
+        )
+
+
+if __name__ == "__main__":
+    main()
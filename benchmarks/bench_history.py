@@ -0,0 +1,75 @@
+"""
+Tokens de prompt por turno en una conversación guionizada de 50 turnos, con el
+historial completo (comportamiento anterior) y con `ConversationHistory`.
+
+    python benchmarks/bench_history.py --turns 50 --budget 3000
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from services.history import ConversationHistory
+from services.settings import get_base_prompt
+from services.tokens import count_message_tokens, count_tokens
+
+USER_SCRIPT = [
+    "Quiero empezar a diseñar un programa",
+    "Tropa",
+    "Venado Cola Blanca, insignia Ajolote de xochimilco",
+    "Tenemos 2 horas, en un parque, con 18 scouts",
+    "¿Puedes cambiar el juego inicial por uno más tranquilo?",
+    "Agrega una actividad de nudos",
+    "¿Qué materiales necesito para el reto por patrullas?",
+    "Haz más corta la reflexión final",
+]
+
+ASSISTANT_PARAGRAPH = (
+    "| Hora | Actividad | Objetivo | Materiales |\n|---|---|---|---|\n"
+    "| 10:00 | Juego de integración | Romper el hielo | Pañoletas, cuerda |\n"
+    "La actividad se desarrolla por patrullas y refuerza la progresión elegida. "
+    "Cada patrulla registra sus avances en la bitácora y al final se comparte en consejo. "
+)
+
+
+def scripted_turns(turns: int):
+    for i in range(turns):
+        user = USER_SCRIPT[i % len(USER_SCRIPT)]
+        assistant = f"Propuesta para el turno {i + 1}.\n" + ASSISTANT_PARAGRAPH * (3 + i % 4)
+        yield user, assistant
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=3000)
+    parser.add_argument("--context-tokens", type=int, default=450, help="Tokens de contexto recuperado por turno.")
+    args = parser.parse_args()
+
+    system_tokens = count_tokens(get_base_prompt()) + args.context_tokens
+    unbounded: list[dict] = []
+    managed = ConversationHistory(token_budget=args.budget)
+    totals = [0, 0]
+
+    print(f"{'turno':>5} {'historial completo':>20} {'con presupuesto':>17}")
+    for turn, (user, assistant) in enumerate(scripted_turns(args.turns), start=1):
+        unbounded.append({"role": "user", "content": user})
+        managed.add("user", user)
+
+        full = system_tokens + count_message_tokens(unbounded)
+        budgeted = system_tokens + managed.token_count()
+        totals[0] += full
+        totals[1] += budgeted
+        if turn == 1 or turn % 5 == 0:
+            print(f"{turn:>5} {full:>20} {budgeted:>17}")
+
+        unbounded.append({"role": "assistant", "content": assistant})
+        managed.add("assistant", assistant)
+
+    saved = 1 - totals[1] / totals[0]
+    print(f"\nTotal de tokens de prompt: {totals[0]} -> {totals[1]} ({saved:.0%} menos)")
+
+
+if __name__ == "__main__":
+    main()
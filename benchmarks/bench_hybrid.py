@@ -0,0 +1,120 @@
+"""
+Búsqueda híbrida (embeddings + BM25 con Reciprocal Rank Fusion) sobre un índice ya
+construido con `preprocess_files.py`:
+
+- acierto top-3 con solo embeddings, solo BM25 e híbrida, con las preguntas
+  etiquetadas de `chunking_questions.json`;
+- latencia de la búsqueda por palabras anterior de la consola (recorre todos los
+  fragmentos en cada pregunta) frente al índice invertido, al multiplicar el corpus.
+
+    python benchmarks/bench_hybrid.py --cache cache --scale 1 10
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import faiss
+import numpy as np
+
+from bench_chunking import QUESTIONS_FILE, normalize
+from services.chunk_store import ChunkStore
+from services.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex, build_lexical_index
+from services.retrieval_engine import (
+    CHUNKS_FILE, EMBEDDING_MODEL, HYBRID_CANDIDATES, INDEX_FILE, reciprocal_rank_fusion, read_index_meta,
+)
+from services.settings import CACHE_FOLDER
+
+TOP_K = 3
+
+
+def legacy_search(query: str, chunks: list[str], top_k: int) -> list[int]:
+    """Búsqueda anterior de `deepseek_chat.py`: palabras en común, recalculadas para cada fragmento."""
+    query_words = set(query.lower().split())
+    scores = []
+    for i, chunk in enumerate(chunks):
+        score = len(query_words.intersection(set(chunk.lower().split())))
+        if score > 0:
+            scores.append((score, i))
+    scores.sort(reverse=True)
+    return [i for _, i in scores[:top_k]]
+
+
+def hit_rates(cache: Path, model_name: str, questions: list[dict]):
+    from sentence_transformers import SentenceTransformer
+
+    store = ChunkStore(cache / CHUNKS_FILE)
+    lexical = LexicalIndex(cache / LEXICAL_INDEX_FILE)
+    index = faiss.read_index(str(cache / INDEX_FILE))
+    meta = read_index_meta(cache)
+    if meta.get("search_params"):
+        faiss.ParameterSpace().set_index_parameters(index, ",".join(f"{k}={v}" for k, v in meta["search_params"].items()))
+    model = SentenceTransformer(model_name)
+
+    queries = [q["question"] for q in questions]
+    embeddings = model.encode(queries, normalize_embeddings=bool(meta.get("normalized")))
+    _, dense = index.search(np.asarray(embeddings, dtype="float32"), HYBRID_CANDIDATES)
+
+    hits = {"embeddings": 0, "BM25": 0, "híbrida (RRF)": 0}
+    for question, dense_row in zip(questions, dense):
+        dense_ids = [int(i) for i in dense_row if i >= 0]
+        lexical_ids = [i for i, _ in lexical.search(question["question"], HYBRID_CANDIDATES)]
+        rankings = {
+            "embeddings": dense_ids,
+            "BM25": lexical_ids,
+            "híbrida (RRF)": reciprocal_rank_fusion([dense_ids, lexical_ids]),
+        }
+        expected = normalize(question["expected"])
+        for name, ids in rankings.items():
+            hits[name] += any(expected in normalize(store[i].text) for i in ids[:TOP_K])
+
+    print(f"Acierto top-{TOP_K} ({len(questions)} preguntas, modelo {model_name}):")
+    for name, count in hits.items():
+        print(f"  {name:<15} {count:>3}/{len(questions)} ({count / len(questions):.0%})")
+
+
+def lookup_latency(cache: Path, scales: list[int], questions: list[dict]):
+    store = ChunkStore(cache / CHUNKS_FILE)
+    texts = [chunk.text for _, chunk in store.items()]
+    queries = [q["question"] for q in questions]
+
+    print("\nLatencia de la búsqueda por palabras (ms por pregunta):")
+    print(f"  {'fragmentos':>10} {'anterior':>10} {'BM25':>8}")
+    for scale in scales:
+        corpus = texts * scale
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / LEXICAL_INDEX_FILE
+            build_lexical_index(path, enumerate(corpus))
+            lexical = LexicalIndex(path)
+
+            start = time.perf_counter()
+            for query in queries:
+                lexical.search(query, HYBRID_CANDIDATES)
+            bm25_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+            start = time.perf_counter()
+            for query in queries:
+                legacy_search(query, corpus, HYBRID_CANDIDATES)
+            legacy_ms = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"  {len(corpus):>10} {legacy_ms:>10.1f} {bm25_ms:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=CACHE_FOLDER)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    questions = json.loads(QUESTIONS_FILE.read_text(encoding="utf-8"))
+    hit_rates(args.cache, args.model, questions)
+    lookup_latency(args.cache, args.scale, questions)
+
+
+if __name__ == "__main__":
+    main()
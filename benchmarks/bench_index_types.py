@@ -0,0 +1,99 @@
+"""
+Recall@k y latencia de cada tipo de índice de `preprocess_files.py` (flat, ivf_flat,
+hnsw, ivf_pq) frente a la búsqueda exacta. Se usan embeddings sintéticos agrupados
+(parecidos a los de MiniLM: 384 dimensiones, normalizados) o, con --cache, los
+vectores reales de un índice plano ya construido.
+
+    python benchmarks/bench_index_types.py --vectors 100000 --queries 500
+    python benchmarks/bench_index_types.py --cache cache
+
+Para IVF y HNSW se prueban varios valores de nprobe / efSearch; el marcado con *
+es el que se guarda por defecto en `index_meta.json`.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_extraction import load_preprocess
+
+SWEEPS = {
+    "flat": ("", [None]),
+    "ivf_flat": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("efSearch", [16, 32, 64, 128]),
+    "ivf_pq": ("nprobe", [1, 4, 16, 64]),
+}
+
+
+def synthetic_vectors(n: int, d: int = 384, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Vectores normalizados alrededor de `clusters` temas, como los fragmentos de un manual."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, d)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, d)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def cached_vectors(cache_folder: Path) -> np.ndarray:
+    index = faiss.read_index(str(cache_folder / "context.faiss"))
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    vectors = inner.reconstruct_n(0, inner.ntotal)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--cache", type=Path, help="Carpeta con un índice plano ya construido.")
+    args = parser.parse_args()
+
+    pre = load_preprocess()
+    if args.cache:
+        vectors = cached_vectors(args.cache)
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries)
+    # Las consultas salen de la misma distribución pero no están en el índice
+    queries, vectors = vectors[:args.queries].copy(), vectors[args.queries:]
+    ids = np.arange(len(vectors), dtype="int64")
+    print(f"{len(vectors)} vectores, {len(queries)} consultas, recall@{args.k} frente a la búsqueda exacta\n")
+
+    truth = None
+    print(f"  {'índice':<9} {'parámetro':<13} {'recall@3':>9} {'recall@k':>9} {'ms/consulta':>12} {'MiB':>7} {'construcción':>13}")
+    for index_type, (param, values) in SWEEPS.items():
+        start = time.perf_counter()
+        sample = vectors[:pre.TRAIN_SAMPLE_SIZE]
+        index = pre.create_faiss_index(index_type, sample)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - start
+        size_mib = faiss.serialize_index(index).nbytes / 2**20
+        default = pre.search_parameters(index_type).get(param)
+
+        for value in values:
+            if param:
+                faiss.ParameterSpace().set_index_parameters(index, f"{param}={value}")
+            # Una consulta a la vez, como llegan desde el chat sin micro-lotes
+            start = time.perf_counter()
+            found = np.vstack([index.search(queries[i:i + 1], args.k)[1] for i in range(len(queries))])
+            latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+            if truth is None:
+                truth = found
+            label = f"{param}={value}{'*' if value == default else ''}" if param else "exacto"
+            print(f"  {index_type:<9} {label:<13} {recall_at_k(found, truth, 3):9.3f} {recall_at_k(found, truth, args.k):9.3f} "
+                  f"{latency_ms:12.3f} {size_mib:7.1f} {build_seconds:12.1f}s")
+
+
+if __name__ == "__main__":
+    main()
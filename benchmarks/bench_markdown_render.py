@@ -0,0 +1,162 @@
+"""
+Costo de mostrar en streaming una respuesta de programa de 4096 tokens con
+`ChatMessage`, con un solo control Markdown (`MARKDOWN_RENDER_MODE=single`) y por
+bloques congelados (`blocks`):
+
+- bytes enviados por el websocket de Flet en cada actualización (`fake_flet.py`);
+- tiempo del servidor por actualización (calcular y serializar los cambios);
+- tiempo de "cuadro" del cliente, estimado como lo que tarda markdown-it-py en
+  procesar los controles Markdown que cambiaron en esa actualización (el navegador
+  vuelve a procesar cada control cuyo texto cambia). Necesita `pip install markdown-it-py`.
+
+    python benchmarks/bench_markdown_render.py --tokens 4096 --tokens-per-update 6
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import flet as ft
+
+from fake_flet import RecordingConnection, create_page
+from services.tokens import CHARS_PER_TOKEN, count_tokens
+
+SESSION = """### Sesión {n}: Orientación con brújula (Tropa, 2 horas)
+
+**Territorios:** Corporalidad y Creatividad. **Insignia de aventura:** Jaguar. **Progresión:** Venado Cola Blanca.
+
+Objetivo: que cada patrulla ubique rumbos y azimuts y los use en un recorrido con balizas.
+
+| Hora | Actividad | Tipo | Objetivo | Materiales |
+|------|-----------|------|----------|------------|
+| 0:00 | Apertura: oración, revisión del equipo de bolsillo y uniforme | Apertura | Formación | Ninguno |
+| 0:15 | Juego de la serpiente | Desfogue | Integración | Paliacates |
+| 0:30 | Rumbos y azimuts por patrullas | Técnica | Orientación | Brújulas, hojas |
+| 0:45 | Carrera de relevos con consignas | Desfogue | Trabajo en equipo | Conos |
+| 1:00 | Recorrido con balizas | Habilidad | Aplicar lo aprendido | Balizas, mapa |
+| 1:30 | Reflexión final en consejo de patrulla | Reflexión | Evaluar | Bitácora |
+
+**Materiales por patrulla:**
+
+- 1 brújula y 1 mapa del parque
+- 6 balizas numeradas
+- Bitácora y lápiz
+
+> Si llueve, el recorrido se hace en el salón con balizas escondidas.
+
+"""
+
+
+def program_response(tokens: int) -> str:
+    sessions = []
+    while count_tokens("".join(sessions)) < tokens:
+        sessions.append(SESSION.format(n=len(sessions) + 1))
+    text = "".join(sessions)
+    # Recortado a los tokens pedidos (aproximado por caracteres)
+    return text[:int(len(text) * tokens / count_tokens(text))]
+
+
+def markdown_controls(control):
+    if isinstance(control, ft.Markdown):
+        yield control
+    for child in control._get_children():
+        yield from markdown_controls(child)
+
+
+async def run(mode: str, response: str, tokens_per_update: int, parser) -> dict:
+    import components.message_component as message_component
+    from models.chat_model import Message
+
+    message_component.MARKDOWN_RENDER_MODE = mode
+    conn = RecordingConnection()
+    page = create_page(asyncio.get_running_loop(), conn)
+    chat_list = ft.ListView()
+    page.add(chat_list)
+    message = message_component.ChatMessage(Message(user_name="Scout Program Builder", text="", message_type="bot_message"))
+    chat_list.controls.append(message)
+    page.update()
+
+    step = CHARS_PER_TOKEN * tokens_per_update
+    sent_values: dict[int, str] = {}
+    update_bytes, server_ms, frame_ms = [], [], []
+    for start in range(0, len(response), step):
+        message.append_text(response[start:start + step])
+        conn.reset_counters()
+        began = time.perf_counter()
+        message.update()
+        server_ms.append((time.perf_counter() - began) * 1000)
+        update_bytes.append(conn.bytes_sent)
+
+        # El cliente vuelve a procesar los controles Markdown nuevos o con otro texto
+        changed = [c.value for c in markdown_controls(message) if sent_values.get(id(c)) != c.value]
+        sent_values.update((id(c), c.value) for c in markdown_controls(message))
+        if parser is not None:
+            began = time.perf_counter()
+            for value in changed:
+                parser.parse(value)
+            frame_ms.append((time.perf_counter() - began) * 1000)
+
+    # Volver a mostrar la respuesta terminada (p. ej. al volver a /chat): se envía completa
+    conn.reset_counters()
+    page.views[0].controls.clear()
+    page.update()
+    page.views[0].controls.append(chat_list)
+    page.update()
+    return {
+        "updates": len(update_bytes),
+        "total_kib": sum(update_bytes) / 1024,
+        "last_kib": statistics.mean(update_bytes[-10:]) / 1024,
+        "server_ms": statistics.mean(server_ms),
+        "frame_p50": statistics.median(frame_ms) if frame_ms else None,
+        "frame_max": max(frame_ms) if frame_ms else None,
+        "frame_total": sum(frame_ms) if frame_ms else None,
+        "reopen_kib": conn.bytes_sent / 1024,
+        "controls": len(list(markdown_controls(message))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=4096)
+    parser.add_argument(
+        "--tokens-per-update", type=int, default=6,
+        help="Tokens entre actualizaciones (6 = 60 tokens/s con una actualización cada 0.1 s).",
+    )
+    args = parser.parse_args()
+
+    try:
+        from markdown_it import MarkdownIt
+        markdown_parser = MarkdownIt("commonmark").enable("table")
+    except ImportError:
+        markdown_parser = None
+        print("markdown-it-py no está instalado: no se estima el tiempo del cliente.")
+
+    response = program_response(args.tokens)
+
+    async def both():
+        return [(mode, await run(mode, response, args.tokens_per_update, markdown_parser)) for mode in ("single", "blocks")]
+
+    results = asyncio.run(both())
+    print(f"Respuesta de {count_tokens(response)} tokens, una actualización cada {args.tokens_per_update} tokens:")
+    print(
+        f"  {'modo':<8} {'act.':>5} {'total KiB':>10} {'KiB/act. final':>15} {'ms servidor':>12} "
+        f"{'cuadro p50':>11} {'cuadro máx':>11} {'cliente total':>14} {'reabrir KiB':>12} {'controles':>10}"
+    )
+    for mode, r in results:
+        frame = (
+            f"{r['frame_p50']:>9.2f}ms {r['frame_max']:>9.2f}ms {r['frame_total']:>12.0f}ms"
+            if r["frame_p50"] is not None else f"{'-':>11} {'-':>11} {'-':>14}"
+        )
+        print(
+            f"  {mode:<8} {r['updates']:>5} {r['total_kib']:>10.0f} {r['last_kib']:>15.2f} {r['server_ms']:>12.2f} "
+            f"{frame} {r['reopen_kib']:>12.1f} {r['controls']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Costo de las métricas por etapa (`services/metrics.py`): por medición, apagadas y
+encendidas, y por turno de `ChatController` contra `stub_llm_server.py` (LLM sin
+latencia, para que el costo no se pierda en la espera). Al final muestra el
+resumen por etapa que se escribe en el log y un extracto de /metrics.
+
+    python benchmarks/bench_metrics.py --cache cache --turns 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from stub_llm_server import StubConfig, start_stub_server
+from services.metrics import metrics
+
+
+def span_cost(iterations: int):
+    def loop():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with metrics.span("bench", cache="miss"):
+                pass
+        return (time.perf_counter() - start) / iterations * 1e9
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    empty = (time.perf_counter() - start) / iterations * 1e9
+
+    metrics.enabled = False
+    off = loop() - empty
+    metrics.enabled = True
+    on = loop() - empty
+    metrics.reset()
+    print(f"Costo de una medición: apagadas {off:.0f} ns, encendidas {on:.0f} ns")
+
+
+async def turn_cost(controller, turns: int) -> dict:
+    times = {}
+    for enabled in (False, True, False, True):
+        metrics.enabled = enabled
+        samples = []
+        for turn in range(turns):
+            # Preguntas repetidas: la búsqueda sale de la caché y el turno es casi solo el controlador
+            prompt = f"Actividades de orientación para la tropa {turn % 10}"
+            start = time.perf_counter()
+            async for _ in controller.stream_ai_response(prompt):
+                pass
+            samples.append(time.perf_counter() - start)
+            controller.clear()
+        times.setdefault(enabled, []).extend(samples)
+    return {enabled: statistics.median(samples) * 1000 for enabled, samples in times.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=Path("cache"))
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    span_cost(args.iterations)
+
+    server = start_stub_server(StubConfig(0.0, 0.0, 50))
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("API_KEY", "stub")
+
+    from controllers.chat_controller import ChatController
+    from services.retrieval_engine import RetrievalEngine
+
+    engine = RetrievalEngine(cache_folder=args.cache, model_name=args.model)
+    if not engine.warmup():
+        raise SystemExit(f"El motor de búsqueda no cargó: {engine.error}")
+    controller = ChatController(retrieval_engine=engine)
+
+    medians = asyncio.run(turn_cost(controller, args.turns))
+    print(
+        f"Turno completo (mediana de {2 * args.turns}): apagadas {medians[False]:.2f} ms, "
+        f"encendidas {medians[True]:.2f} ms"
+    )
+    print("\nResumen por etapa (lo que se escribe en el log):")
+    for line in metrics.summary():
+        print(f"  {line}")
+    print("\nExtracto de /metrics:")
+    for line in metrics.render().splitlines():
+        if "_count" in line or line.startswith("#"):
+            print(f"  {line}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
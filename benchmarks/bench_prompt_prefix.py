@@ -0,0 +1,86 @@
+"""
+Cuánto del prompt de cada turno puede salir de la caché de prefijos del proveedor
+(estimado con `PrefixCacheSimulator`) en la conversación guionizada de
+`bench_history.py`, repetida por varios usuarios:
+
+- anterior: prompt base + contexto en el mensaje de sistema, seguido del historial;
+- contexto al final: `build_messages` (prompt base y conversación primero, y el
+  contexto junto con la pregunta; el prefijo se reutiliza hasta la pregunta anterior).
+
+    python benchmarks/bench_prompt_prefix.py --turns 30 --users 5
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_history import scripted_turns
+from services.history import ConversationHistory
+from services.prompt_builder import PrefixCacheSimulator, build_messages
+from services.settings import get_base_prompt
+
+CONTEXT_WORDS = (
+    "campamento patrulla insignia progresión tropa manada caminantes rovers fuego "
+    "nudos orientación brújula servicio comunidad juego reflexión bitácora consejo"
+).split()
+CHUNKS_PER_TURN = 3
+CHUNK_WORDS = 120
+
+
+def legacy_messages(base_prompt: str, history: list[dict], context: str) -> list[dict]:
+    system_content = f"{base_prompt}\n\n--- CONTEXTO RELEVANTE ---\n{context}"
+    return [{"role": "system", "content": system_content}] + history
+
+
+def retrieved_context(rng: random.Random) -> str:
+    return "\n---\n".join(
+        " ".join(rng.choice(CONTEXT_WORDS) for _ in range(CHUNK_WORDS)) for _ in range(CHUNKS_PER_TURN)
+    )
+
+
+def run(layout, turns: int, users: int) -> dict:
+    simulator = PrefixCacheSimulator()
+    base_prompt = get_base_prompt()
+    per_turn = [[] for _ in range(turns)]
+    prompt_tokens = cached_tokens = 0
+    for user in range(users):
+        rng = random.Random(user)
+        history = ConversationHistory()
+        for turn, (question, answer) in enumerate(scripted_turns(turns)):
+            history.add("user", question)
+            reuse = simulator.observe(layout(base_prompt, history.messages(), retrieved_context(rng)))
+            history.add("assistant", answer)
+            per_turn[turn].append(reuse.ratio)
+            prompt_tokens += reuse.prompt_tokens
+            cached_tokens += reuse.cached_tokens
+    return {
+        "per_turn": [sum(ratios) / len(ratios) for ratios in per_turn],
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--users", type=int, default=5)
+    args = parser.parse_args()
+
+    layouts = (("anterior", legacy_messages), ("contexto al final", build_messages))
+    checkpoints = [t for t in (1, 2, 5, 10, 20, 30, 50) if t <= args.turns]
+    print(f"{args.users} usuarios, {args.turns} turnos cada uno; % del prompt reutilizado (simulado):")
+    print(f"  {'':<22}" + "".join(f"{f'turno {t}':>10}" for t in checkpoints) + f"{'total':>9} {'tokens sin caché':>17}")
+    for name, layout in layouts:
+        result = run(layout, args.turns, args.users)
+        total = result["cached_tokens"] / result["prompt_tokens"]
+        print(
+            f"  {name:<22}" + "".join(f"{result['per_turn'][t - 1] * 100:>9.0f}%" for t in checkpoints)
+            + f"{total * 100:>8.0f}% {result['prompt_tokens'] - result['cached_tokens']:>17,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Reordenamiento con cross-encoder sobre un índice ya construido con `preprocess_files.py`,
+con las preguntas etiquetadas de `chunking_questions.json`:
+
+- acierto top-1 y top-3 de la primera etapa (embeddings + BM25 con RRF) frente al
+  reordenado, según cuántos candidatos se reordenan;
+- latencia del cross-encoder (p50/p95 por pregunta) y tokens de contexto que llegan
+  al prompt con un puntaje mínimo;
+- cuántas preguntas vuelven al orden de la primera etapa con cada presupuesto.
+
+    python benchmarks/bench_rerank.py --cache cache --candidates 10 20 40 --budgets 50 150 500
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import faiss
+import numpy as np
+
+from bench_chunking import QUESTIONS_FILE, normalize
+from services.chunk_store import ChunkStore
+from services.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from services.reranker import RERANK_MODEL, Reranker
+from services.retrieval_engine import CHUNKS_FILE, EMBEDDING_MODEL, INDEX_FILE, reciprocal_rank_fusion, read_index_meta
+from services.settings import CACHE_FOLDER
+
+TOP_K = 3
+
+
+def first_stage(cache: Path, model_name: str, queries: list[str], depth: int) -> list[list[int]]:
+    from sentence_transformers import SentenceTransformer
+
+    lexical = LexicalIndex(cache / LEXICAL_INDEX_FILE)
+    index = faiss.read_index(str(cache / INDEX_FILE))
+    meta = read_index_meta(cache)
+    if meta.get("search_params"):
+        faiss.ParameterSpace().set_index_parameters(index, ",".join(f"{k}={v}" for k, v in meta["search_params"].items()))
+    model = SentenceTransformer(model_name)
+
+    embeddings = model.encode(queries, normalize_embeddings=bool(meta.get("normalized")))
+    _, dense = index.search(np.asarray(embeddings, dtype="float32"), depth)
+    rankings = []
+    for query, row in zip(queries, dense):
+        dense_ids = [int(i) for i in row if i >= 0]
+        lexical_ids = [i for i, _ in lexical.search(query, depth)]
+        rankings.append(reciprocal_rank_fusion([dense_ids, lexical_ids])[:depth])
+    return rankings
+
+
+def hits(ids: list[int], expected: str, store: ChunkStore, k: int) -> bool:
+    return any(expected in normalize(store[i].text) for i in ids[:k])
+
+
+def context_tokens(ids: list[int], store: ChunkStore) -> int:
+    # Misma aproximación que bench_chunking: palabras de los fragmentos del prompt
+    return sum(len(store[i].text.split()) for i in ids[:TOP_K])
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=CACHE_FOLDER)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--rerank-model", default=RERANK_MODEL)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--budgets", type=float, nargs="+", default=[50, 150, 500])
+    parser.add_argument("--min-score", type=float, default=0.5)
+    args = parser.parse_args()
+
+    questions = json.loads(QUESTIONS_FILE.read_text(encoding="utf-8"))
+    queries = [q["question"] for q in questions]
+    expected = [normalize(q["expected"]) for q in questions]
+    store = ChunkStore(args.cache / CHUNKS_FILE)
+    rankings = first_stage(args.cache, args.model, queries, max(args.candidates))
+    texts = [[(i, store[i].text) for i in ranking] for ranking in rankings]
+
+    total = len(questions)
+    base1 = sum(hits(r, e, store, 1) for r, e in zip(rankings, expected))
+    base3 = sum(hits(r, e, store, TOP_K) for r, e in zip(rankings, expected))
+    base_tokens = statistics.mean(context_tokens(r, store) for r in rankings)
+    print(f"{total} preguntas, embeddings {args.model}, cross-encoder {args.rerank_model}")
+    print(f"\n{'candidatos':>10} {'top-1':>7} {'top-3':>7} {'p50 ms':>8} {'p95 ms':>8} {'tokens':>7}")
+    print(f"{'1a etapa':>10} {base1:>7} {base3:>7} {'-':>8} {'-':>8} {base_tokens:>7.0f}")
+
+    reranker = Reranker(args.rerank_model, budget_ms=60_000, min_score=args.min_score)
+    reranker.load()
+    reranker.rerank("warmup", queries[:1], [texts[0][:2]])
+    for n in args.candidates:
+        latencies, reranked = [], []
+        for query, candidates in zip(queries, texts):
+            start = time.perf_counter()
+            # La versión cambia en cada pasada: ninguna pregunta encuentra puntajes en la caché
+            (order,) = reranker.rerank(f"n{n}", [query], [candidates[:n]])
+            latencies.append((time.perf_counter() - start) * 1000)
+            reranked.append(order)
+        top1 = sum(hits(r, e, store, 1) for r, e in zip(reranked, expected))
+        top3 = sum(hits(r, e, store, TOP_K) for r, e in zip(reranked, expected))
+        tokens = statistics.mean(context_tokens(r, store) for r in reranked)
+        print(
+            f"{n:>10} {top1:>7} {top3:>7} {percentile(latencies, 0.5):>8.1f} "
+            f"{percentile(latencies, 0.95):>8.1f} {tokens:>7.0f}"
+        )
+
+    # Con presupuesto: lotes de 4 preguntas nuevas, sin caché (peor caso)
+    n = max(args.candidates)
+    print(f"\nVuelven al orden de la 1a etapa ({n} candidatos, lotes de 4 preguntas nuevas):")
+    for budget in args.budgets:
+        reranker.budget = budget / 1000
+        reranker.fallbacks = 0
+        for start in range(0, total, 4):
+            # Espera a que termine el cálculo anterior que siguió en segundo plano
+            while reranker._busy.is_set():
+                time.sleep(0.01)
+            reranker.rerank(f"b{budget}", queries[start:start + 4], [c[:n] for c in texts[start:start + 4]])
+        print(f"  {budget:>6.0f} ms: {reranker.fallbacks}/{total}")
+
+
+if __name__ == "__main__":
+    main()
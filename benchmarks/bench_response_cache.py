@@ -0,0 +1,135 @@
+"""
+Reproduce un registro de sesiones con `ChatController` contra `stub_llm_server.py`,
+sin y con la caché de respuestas, y reporta la tasa de aciertos, los turnos en los
+que se dejó de usar (la conversación divergió) y la latencia ahorrada.
+
+El registro es un JSONL con una sesión por línea: {"prompts": ["...", "..."]}. Sin
+`--log` se generan sesiones que siguen las preguntas iniciales de `prompt.txt`.
+
+    python benchmarks/bench_response_cache.py --cache cache --log sesiones.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("API_KEY", "stub")
+
+from stub_llm_server import StubConfig, start_stub_server
+
+OPENINGS = [
+    "Quiero empezar a diseñar un programa",
+    "quiero empezar a diseñar un programa.",
+    "Hola, quiero diseñar un programa",
+    "Quiero diseñar un programa scout",
+]
+SECTIONS = {
+    "Manada": (["Raksha", "Baloo", "Hermano Gris", "Bagheera"], ["Mowha", "Dhak", "Tregua del agua", "Flor Roja"]),
+    "Tropa": (["Tortuga Lora", "Venado Cola Blanca", "Quetzal", "Ocelote"], ["Ajolote de Xochimilco", "Jaguar", "Águila solitaria", "Mapache de Cozumel"]),
+    "Comunidad": (["Cima", "Cumbre", "Cúspide", "Cenit"], ["Terranova", "Kon-Tiki", "Discovery", "7 Cumbres"]),
+}
+DURATIONS = ["2 horas", "2 horas", "90 minutos", "3 horas"]
+WEATHER = ["Soleado y con muchas ganas de estar afuera", "Lluvioso, prefieren estar bajo techo", "Nublado, disposición media"]
+GOALS = ["Aprender orientación con brújula", "Trabajo en equipo por patrullas", "Primeros auxilios básicos", "Nudos y amarres"]
+
+
+def synthetic_sessions(count: int, seed: int = 0) -> list[list[str]]:
+    """Sesiones que siguen el orden de preguntas de `prompt.txt`, con respuestas al azar."""
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        section = rng.choice(list(SECTIONS))
+        progressions, badges = SECTIONS[section]
+        sessions.append([
+            rng.choice(OPENINGS),
+            rng.choice([section, section.lower(), f"Para la {section}"]),
+            f"{rng.choice(progressions)} y la insignia {rng.choice(badges)}",
+            rng.choice(DURATIONS),
+            rng.choice(WEATHER),
+            rng.choice(GOALS),
+        ])
+    return sessions
+
+
+async def replay(sessions: list[list[str]], engine, response_cache) -> list[float]:
+    from controllers.chat_controller import ChatController
+
+    latencies = []
+    for prompts in sessions:
+        controller = ChatController(engine, response_cache=response_cache)
+        for prompt in prompts:
+            start = time.perf_counter()
+            await controller.get_ai_response(prompt)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def compare(sessions: list[list[str]], engine, response_cache) -> tuple[list[float], list[float]]:
+    # Ambas pasadas en el mismo event loop: el cliente HTTP compartido queda ligado a él
+    return await replay(sessions, engine, None), await replay(sessions, engine, response_cache)
+
+
+def report(name: str, latencies: list[float]):
+    print(
+        f"  {name:<10} total {sum(latencies):7.1f}s | p50 {statistics.median(latencies):.2f}s | "
+        f"media {statistics.mean(latencies):.2f}s por turno"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=None, help="Carpeta del índice (por defecto, la de la app).")
+    parser.add_argument("--model", default=None, help="Modelo de embeddings (por defecto, el de la app).")
+    parser.add_argument("--log", type=Path, help="JSONL de sesiones ({\"prompts\": [...]}) a reproducir.")
+    parser.add_argument("--sessions", type=int, default=40, help="Sesiones sintéticas si no hay --log.")
+    parser.add_argument("--first-token-latency", type=float, default=0.8)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, encoding="utf-8") as f:
+            sessions = [json.loads(line)["prompts"] for line in f if line.strip()]
+    else:
+        sessions = synthetic_sessions(args.sessions)
+
+    server = start_stub_server(StubConfig(args.first_token_latency, args.token_interval, args.tokens))
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    from services.response_cache import ResponseCache
+    from services.retrieval_engine import RetrievalEngine
+
+    engine_kwargs = {k: v for k, v in (("cache_folder", args.cache), ("model_name", args.model)) if v is not None}
+    engine = RetrievalEngine(**engine_kwargs)
+    if not engine.warmup():
+        sys.exit(f"No se pudo cargar el motor de búsqueda: {engine.error}")
+
+    turns = sum(len(prompts) for prompts in sessions)
+    print(f"{len(sessions)} sesiones, {turns} turnos; el modelo tarda ~{args.first_token_latency + args.tokens * args.token_interval:.1f}s por respuesta")
+    with tempfile.TemporaryDirectory() as tmp:
+        response_cache = ResponseCache(Path(tmp) / "responses.sqlite3")
+        without_cache, with_cache = asyncio.run(compare(sessions, engine, response_cache))
+        stats = response_cache.stats()
+        response_cache.close()
+    server.shutdown()
+
+    report("sin caché", without_cache)
+    report("con caché", with_cache)
+    print(
+        f"\nCaché: {stats['hits']} aciertos de {stats['hits'] + stats['misses']} consultas "
+        f"({stats['hit_rate']:.0%}), {stats['bypasses']} turnos sin consultar (conversación divergida), "
+        f"{stats['entries']} respuestas guardadas"
+    )
+    print(f"Latencia ahorrada: {stats['saved_seconds']:.1f}s ({sum(without_cache) - sum(with_cache):.1f}s medidos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Almacén de conversaciones (`services/session_store.py`):
+
+- memoria de `Message` con `__slots__` frente a la clase anterior (con `__dict__`);
+- costo de guardar mensajes para quien llama (encolar) y escritura por lotes frente
+  a una transacción por mensaje;
+- tiempo para retomar una conversación larga: la última página frente a leerla completa.
+
+    python benchmarks/bench_session_store.py --messages 100000 --session-length 5000
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from models.chat_model import Message
+from services.session_store import SessionStore
+
+RESUME_PAGE = 40
+
+
+class LegacyMessage:
+    """`Message` anterior, con un diccionario por instancia."""
+    def __init__(self, user_name: str, text: str, message_type: str):
+        self.user_name = user_name
+        self.text = text
+        self.message_type = message_type
+
+
+def message_memory(count: int):
+    texts = [f"Mensaje {i}" for i in range(count)]
+    print(f"Memoria de {count} mensajes (sin contar el texto):")
+    for name, cls in (("con __dict__", LegacyMessage), ("con __slots__", Message)):
+        tracemalloc.start()
+        messages = [cls("Tú", text, "user_message") for text in texts]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"  {name:<14} {size / count:6.0f} bytes por mensaje")
+        del messages
+
+
+def write_cost(folder: Path, count: int):
+    messages = [Message("Tú", f"Mensaje de prueba número {i}", "user_message") for i in range(count)]
+
+    store = SessionStore(folder / "batched.sqlite3")
+    start = time.perf_counter()
+    for i in range(0, count, 2):
+        store.append(f"s{i % 100}", messages[i:i + 2])
+    enqueue = time.perf_counter() - start
+    store.flush()
+    batched = time.perf_counter() - start
+
+    connection = sqlite3.connect(str(folder / "per_message.sqlite3"), isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, session_id TEXT, message_type TEXT, user_name TEXT, text TEXT, created_at REAL)")
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        # Escritura directa desde quien llama: una transacción (y su fsync) por mensaje
+        connection.execute(
+            "INSERT INTO messages (session_id, message_type, user_name, text, created_at) VALUES (?, ?, ?, ?, ?)",
+            (f"s{i % 100}", message.message_type, message.user_name, message.text, time.time()),
+        )
+    per_message = time.perf_counter() - start
+    connection.close()
+
+    print(f"\nGuardar {count} mensajes:")
+    print(f"  por lotes:       {enqueue / count * 1e6:6.1f} µs por mensaje para quien llama, {batched:.2f}s hasta escribirlos todos")
+    print(f"  uno por uno:     {per_message / count * 1e6:6.1f} µs por mensaje para quien llama, {per_message:.2f}s en total")
+    return store
+
+
+def resume_cost(store: SessionStore, session_length: int):
+    session_id = "larga"
+    for i in range(0, session_length, 2):
+        store.append(session_id, [
+            Message("Tú", f"Pregunta {i}", "user_message"),
+            Message("Scout Program Builder", "Respuesta " * 200, "bot_message"),
+        ])
+    store.flush()
+
+    start = time.perf_counter()
+    page = store.load_before(session_id, None, RESUME_PAGE)
+    total = store.count(session_id)
+    last_page = time.perf_counter() - start
+
+    start = time.perf_counter()
+    everything = store.load_before(session_id, None, session_length)
+    full = time.perf_counter() - start
+
+    print(f"\nRetomar una conversación de {total} mensajes:")
+    print(f"  últimos {len(page)}:     {last_page * 1000:7.2f} ms")
+    print(f"  completa ({len(everything)}): {full * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--writes", type=int, default=5_000)
+    parser.add_argument("--session-length", type=int, default=5_000)
+    args = parser.parse_args()
+
+    message_memory(args.messages)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = write_cost(Path(tmp), args.writes)
+        resume_cost(store, args.session_length)
+
+
+if __name__ == "__main__":
+    main()
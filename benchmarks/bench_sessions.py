@@ -0,0 +1,123 @@
+"""
+Prueba de carga de sesiones: simula N páginas que se conectan, una parte entra
+a /chat, y luego todas se desconectan y quedan inactivas. Reporta la memoria por
+sesión (tracemalloc) y cuánta se recupera cuando el recolector libera las sesiones.
+
+Como referencia también mide el esquema anterior, en el que cada página
+construía HomeView y ChatView al conectarse.
+
+    python benchmarks/bench_sessions.py --sessions 200 --chat-ratio 0.3
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("API_KEY", "stub")
+
+from fake_flet import create_page
+
+
+def _traced_kib() -> float:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / 1024
+
+
+async def _settle(until=lambda: True, timeout: float = 30):
+    # Deja que corran los manejadores que Flet agenda en hilos
+    deadline = time.monotonic() + timeout
+    await asyncio.sleep(0.2)
+    while not until() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+async def run_eager(sessions: int) -> float:
+    """Esquema anterior: ambas vistas por cada página. Devuelve KiB por sesión."""
+    from views.chat_view import ChatView
+    from views.home_view import HomeView
+
+    loop = asyncio.get_running_loop()
+    start = _traced_kib()
+    pages = []
+    for _ in range(sessions):
+        page = create_page(loop)
+        pages.append((page, HomeView(page), ChatView(page)))
+    await _settle()
+    per_session = (_traced_kib() - start) / sessions
+    for _, _, chat_view in pages:
+        chat_view.dispose()
+    pages.clear()
+    await _settle()
+    return per_session
+
+
+async def run_lazy(sessions: int, chat_ratio: float) -> dict:
+    import main as app
+    from services.session_registry import get_session_registry
+
+    loop = asyncio.get_running_loop()
+    registry = get_session_registry()
+    chat_every = max(1, round(1 / chat_ratio)) if chat_ratio > 0 else 0
+
+    start = _traced_kib()
+    started = time.perf_counter()
+    pages = []
+    for i in range(sessions):
+        page = create_page(loop)
+        app.main(page)
+        if chat_every and i % chat_every == 0:
+            page.go("/chat")
+        pages.append(page)
+    await _settle()
+    connect_time = time.perf_counter() - started
+    connected = _traced_kib()
+
+    for page in pages:
+        await page._disconnect(0)
+    await _settle(until=lambda: all(s.disconnected_at is not None for s in registry._sessions.values()))
+    registry.sweep(now=float("inf"))
+    # Flet suelta la página al expirar la sesión; aquí basta con dejar de referenciarlas
+    pages.clear()
+    await _settle()
+    released = _traced_kib()
+
+    return {
+        "per_session_kib": (connected - start) / sessions,
+        "retained_kib": max(0.0, released - start) / sessions,
+        "connect_ms": connect_time * 1000 / sessions,
+        "live_sessions": len(registry),
+    }
+
+
+async def run(args):
+    tracemalloc.start()
+    # Importa todo antes de medir para no contar los módulos
+    import main  # noqa: F401
+    eager = await run_eager(args.sessions)
+    lazy = await run_lazy(args.sessions, args.chat_ratio)
+    tracemalloc.stop()
+
+    print(f"Sesiones simuladas: {args.sessions} ({args.chat_ratio:.0%} entran a /chat)")
+    print(f"  antes (todas las vistas al conectar): {eager:.1f} KiB por sesión")
+    print(f"  después (vistas bajo demanda):        {lazy['per_session_kib']:.1f} KiB por sesión, "
+          f"{lazy['connect_ms']:.2f} ms por conexión")
+    print(f"  tras desconectar y recolectar:        {lazy['retained_kib']:.1f} KiB por sesión retenidos, "
+          f"{lazy['live_sessions']} sesiones vivas en el registro")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--chat-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
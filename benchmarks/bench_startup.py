@@ -0,0 +1,67 @@
+"""
+Mide el tiempo hasta poder servir la primera página ("/") en un proceso nuevo.
+
+- antes:   el modelo y el índice se cargan de forma síncrona antes de construir
+           la página, como ocurría cuando chat_controller los cargaba al importarse.
+- después: la carga se lanza en segundo plano y la página se construye de inmediato.
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_FOLDER = Path(__file__).parent.parent / "src"
+
+# Código que se ejecuta en un proceso limpio para cada medición
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import flet as ft
+from views.home_view import HomeView
+from views.chat_view import ChatView
+from services.retrieval_engine import get_retrieval_engine
+
+engine = get_retrieval_engine()
+if {eager}:
+    engine.warmup()
+else:
+    thread = engine.warmup_in_background()
+HomeView(ft.Page.__new__(ft.Page))
+first_page = time.perf_counter() - start
+if not {eager}:
+    thread.join()
+ready = time.perf_counter() - start
+print(json.dumps({{"first_page": first_page, "ready": ready, "engine_ok": engine.is_ready}}))
+"""
+
+
+def measure(eager: bool) -> dict:
+    script = CHILD_SCRIPT.format(src=str(SRC_FOLDER), eager=eager)
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for label, eager in (("antes (carga síncrona)", True), ("después (carga en segundo plano)", False)):
+        results = [measure(eager) for _ in range(args.runs)]
+        first_page = statistics.median(r["first_page"] for r in results)
+        ready = statistics.median(r["ready"] for r in results)
+        print(
+            f"{label}: primera página en {first_page:.2f}s, motor listo en {ready:.2f}s "
+            f"(motor cargado: {results[-1]['engine_ok']})"
+        )
+
+
+if __name__ == "__main__":
+    main()
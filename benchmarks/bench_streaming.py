@@ -0,0 +1,60 @@
+"""
+Compara el tiempo hasta el primer token (TTFT) de `ChatController` con y sin
+streaming, usando el servidor local de `stub_llm_server.py`.
+
+    python benchmarks/bench_streaming.py --first-token-latency 0.8 --tokens 400
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from stub_llm_server import StubConfig, start_stub_server
+
+
+async def _run(controller, turns: int):
+    pregunta = "Quiero empezar a diseñar un programa"
+
+    for turn in range(turns):
+        start = time.perf_counter()
+        await controller.get_ai_response(pregunta)
+        blocking = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ttft = None
+        async for _ in controller.stream_ai_response(pregunta):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        total = time.perf_counter() - start
+
+        print(
+            f"turno {turn + 1}: sin streaming primer texto a los {blocking:.2f}s | "
+            f"con streaming TTFT {ttft:.2f}s (respuesta completa {total:.2f}s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--first-token-latency", type=float, default=0.5)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    server = start_stub_server(StubConfig(args.first_token_latency, args.token_interval, args.tokens))
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("API_KEY", "stub")
+
+    from controllers.chat_controller import ChatController
+
+    asyncio.run(_run(ChatController(), args.turns))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Suite de regresión del camino completo (indexado + búsqueda + chat), sin red:
+
+1. indexa con `preprocess_files.update_index` un corpus sintético de PDFs;
+2. mide la latencia de búsqueda con consultas distintas (sin caché);
+3. reproduce conversaciones guionizadas (`bench_history.py`) con `ChatController`
+   contra `stub_llm_server.py`, con la latencia y el modo (streaming o no) elegidos.
+
+Reporta páginas y fragmentos indexados por segundo, percentiles de búsqueda, tokens
+de prompt, latencia del turno (y del primer token con streaming) y el pico de RSS de
+cada fase (cada una corre en un proceso nuevo). Los resultados se guardan en JSON;
+con `--baseline` se comparan con una corrida anterior y el proceso termina con
+código 1 si alguna métrica empeoró más que `--max-regression`.
+
+Además corre las comprobaciones de `suite_checks.py` (reintento de archivos en la
+actualización incremental, tamaño de los fragmentos, filtro de sección con la caché
+de respuestas y turnos con error en el almacén de conversaciones); si alguna falla,
+el proceso también termina con código 1. `--checks-only` corre solo esas, para CI.
+
+    python benchmarks/bench_suite.py --output base.json
+    python benchmarks/bench_suite.py --baseline base.json --max-regression 0.2
+    python benchmarks/bench_suite.py --checks-only
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_history import scripted_turns
+from suite_checks import run_checks
+from synthetic_corpus import WORDS, build_corpus
+
+# Métricas en las que más es mejor; en todas las demás (latencias, memoria, tokens) menos es mejor
+HIGHER_IS_BETTER = {"index_pages_per_s", "index_chunks_per_s"}
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss está en KiB en Linux; se suma el pico de los procesos hijos (el pool de extracción)
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) / 1024
+
+
+def run_index(args, workdir: Path) -> dict:
+    from bench_extraction import load_preprocess
+
+    folder, cache = workdir / "context", workdir / "cache"
+    build_corpus(folder, args.pages, args.pages_per_file)
+    pre = load_preprocess()
+    pre.SOURCE_FOLDER, pre.CACHE_FOLDER = folder, cache
+    pre.EMBEDDING_MODEL = args.model
+
+    start = time.perf_counter()
+    pre.update_index(full_rebuild=True)
+    elapsed = time.perf_counter() - start
+
+    from services.chunk_store import ChunkStore
+    chunks = len(ChunkStore(cache / pre.CHUNKS_FILE))
+    return {
+        "index_pages_per_s": args.pages / elapsed,
+        "index_chunks_per_s": chunks / elapsed,
+        "index_peak_rss_mib": _peak_rss_mib(),
+    }
+
+
+def retrieval_latencies(engine, queries: int, seed: int = 0) -> list[float]:
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(queries):
+        # Consultas distintas entre sí, para que ninguna salga de la caché de búsquedas
+        query = " ".join(rng.sample(WORDS, 6))
+        start = time.perf_counter()
+        engine.search(query, 6)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def replay_conversation(controller, turns: int, stream: bool, results: dict):
+    for question, _ in scripted_turns(turns):
+        start = time.perf_counter()
+        if stream:
+            first_token = None
+            async for _ in controller.stream_ai_response(question):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+            results["ttft"].append(first_token)
+        else:
+            await controller.get_ai_response(question)
+        results["turn"].append(time.perf_counter() - start)
+        results["prompt_tokens"].append(controller.last_prefix_reuse.prompt_tokens)
+
+
+async def replay_conversations(engine, conversations: int, turns: int, stream: bool) -> dict:
+    from controllers.chat_controller import ChatController
+
+    results = {"turn": [], "ttft": [], "prompt_tokens": []}
+    controllers = [ChatController(retrieval_engine=engine) for _ in range(conversations)]
+    # Las conversaciones corren a la vez, como varias sesiones en el mismo proceso
+    await asyncio.gather(*(replay_conversation(c, turns, stream, results) for c in controllers))
+    return results
+
+
+def run_chat(args, workdir: Path) -> dict:
+    from stub_llm_server import StubConfig, start_stub_server
+
+    server = start_stub_server(StubConfig(args.first_token_latency, args.token_interval, args.tokens))
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("API_KEY", "stub")
+
+    from services.retrieval_engine import RetrievalEngine
+
+    start = time.perf_counter()
+    engine = RetrievalEngine(cache_folder=workdir / "cache", model_name=args.model)
+    if not engine.warmup():
+        raise SystemExit(f"El motor de búsqueda no cargó: {engine.error}")
+    warmup = time.perf_counter() - start
+
+    search = retrieval_latencies(engine, args.queries)
+    chat = asyncio.run(replay_conversations(engine, args.conversations, args.turns, args.stream))
+    server.shutdown()
+
+    result = {
+        "engine_warmup_seconds": warmup,
+        "retrieval_p50_ms": percentile(search, 50) * 1000,
+        "retrieval_p95_ms": percentile(search, 95) * 1000,
+        "retrieval_p99_ms": percentile(search, 99) * 1000,
+        "prompt_tokens_mean": statistics.mean(chat["prompt_tokens"]),
+        "prompt_tokens_max": max(chat["prompt_tokens"]),
+        "turn_p50_ms": percentile(chat["turn"], 50) * 1000,
+        "turn_p99_ms": percentile(chat["turn"], 99) * 1000,
+        "chat_peak_rss_mib": _peak_rss_mib(),
+    }
+    if args.stream:
+        result["ttft_p50_ms"] = percentile(chat["ttft"], 50) * 1000
+        result["ttft_p99_ms"] = percentile(chat["ttft"], 99) * 1000
+    return result
+
+
+def run_phase(phase: str, workdir: Path) -> dict:
+    # Cada fase en un proceso nuevo, para que su pico de RSS no incluya el de la anterior
+    command = [sys.executable, __file__, *sys.argv[1:], "--child", phase, "--workdir", str(workdir)]
+    output = subprocess.run(command, capture_output=True, text=True)
+    if output.returncode:
+        raise SystemExit(f"Falló la fase {phase}:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Imprime el cambio de cada métrica frente a la línea base y devuelve las que empeoraron de más."""
+    regressions = []
+    print(f"\nFrente a la línea base (tolerancia {max_regression:.0%}):")
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = (value - previous) / previous
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > max_regression:
+            regressions.append(name)
+            flag = "  <- regresión"
+        print(f"  {name:<24} {previous:>12.2f} -> {value:>12.2f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--pages-per-file", type=int, default=50)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--queries", type=int, default=200, help="Búsquedas para los percentiles.")
+    parser.add_argument("--conversations", type=int, default=4, help="Conversaciones simultáneas.")
+    parser.add_argument("--turns", type=int, default=8, help="Turnos por conversación.")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="Usa respuestas sin streaming.")
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="Archivo JSON donde guardar los resultados.")
+    parser.add_argument("--baseline", type=Path, help="Resultados JSON de una corrida anterior.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Empeoramiento permitido (0.2 = 20%%).")
+    parser.add_argument("--checks-only", action="store_true", help="Solo las comprobaciones, sin medir tiempos.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        phase = {"index": run_index, "chat": run_chat, "checks": run_checks}[args.child]
+        print(json.dumps(phase(args, Path(args.workdir))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checks = run_phase("checks", Path(tmp))
+        print("Comprobaciones:")
+        for name, (passed, detail) in checks.items():
+            print(f"  {'OK   ' if passed else 'FALLA'} {name:<26} {detail}")
+        failed = [name for name, (passed, _) in checks.items() if not passed]
+        if args.checks_only:
+            if failed:
+                raise SystemExit(f"Fallaron: {', '.join(failed)}")
+            return
+        metrics = run_phase("index", Path(tmp))
+        metrics.update(run_phase("chat", Path(tmp)))
+
+    config = {name: value for name, value in vars(args).items()
+              if name not in ("output", "baseline", "max_regression", "checks_only", "child", "workdir")}
+    print(f"\n{args.pages} páginas, {args.conversations} conversaciones de {args.turns} turnos "
+          f"({'con' if args.stream else 'sin'} streaming):")
+    for name, value in metrics.items():
+        print(f"  {name:<24} {value:>12.2f}")
+
+    if args.output:
+        results = {"config": config, "metrics": metrics, "checks": {name: passed for name, (passed, _) in checks.items()}}
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"\nResultados guardados en {args.output}")
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("config") != config:
+            print("Aviso: la línea base se corrió con otra configuración; la comparación puede no ser válida.")
+        regressions = compare(metrics, baseline["metrics"], args.max_regression)
+    if failed or regressions:
+        problems = ([f"fallaron {', '.join(failed)}"] if failed else []) + ([f"regresión en {', '.join(regressions)}"] if regressions else [])
+        raise SystemExit("; ".join(problems).capitalize())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Latencia por turno (p50/p99 del tiempo hasta el primer token y de la respuesta
+completa) según el número de workers, con el modelo y el índice en el sidecar
+compartido (`services/retrieval_sidecar.py`) o cargados en cada worker.
+
+Cada worker es un proceso que atiende varias sesiones simultáneas con
+`ChatController`, contra el servidor local de `stub_llm_server.py`; no pasa por
+el websocket de Flet, así que mide lo que cambia con los workers (búsqueda,
+modelo de embeddings y CPU compartida), no el render.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --sessions 8 --turns 5 \\
+        --cache cache --model sentence-transformers/all-MiniLM-L6-v2
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_FOLDER = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(SRC_FOLDER))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from stub_llm_server import StubConfig, start_stub_server
+
+QUESTIONS = [
+    "Actividades para una reunión de tropa sobre orientación",
+    "Cómo preparar un campamento de manada de dos días",
+    "Juegos de desfogue para caminantes en un salón",
+    "Programa de una tarde para trabajar la insignia de servicio",
+    "Qué materiales necesito para una reunión de nudos y amarres",
+]
+
+
+async def _session(controller, session: int, turns: int, ttfts: list, totals: list):
+    for turn in range(turns):
+        # Preguntas distintas en cada sesión para no medir la caché de búsquedas
+        prompt = f"{QUESTIONS[(session + turn) % len(QUESTIONS)]} (sesión {session}, turno {turn})"
+        start = time.perf_counter()
+        ttft = None
+        async for _ in controller.stream_ai_response(prompt):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        totals.append(time.perf_counter() - start)
+        ttfts.append(ttft if ttft is not None else totals[-1])
+
+
+def run_worker(args):
+    """Un worker: carga el motor (o se conecta al sidecar) y atiende `--sessions` sesiones a la vez."""
+    from controllers.chat_controller import ChatController
+    from services.retrieval_engine import RetrievalEngine, get_retrieval_engine
+
+    start = time.perf_counter()
+    if os.getenv("RETRIEVAL_SOCKET"):
+        engine = get_retrieval_engine()
+    else:
+        engine = RetrievalEngine(cache_folder=args.cache, model_name=args.model)
+    if not engine.warmup():
+        raise SystemExit(f"El motor de búsqueda no cargó: {engine.error}")
+    startup = time.perf_counter() - start
+
+    ttfts, totals = [], []
+
+    async def sessions():
+        await asyncio.gather(*(
+            _session(ChatController(retrieval_engine=engine), args.worker_id * args.sessions + i, args.turns, ttfts, totals)
+            for i in range(args.sessions)
+        ))
+
+    asyncio.run(sessions())
+    print(json.dumps({
+        "ttft": ttfts,
+        "total": totals,
+        "startup": startup,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def start_sidecar(socket_path: str, args) -> subprocess.Popen:
+    sidecar = subprocess.Popen(
+        [sys.executable, "-m", "services.retrieval_sidecar", "--socket", socket_path,
+         "--cache", str(args.cache), "--model", args.model],
+        cwd=SRC_FOLDER, stderr=subprocess.DEVNULL,
+    )
+    while not os.path.exists(socket_path):
+        if sidecar.poll() is not None:
+            raise SystemExit("El sidecar de búsqueda terminó al arrancar.")
+        time.sleep(0.1)
+    return sidecar
+
+
+def run_workers(count: int, args, env: dict) -> list[dict]:
+    workers = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--worker", "--worker-id", str(i), "--sessions", str(args.sessions),
+             "--turns", str(args.turns), "--cache", str(args.cache), "--model", args.model],
+            env=env, stdout=subprocess.PIPE, text=True,
+        )
+        for i in range(count)
+    ]
+    results = []
+    for worker in workers:
+        output, _ = worker.communicate()
+        if worker.returncode != 0:
+            raise SystemExit("Un worker terminó con error.")
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=8, help="Sesiones simultáneas por worker.")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--cache", type=Path, default=Path("cache"))
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--modes", nargs="+", choices=["sidecar", "por-worker"], default=["sidecar", "por-worker"])
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    server = start_stub_server(StubConfig(args.first_token_latency, args.token_interval, args.tokens))
+    # Clave del sidecar: la heredan él y los workers, como con serve.py
+    os.environ.setdefault("RETRIEVAL_AUTHKEY", secrets.token_hex(32))
+    base_env = dict(os.environ, API_BASE_URL=f"http://127.0.0.1:{server.server_port}/v1", API_KEY="stub", TQDM_DISABLE="1")
+    base_env.pop("RETRIEVAL_SOCKET", None)
+
+    print(
+        f"{args.sessions} sesiones por worker, {args.turns} turnos cada una; "
+        f"LLM simulado: primer token a {args.first_token_latency}s, {args.tokens} tokens"
+    )
+    print(f"  {'modo':<11} {'workers':>7} {'TTFT p50':>9} {'p99':>7} {'total p50':>10} {'p99':>7} {'arranque':>9} {'RSS/worker':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            sidecar = None
+            env = dict(base_env)
+            if mode == "sidecar":
+                env["RETRIEVAL_SOCKET"] = socket_path = os.path.join(tmp, "retrieval.sock")
+                sidecar = start_sidecar(socket_path, args)
+            try:
+                for count in args.workers:
+                    results = run_workers(count, args, env)
+                    ttfts = [value for result in results for value in result["ttft"]]
+                    totals = [value for result in results for value in result["total"]]
+                    print(
+                        f"  {mode:<11} {count:>7} {statistics.median(ttfts) * 1000:>7.0f}ms {percentile(ttfts, 99) * 1000:>5.0f}ms "
+                        f"{statistics.median(totals) * 1000:>8.0f}ms {percentile(totals, 99) * 1000:>5.0f}ms "
+                        f"{max(r['startup'] for r in results):>8.1f}s {statistics.mean(r['rss_mb'] for r in results):>8.0f} MB"
+                    )
+            finally:
+                if sidecar is not None:
+                    sidecar.terminate()
+                    sidecar.wait()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Página de Flet sin cliente real para benchmarks. `RecordingConnection` procesa
+los comandos igual que el servidor de Flet, pero en lugar de mandarlos por el
+websocket solo los serializa y cuenta los bytes que se habrían enviado.
+"""
+import asyncio
+import json
+import uuid
+from typing import List, Optional
+
+import flet as ft
+from flet.core.local_connection import LocalConnection
+from flet.core.protocol import (
+    ClientActions,
+    ClientMessage,
+    Command,
+    CommandEncoder,
+    PageCommandResponsePayload,
+    PageCommandsBatchResponsePayload,
+)
+
+
+class RecordingConnection(LocalConnection):
+    def __init__(self):
+        super().__init__()
+        self.page_url = "http://localhost"
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+    def reset_counters(self):
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+    def send_command(self, session_id: str, command: Command):
+        response = self.send_commands(session_id, [command])
+        return PageCommandResponsePayload(result=response.results[0] if response.results else "", error="")
+
+    def send_commands(self, session_id: str, commands: List[Command]):
+        results = []
+        messages = []
+        for command in commands:
+            result, message = self._process_command(command)
+            if command.name in ["add", "get"]:
+                results.append(result)
+            if message:
+                messages.append(message)
+        if messages:
+            payload = json.dumps(
+                ClientMessage(ClientActions.PAGE_CONTROLS_BATCH, messages),
+                cls=CommandEncoder,
+                separators=(",", ":"),
+            )
+            self.bytes_sent += len(payload.encode("utf-8"))
+            self.messages_sent += 1
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+    def _process_get_command(self, values: List[str]):
+        # No hay cliente real que conteste; las propiedades de la página quedan vacías
+        return "", None
+
+
+def create_page(loop: Optional[asyncio.AbstractEventLoop] = None, conn: Optional[RecordingConnection] = None) -> ft.Page:
+    """Crea una página conectada a una `RecordingConnection` (nueva si no se pasa una)."""
+    loop = loop or asyncio.get_event_loop()
+    page = ft.Page(conn or RecordingConnection(), uuid.uuid4().hex, loop)
+    page.route = "/"
+    return page
@@ -0,0 +1,140 @@
+"""
+Servidor local compatible con la API de OpenAI (`/v1/chat/completions`) para
+pruebas y benchmarks. No llama a ningún modelo: responde con texto de relleno
+simulando la latencia del primer token y el ritmo de generación.
+
+Uso:
+    python benchmarks/stub_llm_server.py --port 8765 --first-token-latency 0.8
+
+Luego apunta la app al servidor:
+    API_BASE_URL=http://127.0.0.1:8765/v1 API_KEY=stub python src/main.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER_WORDS = (
+    "La actividad inicia con un juego de integración para toda la Tropa, "
+    "seguido de un reto por patrullas relacionado con la insignia de aventura. "
+).split()
+
+
+class StubConfig:
+    """Parámetros de la respuesta simulada."""
+    def __init__(self, first_token_latency: float = 0.5, token_interval: float = 0.01, tokens: int = 200):
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.tokens = tokens
+
+
+def _fake_tokens(n: int) -> list[str]:
+    return [FILLER_WORDS[i % len(FILLER_WORDS)] + " " for i in range(n)]
+
+
+def _make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # Silencioso: los benchmarks imprimen sus propios resultados
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            tokens = _fake_tokens(min(config.tokens, body.get("max_tokens") or config.tokens))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = body.get("model", "stub")
+
+            time.sleep(config.first_token_latency)
+            if body.get("stream"):
+                self._stream(completion_id, model, tokens)
+            else:
+                time.sleep(config.token_interval * len(tokens))
+                self._complete(completion_id, model, "".join(tokens))
+
+        def _complete(self, completion_id: str, model: str, text: str):
+            payload = json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _stream(self, completion_id: str, model: str, tokens: list[str]):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(config.token_interval)
+                self._send_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                })
+            self._send_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _send_event(self, data: dict):
+            self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_stub_server(config: StubConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Arranca el servidor en un hilo en segundo plano y lo devuelve (usa `server.server_port`)."""
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatible con OpenAI para pruebas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="Segundos antes del primer token.")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Segundos entre tokens.")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens por respuesta.")
+    args = parser.parse_args()
+
+    config = StubConfig(args.first_token_latency, args.token_interval, args.tokens)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(config))
+    print(f"Servidor de prueba escuchando en http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Comprobaciones de la suite de regresión (`bench_suite.py`): a diferencia de las
+métricas, cada una pasa o falla. Cubren errores que ya se corrigieron una vez:
+
+- un archivo que no se pudo leer se vuelve a intentar en la siguiente actualización
+  incremental del índice (y no queda en el manifiesto como "sin cambios");
+- ningún fragmento pasa de CHUNK_MAX_TOKENS, ni con líneas de puntos o palabras enormes;
+- el filtro de sección se conserva cuando los turnos salen de la caché de respuestas;
+- un turno con error no se guarda en el almacén de conversaciones.
+
+Cada comprobación lanza AssertionError con la explicación si falla.
+"""
+import asyncio
+import json
+import os
+import socket
+from pathlib import Path
+
+from synthetic_corpus import write_pdf
+
+# Conversación con la que se comprueba el filtro: la sección se menciona en el segundo turno
+FILTER_CONVERSATION = ["Quiero empezar a diseñar un programa", "Manada", "¿Qué actividades recomiendas?"]
+
+
+def check_extraction_retry(pre, folder: Path) -> str:
+    """Indexa un PDF dañado, lo repara y revisa que la actualización incremental lo agregue."""
+    (folder / "context").mkdir(parents=True, exist_ok=True)
+    pre.SOURCE_FOLDER, pre.CACHE_FOLDER = folder / "context", folder / "cache"
+    write_pdf(pre.SOURCE_FOLDER / "bueno.pdf", 8, seed=1)
+    (pre.SOURCE_FOLDER / "dañado.pdf").write_bytes(b"%PDF-1.4 truncado")
+    pre.update_index(full_rebuild=True)
+    files = json.loads((pre.CACHE_FOLDER / pre.MANIFEST_FILE).read_text(encoding="utf-8"))["files"]
+    assert "dañado.pdf" not in files, "el archivo que no se pudo leer quedó en el manifiesto"
+
+    write_pdf(pre.SOURCE_FOLDER / "dañado.pdf", 8, seed=2)
+    pre.update_index()
+    files = json.loads((pre.CACHE_FOLDER / pre.MANIFEST_FILE).read_text(encoding="utf-8"))["files"]
+    chunk_ids = files.get("dañado.pdf", {}).get("chunk_ids")
+    assert chunk_ids, "la actualización incremental no volvió a intentar el archivo reparado"
+    return f"reintentado en la siguiente actualización ({len(chunk_ids)} fragmentos)"
+
+
+def check_chunk_size(cache_folder: Path) -> str:
+    from services.chunk_store import ChunkStore
+    from services.chunking import CHUNK_MAX_TOKENS, chunk_document
+    from services.retrieval_engine import CHUNKS_FILE
+    from services.tokens import count_tokens
+
+    texts = ["Certifico que" + "." * 2000 + " fin.", "palabra " + "x" * 3000, " ".join(["palabra"] * 2000)]
+    chunks = [chunk.text for text in texts for chunk in chunk_document([(1, text)], "prueba")]
+    store = ChunkStore(cache_folder / CHUNKS_FILE)
+    chunks += [chunk.text for _, chunk in store.items()]
+    store.close()
+    largest = max(count_tokens(text) for text in chunks)
+    assert largest <= CHUNK_MAX_TOKENS, f"un fragmento tiene {largest} tokens (máximo {CHUNK_MAX_TOKENS})"
+    return f"{len(chunks)} fragmentos, el mayor de {largest} tokens"
+
+
+async def check_filter_after_cache_hits(engine, folder: Path) -> str:
+    """La misma conversación tres veces: desde la segunda, sus turnos salen de la caché de respuestas."""
+    from controllers.chat_controller import ChatController
+    from services.response_cache import ResponseCache
+
+    cache = ResponseCache(path=folder / "responses.sqlite3")
+    for attempt in range(3):
+        controller = ChatController(retrieval_engine=engine, response_cache=cache)
+        for prompt in FILTER_CONVERSATION:
+            async for _ in controller.stream_ai_response(prompt):
+                pass
+        assert controller.search_filter.section == "manada", (
+            f"conversación {attempt + 1}: el filtro quedó en {controller.search_filter} ({cache.hits} aciertos de la caché)"
+        )
+    assert cache.hits, "ningún turno salió de la caché de respuestas; la comprobación no probó nada"
+    return f"section='manada' en las 3 conversaciones ({cache.hits} turnos desde la caché)"
+
+
+def _closed_port() -> int:
+    # Un puerto que estaba libre: las peticiones a él fallan con error de conexión
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def check_error_turn_not_persisted(engine, folder: Path) -> str:
+    """Un turno que falla y uno que termina bien en `ChatView`: solo el segundo debe quedar guardado."""
+    from openai import AsyncOpenAI
+
+    import services.retrieval_engine as retrieval_engine
+    from controllers.chat_controller import ChatController
+    from fake_flet import RecordingConnection, create_page
+    from services.session_store import SessionStore
+    from views.chat_view import ChatView
+
+    retrieval_engine._engine = engine  # La vista usa el motor compartido del proceso
+    page = create_page(asyncio.get_running_loop(), RecordingConnection())
+    view = ChatView(page)
+    page.views.append(view)
+    page.update()
+    store = SessionStore(folder / "sessions.sqlite3")
+    view.transcript.attach(store, "suite")
+
+    unreachable = AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{_closed_port()}/v1", max_retries=0)
+    view.controller = ChatController(retrieval_engine=engine, client=unreachable, response_cache=None)
+    view.new_message_field.value = "Pregunta que va a fallar"
+    await view.send_message_click(None)
+    assert view.controller.last_error is not None, "el turno con el servidor caído no reportó error"
+
+    view.controller = ChatController(retrieval_engine=engine, response_cache=None)
+    view.new_message_field.value = "Pregunta que sí se responde"
+    await view.send_message_click(None)
+    store.flush(5)
+
+    stored = [message for _, message in store.load_before("suite", None, 10)]
+    texts = [message.text for message in stored]
+    assert len(stored) == 2 and texts[0] == "Pregunta que sí se responde", f"mensajes guardados: {texts}"
+    assert not any(text.startswith("Ocurrió un error") for text in texts), "se guardó el texto del error"
+    return "solo se guardó el turno que terminó bien"
+
+
+def run_checks(args, workdir: Path) -> dict:
+    """Corre todas las comprobaciones y devuelve {nombre: [pasó, detalle]}."""
+    from bench_extraction import load_preprocess
+    from stub_llm_server import StubConfig, start_stub_server
+
+    folder = workdir / "checks"
+    results = {}
+
+    def record(name: str, check, *check_args):
+        try:
+            result = check(*check_args)
+            if asyncio.iscoroutine(result):
+                result = asyncio.run(result)
+            results[name] = [True, result]
+        except AssertionError as e:
+            results[name] = [False, str(e)]
+
+    pre = load_preprocess()
+    pre.EMBEDDING_MODEL = args.model
+    record("extraction_retry", check_extraction_retry, pre, folder)
+    record("chunk_size", check_chunk_size, folder / "cache")
+
+    server = start_stub_server(StubConfig(0.01, 0.001, 20))
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("API_KEY", "stub")
+    from services.retrieval_engine import RetrievalEngine
+
+    engine = RetrievalEngine(cache_folder=folder / "cache", model_name=args.model)
+    if not engine.warmup():
+        raise SystemExit(f"El motor de búsqueda no cargó: {engine.error}")
+    record("filter_after_cache_hits", check_filter_after_cache_hits, engine, folder)
+    record("error_turn_not_persisted", check_error_turn_not_persisted, engine, folder)
+    server.shutdown()
+    return results
@@ -0,0 +1,74 @@
+"""
+Genera PDFs sintéticos con texto real (no imágenes) para los benchmarks del
+preprocesamiento. El PDF se escribe a mano con una fuente estándar, sin
+dependencias adicionales.
+"""
+import random
+from pathlib import Path
+
+WORDS = (
+    "manada tropa comunidad progresión insignia aventura patrulla seisena juego "
+    "actividad objetivo materiales reflexión nudos campamento fogata brújula mapa "
+    "naturaleza servicio ley promesa scouter lobato caminante reto equipo consejo "
+    "raksha baloo bagheera quetzal ocelote cima cumbre jaguar águila ajolote kon-tiki"
+).split()
+
+
+def _page_text(rng: random.Random, page_number: int, lines: int) -> list[str]:
+    title = f"Capitulo {page_number // 10 + 1}. Actividad {page_number + 1}"
+    body = [" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "." for _ in range(lines)]
+    return [title, ""] + body
+
+
+def _escape(text: str) -> bytes:
+    # Las fuentes estándar usan WinAnsi: latin-1 cubre los acentos del español
+    raw = text.encode("latin-1", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def write_pdf(path: Path, pages: int, lines_per_page: int = 40, seed: int = 0):
+    rng = random.Random(seed)
+    objects: list[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog = add(b"")  # se completa al final
+    pages_obj = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids = []
+    for n in range(pages):
+        lines = _page_text(rng, n, lines_per_page)
+        stream = b"BT /F1 9 Tf 12 TL 40 800 Td " + b" ".join(b"(" + _escape(line) + b") '" for line in lines) + b" ET"
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    objects[pages_obj - 1] = (
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    path.write_bytes(bytes(out))
+
+
+def build_corpus(folder: Path, total_pages: int = 2000, pages_per_file: int = 100) -> list[Path]:
+    """Crea `total_pages` páginas repartidas en PDFs de `pages_per_file` páginas."""
+    folder.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i, start in enumerate(range(0, total_pages, pages_per_file)):
+        path = folder / f"manual_{i:03d}.pdf"
+        write_pdf(path, min(pages_per_file, total_pages - start), seed=i)
+        files.append(path)
+    return files
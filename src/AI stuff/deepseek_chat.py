@@ -1,166 +1,219 @@
-import os
+"""
+Scout Program Builder en la consola, con el mismo índice de búsqueda, prompt y
+controlador de conversación que la app de Flet.
+
+Chat interactivo:
+    python "src/AI stuff/deepseek_chat.py"
+
+Modo por lotes: lee un JSONL de peticiones, las procesa en paralelo y escribe cada
+resultado en otro JSONL en cuanto termina. Cada línea de entrada es una pregunta
+(`{"id": "...", "prompt": "..."}`) o una conversación de varios turnos, p. ej. para
+pedir un programa completo (`{"id": "...", "turns": ["...", "..."]}`):
+    python "src/AI stuff/deepseek_chat.py" --batch peticiones.jsonl --output programas.jsonl --workers 4
+"""
+import argparse
+import asyncio
 import json
-from openai import OpenAI, APIStatusError
-from dotenv import load_dotenv
+import random
+import sys
+import time
 from pathlib import Path
+from typing import Optional
+
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+# La búsqueda de contexto y la conversación son las mismas que usa la app (src/services)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from controllers.chat_controller import ChatController
+from services.llm_client import get_llm_client
+from services.retrieval_engine import RetrievalEngine, get_retrieval_engine
 
 # --- CONFIGURACIÓN ---
-try:
-    # Busca el .env en la raíz del proyecto
-    env_path = Path(__file__).parent.parent / '.env'
-    load_dotenv(dotenv_path=env_path)
-except Exception as e:
-    print(f"Advertencia: No se pudo cargar el archivo .env. Error: {e}")
+BATCH_WORKERS = 4
+# Intentos por turno en el modo por lotes. Son los únicos: el cliente del modo por
+# lotes no reintenta por su cuenta (max_retries=0), así que no se multiplican.
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 2.0  # Segundos de espera antes del primer reintento (se duplica en cada uno)
+BACKOFF_MAX = 60.0
+# Errores pasajeros que vale la pena reintentar (conexión, límite de peticiones, 5xx)
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
 
-# --- FUNCIONES AUXILIARES ---
+EXIT_WORDS = ('salir', 'exit', 'quit')
 
-def load_system_prompt(prompt_path: Path) -> str:
-    """Carga el prompt del sistema desde un archivo de texto."""
-    print(f"Cargando prompt del sistema desde: {prompt_path}...")
-    try:
-        if not prompt_path.is_file():
-            raise FileNotFoundError(f"El archivo de prompt '{prompt_path.name}' no se encontró en la carpeta 'prompts'.")
-        
-        prompt = prompt_path.read_text(encoding='utf-8')
-        print("¡Prompt del sistema cargado exitosamente!")
-        return prompt
-    except Exception as e:
-        raise RuntimeError(f"No se pudo leer el archivo de prompt: {e}")
-
-def setup_client() -> OpenAI:
-    """Configura y devuelve el cliente de OpenAI para la API de DeepSeek."""
-    api_key = os.getenv("API_KEY")
-    if not api_key:
-        raise ValueError("No se encontró la DEEPSEEK_API_KEY. Revisa tu archivo .env.")
-    
-    return OpenAI(api_key=api_key, base_url="https://api.deepseek.com/v1")
-
-def load_context_chunks(index_path: Path) -> list[str]:
-    """Carga los trozos de contexto desde el archivo de índice JSON."""
-    print(f"Cargando índice de contexto desde: {index_path}...")
-    try:
-        if not index_path.is_file():
-            raise FileNotFoundError(
-                f"El archivo de índice '{index_path.name}' no se encontró. "
-                "Por favor, ejecuta 'python create_index.py' para generarlo."
-            )
-        
-        with open(index_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        print(f"¡Índice cargado! {len(chunks)} trozos de conocimiento disponibles.")
-        return chunks
-    except Exception as e:
-        raise RuntimeError(f"No se pudo leer el archivo de índice: {e}")
-
-def find_relevant_context(query: str, chunks: list[str], top_k: int = 5) -> str:
-    """Encuentra los 'top_k' trozos de contexto más relevantes para una consulta."""
-    query_words = set(query.lower().split())
-    if not query_words:
-        return ""
-
-    scores = []
-    for i, chunk in enumerate(chunks):
-        chunk_words = set(chunk.lower().split())
-        common_words = query_words.intersection(chunk_words)
-        score = len(common_words)
-        if score > 0:
-            scores.append((score, i))
-    
-    scores.sort(reverse=True)
-    top_indices = [i for score, i in scores[:top_k]]
-    
-    relevant_chunks = [chunks[i] for i in top_indices]
-    
-    if relevant_chunks:
-        print(f"-> Se encontraron {len(relevant_chunks)} trozos de contexto relevantes para la consulta.")
-    
-    return "\n---\n".join(relevant_chunks)
-
-def create_system_prompt_with_context(base_prompt: str, relevant_context: str) -> dict:
-    """Crea el mensaje del sistema para la API."""
-    system_content = f"""
-{base_prompt}
-
----
-4. Conocimiento Relevante para la Pregunta Actual
-Usa la siguiente información de tus archivos para responder la pregunta del usuario.
-
-CONTEXTO RELEVANTE:
-{relevant_context if relevant_context else "No se encontró contexto relevante en los archivos para esta pregunta."}
----
-"""
-    return {"role": "system", "content": system_content}
+# --- FUNCIONES AUXILIARES ---
 
-def run_chat_loop(client: OpenAI, context_chunks: list[str], base_prompt: str):
+def load_retrieval_engine() -> RetrievalEngine:
+    """Carga el índice de búsqueda (FAISS + BM25) que genera preprocess_files.py."""
+    print("Cargando el índice de búsqueda de contexto...")
+    engine = get_retrieval_engine()
+    if not engine.warmup():
+        raise RuntimeError(
+            f"No se pudo cargar el índice de búsqueda: {engine.error}. "
+            "Por favor, ejecuta 'python preprocess_files.py' para generarlo."
+        )
+    print("¡Índice cargado!")
+    return engine
+
+async def run_chat_loop(engine: RetrievalEngine):
     """Maneja el bucle principal de la conversación en la consola."""
-    historial_mensajes = [] 
-    
+    controller = ChatController(retrieval_engine=engine)
+
     print("\n¡Conexión exitosa! El Scout Program Builder está listo.")
     print("Para comenzar, escribe algo como 'Quiero empezar a diseñar un programa'.")
-        
+
     while True:
-        try:
-            user_prompt = input("\nTú: ")
-            if user_prompt.lower() in ['salir', 'exit', 'quit']:
-                print("¡Siempre listos para servir! ¡Hasta luego!")
-                break
-            
-            historial_mensajes.append({"role": "user", "content": user_prompt})
-            
-            relevant_context = find_relevant_context(user_prompt, context_chunks)
-            
-            system_message = create_system_prompt_with_context(base_prompt, relevant_context)
-            
-            messages_to_send = [system_message] + historial_mensajes
-            
-            print("\nScout Program Builder está pensando...")
-
-            chat_completion = client.chat.completions.create(
-                model="deepseek-coder",
-                messages=messages_to_send,
-                max_tokens=4096,
-                temperature=0.7, 
-            )
-            
-            ai_response = chat_completion.choices[0].message.content
-            
-            historial_mensajes.append({"role": "assistant", "content": ai_response})
-
-            print(f"\nScout Program Builder: {ai_response}")
-
-        except APIStatusError as e:
-            # ... (manejo de errores)
-            print(f"Error de API: {e.message}")
-            break
-        except Exception as e:
-            print(f"\nOcurrió un error inesperado: {e}")
+        # input() bloquea, así que corre en un hilo aparte del event loop
+        user_prompt = await asyncio.to_thread(input, "\nTú: ")
+        if user_prompt.lower() in EXIT_WORDS:
+            print("¡Siempre listos para servir! ¡Hasta luego!")
             break
+        if not user_prompt.strip():
+            continue
+
+        print("\nScout Program Builder: ", end="", flush=True)
+        async for delta in controller.stream_ai_response(user_prompt):
+            print(delta, end="", flush=True)
+        print()
+
+# --- MODO POR LOTES ---
+
+def parse_request(line: str, line_number: int) -> dict:
+    """Convierte una línea del JSONL de entrada en {"id", "turns"}."""
+    request = json.loads(line)
+    turns = request.get("turns") or [request.get("prompt")]
+    if not isinstance(turns, list) or not all(isinstance(turn, str) and turn.strip() for turn in turns):
+        raise ValueError("se esperaba 'prompt' o una lista 'turns' con texto")
+    return {"id": str(request.get("id", line_number)), "turns": turns}
+
+def backoff_delay(attempt: int) -> float:
+    """Espera antes del reintento `attempt` (1, 2, ...): exponencial con variación aleatoria."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+async def answer_turn(controller: ChatController, prompt: str, max_attempts: int, result: dict) -> str:
+    """
+    Obtiene la respuesta de un turno, reintentando los errores pasajeros con espera
+    exponencial (cada intento se suma a `result["attempts"]`). Si el turno no se
+    pudo completar, lanza el último error.
+    """
+    for attempt in range(1, max_attempts + 1):
+        result["attempts"] += 1
+        response = await controller.get_ai_response(prompt)
+        error = controller.last_error
+        if error is None:
+            return response
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt == max_attempts:
+            raise error
+        await asyncio.sleep(backoff_delay(attempt))
+
+async def process_request(engine: RetrievalEngine, client: AsyncOpenAI, request: dict, max_attempts: int) -> dict:
+    """Procesa una petición (todos sus turnos, en una conversación propia)."""
+    controller = ChatController(retrieval_engine=engine, client=client)
+    start = time.perf_counter()
+    result = {"id": request["id"], "turns": [], "attempts": 0, "error": None}
+    try:
+        for prompt in request["turns"]:
+            response = await answer_turn(controller, prompt, max_attempts, result)
+            result["turns"].append({"prompt": prompt, "response": response})
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        controller.clear()
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def completed_ids(output: Path) -> set[str]:
+    """Ids que ya tienen un resultado sin error en el archivo de salida (para `--resume`)."""
+    if not output.exists():
+        return set()
+    done = set()
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Línea cortada si el proceso anterior se interrumpió
+            if not result.get("error"):
+                done.add(result["id"])
+    return done
+
+async def run_batch(engine: RetrievalEngine, input_path: Path, output: Path, workers: int, max_attempts: int, resume: bool):
+    """
+    Lee las peticiones de `input_path` y las reparte entre `workers` tareas. La cola
+    es acotada, así que el archivo se lee conforme avanza el trabajo y no completo
+    en memoria; cada resultado se escribe (y se vacía a disco) en cuanto termina.
+    """
+    skip = completed_ids(output) if resume else set()
+    # Mismo pool de conexiones que el cliente compartido, pero sin sus reintentos
+    client = get_llm_client().with_options(max_retries=0)
+    queue: asyncio.Queue[Optional[dict]] = asyncio.Queue(maxsize=workers * 2)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    with open(output, "a" if resume else "w", encoding="utf-8") as out:
+        def write(result: dict):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            counts["error" if result["error"] else "ok"] += 1
+            status = f"error ({result['error']})" if result["error"] else f"{result['seconds']:.1f}s"
+            print(f"[{counts['ok'] + counts['error']}] {result['id']}: {status}")
+
+        async def worker():
+            while (request := await queue.get()) is not None:
+                write(await process_request(engine, client, request, max_attempts))
+
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        with open(input_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    request = parse_request(line, line_number)
+                except (ValueError, AttributeError) as e:
+                    write({"id": str(line_number), "turns": [], "attempts": 0, "error": f"Línea inválida: {e}", "seconds": 0.0})
+                    continue
+                if request["id"] in skip:
+                    counts["skipped"] += 1
+                    continue
+                await queue.put(request)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+
+    print(
+        f"\nListo en {time.perf_counter() - start:.1f}s: {counts['ok']} completadas, "
+        f"{counts['error']} con error, {counts['skipped']} ya estaban en {output.name}."
+    )
 
 # --- FUNCIÓN PRINCIPAL ---
 
 def main():
     """Punto de entrada principal del script."""
-    print("Iniciando Scout Program Builder...")
-    
-    try:
-        client = setup_client()
-        
-        # Carga el prompt base desde el archivo de texto
-        prompt_path = Path(__file__).parent.parent / 'prompt.txt'
-        base_prompt = load_system_prompt(prompt_path)
+    parser = argparse.ArgumentParser(description="Scout Program Builder en la consola.")
+    parser.add_argument("--batch", type=Path, help="JSONL de peticiones a procesar sin interacción.")
+    parser.add_argument("--output", type=Path, help="JSONL de resultados (por defecto, <entrada>.out.jsonl).")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Peticiones simultáneas.")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Intentos por turno.")
+    parser.add_argument("--resume", action="store_true", help="Omite las peticiones que ya tienen resultado.")
+    args = parser.parse_args()
 
-        # Carga el conocimiento desde el índice
-        index_path = Path(__file__).parent.parent / 'context_index.json'
-        context_chunks = load_context_chunks(index_path)
+    print("Iniciando Scout Program Builder...")
 
-        # Inicia el chat
-        run_chat_loop(client, context_chunks, base_prompt)
+    try:
+        get_llm_client()  # Falla aquí si falta la API_KEY, antes de cargar el índice
+        engine = load_retrieval_engine()
+        if args.batch:
+            output = args.output or args.batch.with_suffix(".out.jsonl")
+            asyncio.run(run_batch(engine, args.batch, output, max(1, args.workers), args.max_attempts, args.resume))
+        else:
+            asyncio.run(run_chat_loop(engine))
 
     except (ValueError, FileNotFoundError, RuntimeError) as e:
         print(f"\nError de inicio: {e}")
+    except (KeyboardInterrupt, EOFError):
+        print("\n¡Hasta luego!")
     except Exception as e:
-        print(f"\nOcurrió un error crítico durante el inicio: {e}")
+        print(f"\nOcurrió un error crítico: {e}")
 
 if __name__ == "__main__":
     main()
-
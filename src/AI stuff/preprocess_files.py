@@ -1,89 +1,489 @@
 import pypdf
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
-import pickle
+import json
+import uuid
+import os
+import hashlib
+import argparse
+import sys
+from collections import deque
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+# El divisor de fragmentos se comparte con la app (src/services)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.chunking import Chunk, chunk_document
+from services.chunk_store import ChunkStore, ChunkStoreWriter
+from services.scout_metadata import tag_chunks
+from services.lexical_index import LEXICAL_INDEX_FILE, build_lexical_index
+from services.embeddings import EMBEDDING_BACKEND, EMBEDDING_MODEL, check_embedding_equivalence, load_embedding_model
 
 # --- CONFIGURACIÓN ---
 SOURCE_FOLDER = Path(__file__).parent.parent.parent / 'context'
 CACHE_FOLDER = Path(__file__).parent.parent.parent / 'cache' # Carpeta para guardar el índice
-CHUNK_SIZE = 512  # Tamaño de los fragmentos de texto en caracteres
-CHUNK_OVERLAP = 50 # Superposición para no perder contexto entre fragmentos
+# El tamaño de los fragmentos (en tokens) se configura en services/chunking.py
+
+# El modelo para crear los embeddings ('all-MiniLM-L6-v2', ligero y multilingüe) y su
+# backend (EMBEDDING_BACKEND) se configuran en services/embeddings.py, igual que en la app.
+# Con un backend distinto de torch, antes de indexar se comparan sus embeddings con los
+# de torch en los primeros EQUIVALENCE_SAMPLE fragmentos.
+EQUIVALENCE_SAMPLE = 64
+
+# Extracción en paralelo: procesos y páginas de PDF por tarea
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+PAGES_PER_TASK = 50
+# Fragmentos por lote de embeddings: cada lote se agrega al índice y se descarta
+EMBEDDING_BATCH_SIZE = 256
 
-# Modelo para crear los embeddings. 'all-MiniLM-L6-v2' es ligero y multilingüe.
-EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+# Tipo de índice FAISS (ver `create_faiss_index`). Todos usan producto interno sobre
+# embeddings normalizados, es decir, similitud coseno.
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # Listas del IVF; 0 = automático (~4·√N)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))  # Listas que se revisan en cada búsqueda
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+PQ_M = 48  # Sub-vectores de PQ: 384 dimensiones -> 48 bytes por vector
+PQ_NBITS = 8  # Bits por sub-vector: cada sub-cuantizador tiene 2**PQ_NBITS centroides
+# Los índices IVF se entrenan con los primeros TRAIN_SAMPLE_SIZE embeddings; con menos
+# de MIN_TRAIN_SIZE fragmentos no vale la pena y se usa el índice plano. FAISS pide al
+# menos 39 puntos por centroide: en PQ, los 2**PQ_NBITS de cada sub-cuantizador.
+TRAIN_SAMPLE_SIZE = 50_000
+MIN_TRAIN_SIZE = {"ivf_flat": 39 * 4, "ivf_pq": 39 * 2 ** PQ_NBITS}
 
-def read_all_text_from_source() -> str:
-    """Lee y extrae texto de todos los archivos en la carpeta de contexto."""
-    print(f"1. Leyendo archivos desde: {SOURCE_FOLDER}...")
+# Manifiesto de la última construcción: hash de cada archivo y los ids de sus fragmentos
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT = 4
+INDEX_FILE = "context.faiss"
+CHUNKS_FILE = "chunks.bin"  # Ver services/chunk_store.py
+
+def file_sha256(archivo: Path) -> str:
+    """Hash del contenido del archivo, para saber si cambió desde la última construcción."""
+    digest = hashlib.sha256()
+    with open(archivo, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def list_source_files() -> dict[str, Path]:
+    """Archivos de la carpeta de contexto, por nombre."""
     if not SOURCE_FOLDER.is_dir():
         raise FileNotFoundError(f"La carpeta de contexto '{SOURCE_FOLDER}' no existe.")
+    return {archivo.name: archivo for archivo in sorted(SOURCE_FOLDER.iterdir()) if archivo.is_file()}
+
+def count_pdf_pages(archivo: Path) -> int:
+    return len(pypdf.PdfReader(archivo, strict=False).pages)
+
+# Texto de un documento como pares (número de página, texto); sin páginas el número es None
+Pages = list[tuple[Optional[int], str]]
+
+def extract_pages(archivo: Path, start: int, end: int) -> Pages:
+    """Extrae el texto de las páginas [start, end) de un PDF (cada página una sola vez)."""
+    reader = pypdf.PdfReader(archivo, strict=False)
+    texto_paginas = []
+    for number, page in enumerate(reader.pages[start:end], start=start + 1):
+        texto = page.extract_text()
+        if texto:
+            texto_paginas.append((number, texto))
+    return texto_paginas
+
+def read_text_file(archivo: Path) -> Pages:
+    return [(None, archivo.read_text(encoding='utf-8', errors='ignore'))]
+
+def plan_extraction(archivo: Path) -> list[tuple]:
+    """Divide un archivo en tareas de extracción: rangos de páginas para PDF, una sola para texto."""
+    if archivo.suffix.lower() != '.pdf':
+        return [(read_text_file, archivo)]
+    pages = count_pdf_pages(archivo)
+    return [(extract_pages, archivo, start, min(start + PAGES_PER_TASK, pages)) for start in range(0, pages, PAGES_PER_TASK)]
+
+def iter_file_texts(archivos: list[Path], workers: int = EXTRACTION_WORKERS) -> Iterator[tuple[Path, Pages]]:
+    """
+    Extrae el texto de los archivos en un pool de procesos y lo entrega archivo por
+    archivo, en orden. Solo hay unas cuantas tareas en vuelo a la vez, así que nunca
+    se tiene el texto de todo el corpus en memoria. Las páginas de un archivo que no
+    se pudo leer son None.
+    """
+    def plan():
+        for archivo in archivos:
+            try:
+                tasks = plan_extraction(archivo)
+            except Exception as e:
+                print(f"  - Advertencia: No se pudo leer el archivo {archivo.name}: {e}")
+                tasks = None
+            yield archivo, tasks
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()  # (archivo, [futures]) en el orden de los archivos
+        in_flight = 0
+        for archivo, tasks in plan():
+            futures = None if tasks is None else [executor.submit(fn, *args) for fn, *args in tasks]
+            pending.append((archivo, futures))
+            in_flight += len(futures or ())
+            while pending and in_flight > workers * 2:
+                in_flight -= len(pending[0][1] or ())
+                yield _collect_file(*pending.popleft())
+        while pending:
+            yield _collect_file(*pending.popleft())
+
+def _collect_file(archivo: Path, futures: Optional[list]) -> tuple[Path, Optional[Pages]]:
+    # None (y no una lista vacía) si falló la lectura: el archivo no tiene texto conocido
+    if futures is None:
+        return archivo, None
+    try:
+        return archivo, [page for f in futures for page in f.result()]
+    except Exception as e:
+        print(f"  - Advertencia: No se pudo leer el archivo {archivo.name}: {e}")
+        return archivo, None
+
+def create_faiss_index(index_type: str, sample: np.ndarray):
+    """
+    Crea el índice del tipo pedido y, si lo necesita, lo entrena con `sample`
+    (embeddings normalizados):
+
+    - flat: búsqueda exacta (fuerza bruta). Ideal para unas decenas de miles de fragmentos.
+    - ivf_flat: agrupa los vectores en listas y solo revisa `nprobe` de ellas.
+    - hnsw: grafo de vecinos; muy rápido, pero no permite quitar vectores (una
+      actualización con archivos modificados reconstruye todo el índice).
+    - ivf_pq: IVF con vectores comprimidos por cuantización de producto (~16x menos memoria).
+    """
+    n, d = sample.shape
+    if index_type in MIN_TRAIN_SIZE and n < MIN_TRAIN_SIZE[index_type]:
+        print(f"  Advertencia: {n} fragmentos no alcanzan para entrenar un índice '{index_type}'; se usará 'flat'.")
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(d))
+    if index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(hnsw)
+
+    # Los IVF guardan los ids en sus listas, así que no necesitan IndexIDMap2
+    nlist = IVF_NLIST or int(4 * np.sqrt(n))
+    nlist = max(1, min(nlist, n // 39))
+    if index_type == "ivf_flat":
+        description = f"IVF{nlist},Flat"
+    elif index_type == "ivf_pq":
+        m = max(k for k in range(1, PQ_M + 1) if d % k == 0)
+        description = f"IVF{nlist},PQ{m}x{PQ_NBITS}"
+    else:
+        raise ValueError(f"Tipo de índice desconocido: '{index_type}'. Opciones: {', '.join(INDEX_TYPES)}.")
+    print(f"  Entrenando el índice {description} con {n} embeddings...")
+    index = faiss.index_factory(d, description, faiss.METRIC_INNER_PRODUCT)
+    index.train(sample)
+    return index
+
+def retrain_fallback_index(index, index_type: str):
+    """
+    Si el índice quedó plano porque no había fragmentos suficientes para entrenar el
+    tipo pedido (ver `create_faiss_index`) y ahora sí los hay, crea el índice del tipo
+    pedido con los mismos vectores y ids. Sin esto, el manifiesto seguiría diciendo
+    p. ej. 'ivf_flat' y las actualizaciones incrementales agregarían siempre al plano.
+    """
+    if index is None or index_type not in MIN_TRAIN_SIZE or index_kind(index) != "flat":
+        return index
+    if index.ntotal < MIN_TRAIN_SIZE[index_type]:
+        return index
+    # En el IndexIDMap2 plano, id_map[i] es el id del vector i del índice interno
+    embeddings = index.index.reconstruct_n(0, index.ntotal)
+    ids = faiss.vector_to_array(index.id_map).astype("int64")
+    print(f"  Ya hay {index.ntotal} fragmentos: el índice plano se convierte en '{index_type}'.")
+    retrained = create_faiss_index(index_type, embeddings[:TRAIN_SAMPLE_SIZE])
+    retrained.add_with_ids(embeddings, ids)
+    return retrained
+
+def index_kind(index) -> str:
+    """Tipo (de INDEX_TYPES) de un índice ya construido."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def search_parameters(index_kind: str) -> dict:
+    """Parámetros de búsqueda que la app aplica al cargar el índice (`faiss.ParameterSpace`)."""
+    if index_kind in ("ivf_flat", "ivf_pq"):
+        return {"nprobe": IVF_NPROBE}
+    if index_kind == "hnsw":
+        return {"efSearch": HNSW_EF_SEARCH}
+    return {}
+
+def load_previous_build(index_type: str = INDEX_TYPE):
+    """
+    Carga el manifiesto y el índice de la construcción anterior, y abre sus fragmentos
+    (con mmap: se copian al archivo nuevo sin cargarlos en memoria; quien la use debe
+    cerrar el `ChunkStore`). Devuelve None si no existen o no son compatibles (p. ej.
+    otro modelo de embeddings u otro tipo de índice).
+    """
+    try:
+        manifest = json.loads((CACHE_FOLDER / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if (
+            manifest.get("format") != MANIFEST_FORMAT
+            or manifest.get("embedding_model") != EMBEDDING_MODEL
+            or manifest.get("index_type") != index_type
+        ):
+            return None
+        index = faiss.read_index(str(CACHE_FOLDER / INDEX_FILE))
+        return manifest, index, ChunkStore(CACHE_FOLDER / CHUNKS_FILE)
+    except (OSError, ValueError, RuntimeError):
+        return None
 
-    full_text = []
-    for archivo in sorted(SOURCE_FOLDER.iterdir()):
-        if not archivo.is_file():
-            continue
+def _write_chunks(writer: ChunkStoreWriter, chunks: dict[int, Chunk]):
+    """Agrega los fragmentos de un documento con sus etiquetas de sección, progresión e insignia."""
+    tags = tag_chunks(chunks)
+    for chunk_id, chunk in chunks.items():
+        writer.add(chunk_id, chunk, tags[chunk_id])
+
+def _copy_chunks(store: ChunkStore, writer: ChunkStoreWriter, skip: set[int]):
+    """
+    Copia los fragmentos de la construcción anterior que se conservan, un documento a
+    la vez (los ids de cada archivo son consecutivos). Las etiquetas se vuelven a
+    calcular, así que también se agregan a un archivo generado antes de ellas.
+    """
+    kept = ((chunk_id, chunk) for chunk_id, chunk in store.items() if chunk_id not in skip)
+    for _, document in groupby(kept, key=lambda item: item[1].source):
+        _write_chunks(writer, dict(document))
+
+def update_index(full_rebuild: bool = False, index_type: str = INDEX_TYPE) -> bool:
+    """
+    Actualiza el índice FAISS y los fragmentos. Solo se extraen y se vuelven a
+    calcular los embeddings de los archivos nuevos o modificados; los fragmentos de
+    archivos borrados o modificados se quitan del índice por su id.
+
+    Los fragmentos se escriben en disco conforme se procesa cada archivo (los que se
+    conservan se copian del archivo anterior): en memoria solo quedan sus ids en el
+    manifiesto y los embeddings en el índice, nunca el texto de todo el corpus.
+    Devuelve True si hubo cambios.
+    """
+    print(f"1. Revisando archivos en: {SOURCE_FOLDER}...")
+    source_files = list_source_files()
+    hashes = {name: file_sha256(archivo) for name, archivo in source_files.items()}
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconocido: '{index_type}'. Opciones: {', '.join(INDEX_TYPES)}.")
+    previous = None if full_rebuild else load_previous_build(index_type)
+    if previous:
+        manifest, index, store = previous
+    else:
+        print("  No hay una construcción previa compatible: se reconstruirá todo el índice.")
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "embedding_model": EMBEDDING_MODEL,
+            "index_type": index_type,
+            "next_id": 0,
+            "files": {},
+        }
+        index, store = None, None
+
+    try:
+        old_files = manifest["files"]
+        changed = [name for name in source_files if old_files.get(name, {}).get("sha256") != hashes[name]]
+        removed = [name for name in old_files if name not in source_files]
+        print(f"  {len(source_files) - len(changed)} sin cambios, {len(changed)} nuevos o modificados, {len(removed)} eliminados.")
+        if previous and not changed and not removed:
+            if (CACHE_FOLDER / LEXICAL_INDEX_FILE).exists() and store.has_tags:
+                return False
+            # Construcción anterior al índice BM25 o a las etiquetas: se agregan sin recalcular embeddings
+            writer = ChunkStoreWriter(CACHE_FOLDER / CHUNKS_FILE)
+            try:
+                _copy_chunks(store, writer, skip=set())
+            except BaseException:
+                writer.abort()
+                raise
+            save_index(index, writer, manifest)
+            return True
+
+        # Quitar los fragmentos de los archivos eliminados o modificados
+        stale_ids = [i for name in removed + changed for i in old_files.get(name, {}).get("chunk_ids", [])]
+        if stale_ids and index is not None and index_kind(index) == "hnsw":
+            print("  El índice HNSW no permite quitar fragmentos: se reconstruirá todo el índice.")
+            store.close()
+            return update_index(full_rebuild=True, index_type=index_type)
+        if stale_ids and index is not None:
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+        for name in removed:
+            del old_files[name]
+
+        # Los fragmentos van directo al archivo nuevo: primero los que se conservan y luego
+        # los de cada archivo procesado (los ids nuevos son mayores que los anteriores)
+        CACHE_FOLDER.mkdir(exist_ok=True)
+        writer = ChunkStoreWriter(CACHE_FOLDER / CHUNKS_FILE)
         try:
-            if archivo.suffix.lower() == '.pdf':
-                reader = pypdf.PdfReader(archivo, strict=False)
-                texto_paginas = [p.extract_text() for p in reader.pages if p.extract_text()]
-                full_text.append("\n".join(texto_paginas))
-            else:
-                full_text.append(archivo.read_text(encoding='utf-8', errors='ignore'))
-        except Exception as e:
-            print(f"  - Advertencia: No se pudo leer el archivo {archivo.name}: {e}")
-    print("  Lectura de archivos completada.")
-    return "\n\n".join(full_text)
-
-def split_text_into_chunks(text: str) -> list[str]:
-    """Divide el texto completo en fragmentos más pequeños."""
-    print("2. Dividiendo el texto en fragmentos (chunks)...")
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + CHUNK_SIZE
-        chunks.append(text[start:end])
-        start += CHUNK_SIZE - CHUNK_OVERLAP
-    print(f"  Se crearon {len(chunks)} fragmentos.")
-    return chunks
-
-def create_and_save_index(chunks: list[str]):
-    """Crea embeddings y guarda el índice FAISS y los fragmentos de texto."""
-    print(f"3. Creando embeddings con el modelo '{EMBEDDING_MODEL}' (esto puede tardar)...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    embeddings = model.encode(chunks, show_progress_bar=True)
-    
-    if not embeddings.any():
-        raise ValueError("No se pudieron generar embeddings. ¿Los archivos de contexto están vacíos?")
-
-    # Crear índice FAISS
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.array(embeddings).astype('float32'))
-    
+            if store is not None:
+                _copy_chunks(store, writer, skip=set(stale_ids))
+                store.close()
+
+            print("2. Extrayendo, dividiendo y creando embeddings de los archivos nuevos o modificados...")
+            embedder = _StreamingEmbedder(index, index_type)
+            failed = []
+            for archivo, pages in iter_file_texts([source_files[name] for name in changed]):
+                if pages is None:
+                    # Sin entrada en el manifiesto, la próxima ejecución lo vuelve a intentar
+                    # (con su hash quedaría como "sin cambios" y fuera del índice hasta un --full)
+                    old_files.pop(archivo.name, None)
+                    failed.append(archivo.name)
+                    continue
+                file_chunks = chunk_document(pages, source=archivo.name)
+                ids = list(range(manifest["next_id"], manifest["next_id"] + len(file_chunks)))
+                manifest["next_id"] += len(file_chunks)
+                old_files[archivo.name] = {"sha256": hashes[archivo.name], "chunk_ids": ids}
+                _write_chunks(writer, dict(zip(ids, file_chunks)))
+                embedder.add(ids, file_chunks)
+            index = embedder.finish()
+            print(f"  Se crearon {embedder.total} fragmentos nuevos.")
+            if failed:
+                print(f"  No se pudieron leer {len(failed)} archivos; se volverán a intentar en la próxima ejecución: {', '.join(failed)}")
+            index = retrain_fallback_index(index, index_type)
+
+            if index is None or not len(writer):
+                raise ValueError("No se pudieron generar embeddings. ¿Los archivos de contexto están vacíos?")
+        except BaseException:
+            writer.abort()
+            raise
+        save_index(index, writer, manifest)
+        return True
+    finally:
+        if store is not None:
+            store.close()
+
+class _StreamingEmbedder:
+    """
+    Junta fragmentos hasta completar un lote de EMBEDDING_BATCH_SIZE, calcula sus
+    embeddings y los agrega al índice; los textos del lote se sueltan en cuanto se
+    agregan (el `ChunkStoreWriter` ya los guardó en disco). Los embeddings quedan en
+    el índice: completos en los planos y HNSW, comprimidos en IVF-PQ. Los índices IVF
+    nuevos guardan además hasta TRAIN_SAMPLE_SIZE embeddings para entrenarse antes de
+    recibir vectores.
+    """
+    def __init__(self, index, index_type: str = INDEX_TYPE):
+        self.index = index
+        self.index_type = index_type
+        self.total = 0
+        self._model = None
+        self._ids: list[int] = []
+        self._pending: list[Chunk] = []
+        self._vectors: list[tuple[np.ndarray, np.ndarray]] = []  # (ids, embeddings) aún sin agregar
+        self._buffered = 0
+
+    def add(self, ids: list[int], chunks: list[Chunk]):
+        self._ids.extend(ids)
+        self._pending.extend(chunks)
+        while len(self._pending) >= EMBEDDING_BATCH_SIZE:
+            self._flush(EMBEDDING_BATCH_SIZE)
+
+    def finish(self):
+        if self._pending:
+            self._flush(len(self._pending))
+        if self._vectors:
+            self._add_buffered()
+        return self.index
+
+    def _flush(self, size: int):
+        ids, batch = self._ids[:size], self._pending[:size]
+        del self._ids[:size], self._pending[:size]
+        if self._model is None:
+            print(f"3. Creando embeddings con el modelo '{EMBEDDING_MODEL}' ({EMBEDDING_BACKEND}; esto puede tardar)...")
+            # Se carga aquí para que una ejecución sin cambios no pague la carga del modelo
+            self._model = load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+            if EMBEDDING_BACKEND != "torch":
+                # Lanza EmbeddingDriftError (y no se guarda nada) si el backend no equivale a torch
+                worst = check_embedding_equivalence(
+                    self._model, load_embedding_model(EMBEDDING_MODEL, "torch"),
+                    [chunk.text for chunk in batch[:EQUIVALENCE_SAMPLE]],
+                )
+                print(f"  Embeddings equivalentes a los de torch (similitud mínima {worst:.4f}).")
+        # Normalizados, el producto interno del índice es la similitud coseno
+        embeddings = np.asarray(
+            self._model.encode([chunk.text for chunk in batch], batch_size=64, normalize_embeddings=True), dtype="float32"
+        )
+        self.total += len(batch)
+        self._vectors.append((np.array(ids, dtype="int64"), embeddings))
+        self._buffered += len(batch)
+        if self.index is None and self.index_type in MIN_TRAIN_SIZE and self._buffered < TRAIN_SAMPLE_SIZE:
+            print(f"  {self.total} fragmentos procesados (reuniendo muestra de entrenamiento)...")
+            return
+        self._add_buffered()
+        print(f"  {self.total} fragmentos indexados...")
+
+    def _add_buffered(self):
+        ids = np.concatenate([ids for ids, _ in self._vectors])
+        embeddings = np.concatenate([embeddings for _, embeddings in self._vectors])
+        self._vectors, self._buffered = [], 0
+        if self.index is None:
+            self.index = create_faiss_index(self.index_type, embeddings)
+        self.index.add_with_ids(embeddings, ids)
+
+def write_json(path: Path, data: dict):
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+def save_index(index, writer: ChunkStoreWriter, manifest: dict):
+    """Guarda el índice FAISS, los fragmentos (por id, con su archivo y página), el índice BM25 y el manifiesto."""
     # Crear la carpeta de caché si no existe
     CACHE_FOLDER.mkdir(exist_ok=True)
-    
-    # Guardar el índice y los fragmentos
-    faiss.write_index(index, str(CACHE_FOLDER / "context.faiss"))
-    with open(CACHE_FOLDER / "chunks.pkl", "wb") as f:
-        pickle.dump(chunks, f)
-        
+
+    # Guardar el índice y los fragmentos. La app los abre con mmap, así que cada archivo
+    # se escribe aparte y luego se reemplaza (sobrescribirlo en su lugar la rompería).
+    tmp_index = CACHE_FOLDER / (INDEX_FILE + ".tmp")
+    faiss.write_index(index, str(tmp_index))
+    os.replace(tmp_index, CACHE_FOLDER / INDEX_FILE)
+    chunk_count = len(writer)
+    print(f"  {writer.tagged} de {chunk_count} fragmentos etiquetados por sección, progresión o insignia.")
+    writer.close()
+    # El índice BM25 se reconstruye completo (el idf y el largo promedio cambian con cada
+    # archivo), leyendo los textos del archivo de fragmentos recién escrito
+    store = ChunkStore(CACHE_FOLDER / CHUNKS_FILE)
+    try:
+        build_lexical_index(CACHE_FOLDER / LEXICAL_INDEX_FILE, ((i, chunk.text) for i, chunk in store.items()))
+    finally:
+        store.close()
+    write_json(CACHE_FOLDER / MANIFEST_FILE, manifest)
+
+    # La versión cambia en cada reconstrucción; la app la usa para invalidar su caché de búsquedas.
+    # `normalized` y `search_params` le indican cómo codificar las consultas y buscar en el índice.
+    kind = index_kind(index)
+    index_meta = {
+        "version": uuid.uuid4().hex,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "chunks": chunk_count,
+        "index_type": kind,
+        "metric": "inner_product",
+        "normalized": True,
+        "search_params": search_parameters(kind),
+    }
+    # Se escribe al final: un cambio de versión le indica a la app que todo lo demás ya está listo
+    write_json(CACHE_FOLDER / "index_meta.json", index_meta)
+
     print("4. ¡Índice y fragmentos guardados exitosamente en la carpeta 'cache'!")
 
 def main():
     """Flujo principal del preprocesamiento."""
+    parser = argparse.ArgumentParser(description="Genera el índice de búsqueda a partir de la carpeta 'context'.")
+    parser.add_argument("--full", action="store_true", help="Ignora la construcción previa y reconstruye todo.")
+    parser.add_argument(
+        "--index-type", choices=INDEX_TYPES, default=INDEX_TYPE,
+        help="Tipo de índice FAISS (por defecto 'flat' o la variable INDEX_TYPE).",
+    )
+    args = parser.parse_args()
     try:
-        full_text = read_all_text_from_source()
-        if not full_text.strip():
-            print("No se encontró texto en los archivos de contexto. Abortando.")
-            return
-        chunks = split_text_into_chunks(full_text)
-        create_and_save_index(chunks)
-        print("\nPreprocesamiento finalizado. Ya puedes ejecutar la aplicación de chat.")
+        if update_index(full_rebuild=args.full, index_type=args.index_type):
+            print("\nPreprocesamiento finalizado. Ya puedes ejecutar la aplicación de chat.")
+        else:
+            print("\nEl índice ya estaba al día. No hubo cambios.")
     except Exception as e:
         print(f"\nOcurrió un error durante el preprocesamiento: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
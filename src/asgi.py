@@ -0,0 +1,18 @@
+"""
+La app de Flet como aplicación ASGI, para servirla con uvicorn y varios workers
+(ver `serve.py`). Cada worker importa este módulo por su cuenta.
+"""
+import logging
+import flet as ft
+from main import main
+from services.retrieval_engine import get_retrieval_engine
+from services.session_registry import get_session_registry
+from services.metrics import start_metrics_exporters
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# Con RETRIEVAL_SOCKET solo espera a que el sidecar esté listo; sin él, carga el motor en este worker
+get_retrieval_engine().warmup_in_background()
+get_session_registry().start_reaper()
+start_metrics_exporters()
+
+app = ft.app(target=main, export_asgi_app=True)
@@ -1,25 +1,79 @@
+import os
+import re
+from functools import lru_cache
 import flet as ft
 from models.chat_model import Message
 
+# Cómo se muestran las respuestas del bot:
+# - "blocks": un control Markdown por bloque (párrafo, tabla, lista...). Los bloques
+#   terminados se envían una vez y no vuelven a cambiar; durante el streaming solo se
+#   actualiza el último, así que el navegador solo vuelve a procesar ese bloque.
+# - "single": un solo control Markdown con toda la respuesta (se reenvía completo en
+#   cada actualización del streaming).
+MARKDOWN_RENDER_MODE = os.getenv("MARKDOWN_RENDER_MODE", "blocks")
+# Separación entre bloques, igual a la que deja Markdown entre párrafos
+MARKDOWN_BLOCK_SPACING = 8
+
+_FENCE_RE = re.compile(r"^ {0,3}(```|~~~)")
+
+
+def split_markdown(text: str) -> tuple[list[str], str]:
+    """
+    Separa el texto en bloques terminados y el bloque abierto (el último, que todavía
+    puede crecer). Un bloque termina en una línea vacía seguida de una línea sin
+    sangría, fuera de un bloque de código: así no se cortan los bloques de código ni
+    los párrafos sangrados dentro de una lista.
+    """
+    blocks = []
+    start = position = 0
+    in_fence = blank_before = False
+    lines = text.split("\n")
+    for number, line in enumerate(lines):
+        complete = number < len(lines) - 1
+        if not in_fence and blank_before and line.strip() and line[0] not in " \t":
+            blocks.append(text[start:position].strip("\n"))
+            start = position
+        if line.strip():
+            blank_before = False
+        elif complete and not in_fence:
+            blank_before = True
+        if complete and _FENCE_RE.match(line):
+            in_fence = not in_fence
+        position += len(line) + 1
+    return blocks, text[start:]
+
+
+# Las respuestas terminadas se dividen una sola vez: al volver a mostrarlas (mensajes
+# anteriores, conversación retomada) se reutiliza la división
+_split_finished_markdown = lru_cache(maxsize=512)(split_markdown)
+
+
 class ChatMessage(ft.Row):
     """
     Un componente para mostrar un solo mensaje en el chat.
     """
     def __init__(self, message: Message):
         super().__init__()
+        self.message = message
         self.vertical_alignment = ft.CrossAxisAlignment.START # Alinea el avatar y el texto verticalmente
 
         # Define el contenido del mensaje (Texto plano para el usuario, Markdown para el bot)
+        self._blocks = None
         if message.message_type == "user_message":
             message_content = ft.Text(message.text, selectable=True, color=ft.Colors.WHITE)
-        else:  # Mensajes del bot
-            message_content = ft.Markdown(
-                value=message.text,
-                selectable=True,
-                extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
-                code_theme="atom-one-dark",
-                on_tap_link=lambda e: self.page.launch_url(e.data),
+        elif MARKDOWN_RENDER_MODE == "single":
+            message_content = self._markdown(message.text)
+        else:  # Mensajes del bot, por bloques
+            # Bloques congelados y, al final, el bloque abierto (el único que cambia en el streaming)
+            frozen, open_block = _split_finished_markdown(message.text)
+            self._open_block = self._markdown(open_block)
+            self._open_start = len(message.text) - len(open_block)
+            self._blocks = ft.Column(
+                controls=[self._markdown(block) for block in frozen] + [self._open_block],
+                spacing=MARKDOWN_BLOCK_SPACING,
             )
+            message_content = self._blocks
+        self._message_content = message_content
 
         # Contenedor para la burbuja del mensaje
         message_bubble = ft.Container(
@@ -53,6 +107,31 @@ class ChatMessage(ft.Row):
             message_bubble.bgcolor = ft.Colors.GREY_700 # Color gris oscuro para la burbuja del bot
             self.controls = [user_avatar, message_bubble]
 
+    def append_text(self, delta: str):
+        """
+        Agrega texto al final del mensaje (usado al recibir la respuesta en streaming).
+        No llama a `update()`: quien lo use decide cada cuánto refrescar la página.
+        """
+        self.message.text += delta
+        if self._blocks is None:
+            self._message_content.value = self.message.text
+            return
+        finished, open_block = split_markdown(self.message.text[self._open_start:])
+        if finished:
+            # Los bloques que se completaron se congelan antes del bloque abierto
+            self._blocks.controls[-1:-1] = [self._markdown(block) for block in finished]
+            self._open_start = len(self.message.text) - len(open_block)
+        self._open_block.value = open_block
+
+    def _markdown(self, value: str) -> ft.Markdown:
+        return ft.Markdown(
+            value=value,
+            selectable=True,
+            extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
+            code_theme="atom-one-dark",
+            on_tap_link=lambda e: self.page.launch_url(e.data),
+        )
+
     def _get_initials(self, user_name: str):
         if user_name:
             return user_name[:1].capitalize()
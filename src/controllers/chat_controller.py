@@ -1,54 +1,47 @@
 import os
-import faiss
-import pickle
-from pathlib import Path
-from openai import OpenAI
-from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-
-# --- CONFIGURACIÓN Y CARGA INICIAL ---
-print("DEBUG: [1] Iniciando carga de chat_controller.")
-
-# Cargar variables de entorno
-try:
-    env_path = Path(__file__).parent.parent.parent / '.env'
-    load_dotenv(dotenv_path=env_path)
-except Exception:
-    print("Advertencia: No se pudo cargar el archivo .env.")
-print("DEBUG: [2] Carga de .env intentada.")
-
-# Cargar el prompt base
-try:
-    prompt_path = Path(__file__).parent.parent.parent / 'prompt.txt'
-    BASE_PROMPT = prompt_path.read_text(encoding='utf-8')
-except Exception:
-    BASE_PROMPT = "Eres un asistente servicial."
-    print("Advertencia: No se pudo cargar el prompt. Se usará uno por defecto.")
-print("DEBUG: [3] Carga de prompt.txt intentada.")
-
-# Cargar el índice RAG (FAISS y chunks)
-faiss_index = None
-chunks = []
-try:
-    print("DEBUG: [4] Intentando cargar índice FAISS y chunks.")
-    cache_folder = Path(__file__).parent.parent.parent / 'cache'
-    faiss_index = faiss.read_index(str(cache_folder / "context.faiss"))
-    with open(cache_folder / "chunks.pkl", "rb") as f:
-        chunks = pickle.load(f)
-    print("DEBUG: [5] Carga de índice FAISS y chunks completada.")
-except Exception as e:
-    print(f"DEBUG: [5-ERROR] Error al cargar índice: {e}")
-
-# Cargar el modelo de embeddings
-embedding_model = None
-try:
-    print("DEBUG: [6] Intentando cargar modelo de embeddings SentenceTransformer.")
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    print("DEBUG: [7] Carga de modelo de embeddings completada.")
-except Exception as e:
-    print(f"DEBUG: [7-ERROR] Error al cargar modelo: {e}")
-
-print("DEBUG: [8] Carga de chat_controller finalizada.")
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, NamedTuple, Optional
+import numpy as np
+from openai import AsyncOpenAI
+from services.settings import get_base_prompt
+from services.llm_client import MAX_CONCURRENT_LLM_REQUESTS, get_llm_client
+from services.retrieval_engine import CONTEXT_UNAVAILABLE, EMBEDDING_MODEL, RetrievalEngine, get_retrieval_engine
+from services.history import ConversationHistory, dedupe_context
+from services.metrics import metrics
+from services.prompt_builder import PrefixReuse, build_messages, get_prefix_cache_simulator, provider_prefix_reuse
+from services.scout_metadata import SearchFilter, filter_from_messages, update_filter
+from models.chat_model import Message
+from services.response_cache import (
+    RESPONSE_CACHE_MAX_TURNS, ROOT, ResponseCache, get_response_cache, response_cache_key, response_scope,
+)
+
+logger = logging.getLogger(__name__)
+
+# Parámetros del modelo de lenguaje
+MODEL_NAME = os.getenv("MODEL_NAME", "deepseek-coder")
+MAX_TOKENS = 4096
+TEMPERATURE = 0.7
+
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    # Se crea al primer uso para que quede ligado al event loop de Flet
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_REQUESTS)
+    return _llm_semaphore
+
+class _PendingResponse(NamedTuple):
+    """Turno que no estaba en la caché de respuestas: su respuesta se guardará al terminar."""
+    parent_id: int
+    key: str
+    embedding: np.ndarray
+    started_at: float
+
+# Valor por defecto de `response_cache`: la caché compartida (None la desactiva)
+_DEFAULT = object()
 
 # --- CLASE DEL CONTROLADOR ---
 
@@ -56,55 +49,239 @@ class ChatController:
     """
     Maneja toda la lógica de la conversación con la IA.
     """
-    def __init__(self):
-        self._client = self._setup_client()
-        self._historial_mensajes = []
-
-    def _setup_client(self) -> OpenAI:
-        api_key = os.getenv("API_KEY")
-        if not api_key:
-            error_msg = "---\n--- FATAL ERROR: La variable de entorno API_KEY no fue encontrada. Por favor, configúrala en Railway. ---\n---"
-            print(error_msg)
-            raise ValueError(error_msg)
-        return OpenAI(api_key=api_key, base_url="https://api.deepseek.com/v1")
-
-    def _find_relevant_context(self, query: str, top_k: int = 3) -> str:
-        if not faiss_index or not embedding_model or not chunks:
-            return "El sistema de búsqueda de contexto no está disponible."
-        
-        query_embedding = embedding_model.encode([query])
-        distances, indices = faiss_index.search(query_embedding, top_k)
-        
-        relevant_chunks = [chunks[i] for i in indices[0]]
+    def __init__(
+        self,
+        retrieval_engine: Optional[RetrievalEngine] = None,
+        client: Optional[AsyncOpenAI] = None,
+        response_cache: Optional[ResponseCache] = _DEFAULT,
+    ):
+        self._client = client or get_llm_client()
+        self._retrieval = retrieval_engine or get_retrieval_engine()
+        self._historial_mensajes = ConversationHistory()
+        self._response_cache = get_response_cache() if response_cache is _DEFAULT else response_cache
+        self._response_scope = response_scope(MODEL_NAME, EMBEDDING_MODEL, get_base_prompt())
+        # Entrada de la caché a la que llegó la conversación (mientras todas sus respuestas salieron de ahí)
+        self._cache_entry = ROOT
+        self._cached_turns = 0
+        self._diverged = False
+        # Cuánto del prompt del último turno se reutilizó de la caché de prefijos del proveedor
+        self.last_prefix_reuse: Optional[PrefixReuse] = None
+        # Error del último turno (None si terminó bien); la respuesta ya lo describe al usuario
+        self.last_error: Optional[Exception] = None
+        # Sección, progresión e insignia que el usuario ya indicó; restringen la búsqueda de contexto
+        self.search_filter = SearchFilter()
+        self._filter_before_turn = self.search_filter
+
+    def clear(self):
+        """Libera el historial de la conversación (p. ej. al cerrar la sesión)."""
+        self._historial_mensajes.clear()
+        self.search_filter = SearchFilter()
+        self._cache_entry = ROOT
+        self._cached_turns = 0
+        self._diverged = False
+
+    def restore(self, messages: list[Message]):
+        """Reconstruye el historial al retomar una conversación guardada."""
+        for message in messages:
+            self._historial_mensajes.add("user" if message.message_type == "user_message" else "assistant", message.text)
+        self.search_filter = filter_from_messages(m.text for m in messages if m.message_type == "user_message")
+        # No se sabe qué camino de la caché de respuestas siguió la conversación
+        self._diverged = True
+
+    async def _lookup_cached_response(self, user_prompt: str) -> tuple[Optional[str], Optional[_PendingResponse]]:
+        """
+        Busca en la caché la respuesta a este prompt después de la entrada a la que
+        llegó la conversación. Devuelve la respuesta guardada, o bien el turno pendiente
+        de guardar si no estaba. La caché se deja de usar (la conversación divergió)
+        en cuanto un turno no la encuentra, falla, o se pasa de RESPONSE_CACHE_MAX_TURNS.
+        """
+        cache = self._response_cache
+        if cache is None:
+            return None, None
+        if self._diverged or self._cached_turns >= RESPONSE_CACHE_MAX_TURNS or not self._retrieval.is_ready:
+            self._diverged = True
+            cache.bypasses += 1
+            return None, None
+        key = response_cache_key(user_prompt)
+        with metrics.span("response_cache") as span:
+            try:
+                embedding = await asyncio.wrap_future(self._retrieval.submit_embedding(key))
+                cached = await asyncio.to_thread(cache.lookup, self._response_scope, self._cache_entry, key, embedding)
+            except Exception as e:
+                logger.error("No se pudo consultar la caché de respuestas: %s", e)
+                self._diverged = True
+                return None, None
+            span.tag(result="miss" if cached is None else "hit")
+        if cached is None:
+            self._diverged = True
+            return None, _PendingResponse(self._cache_entry, key, embedding, time.perf_counter())
+        self._cache_entry = cached.id
+        self._cached_turns += 1
+        self._historial_mensajes.add("user", user_prompt)
+        self._historial_mensajes.add("assistant", cached.text)
+        return cached.text, None
+
+    async def _store_response(self, pending: Optional[_PendingResponse], response: str):
+        if pending is None or self._response_cache is None or not response:
+            return
+        try:
+            await asyncio.to_thread(
+                self._response_cache.put, self._response_scope, pending.parent_id, pending.key, pending.embedding, response,
+                time.perf_counter() - pending.started_at,
+            )
+        except Exception as e:
+            logger.error("No se pudo guardar la respuesta en la caché: %s", e)
+
+    async def _find_relevant_context(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> str:
+        # El cálculo de embeddings y la búsqueda FAISS corren en el hilo del motor de
+        # búsqueda (por lotes), así que no bloquean el event loop que atiende a todas las sesiones.
+        # Se piden fragmentos de más porque los repetidos se descartan.
+        with metrics.span("retrieval") as span:
+            future = self._retrieval.submit_search(query, top_k * 2, search_filter)
+            # Las consultas que están en la caché de búsquedas se resuelven al encolarlas
+            span.tag(cache="hit" if future.done() else "miss")
+            found = await asyncio.wrap_future(future)
+            if not self._retrieval.is_ready:
+                span.tag(cache="unavailable")
+                return CONTEXT_UNAVAILABLE
+        relevant_chunks = dedupe_context(found)[:top_k]
         return "\n---\n".join(relevant_chunks)
 
-    def get_ai_response(self, user_prompt: str) -> str:
+    async def _build_messages(self, user_prompt: str) -> list[dict]:
+        """Agrega el prompt al historial y arma la lista de mensajes a enviar."""
+        self._historial_mensajes.add("user", user_prompt)
+
+        relevant_context = await self._find_relevant_context(user_prompt, search_filter=self.search_filter)
+
+        with metrics.span("prompt_build"):
+            return build_messages(get_base_prompt(), self._historial_mensajes.messages(), relevant_context)
+
+    def _report_prefix_reuse(self, messages: list[dict], usage):
+        # Lo que reporte el proveedor; si no lo reporta, la simulación local
+        reuse = provider_prefix_reuse(usage) or get_prefix_cache_simulator().observe(messages)
+        self.last_prefix_reuse = reuse
+        metrics.prefix_reuse(reuse.ratio, reuse.source)
+        logger.debug(
+            "Prefijo reutilizado: %d de %d tokens (%s)", reuse.cached_tokens, reuse.prompt_tokens, reuse.source
+        )
+
+    def _start_turn(self, user_prompt: str):
+        self.last_error = None
+        # Antes de buscar en la caché de respuestas: un turno que sale de ahí también
+        # cambia la sección, progresión o insignia con que buscan los siguientes
+        self._filter_before_turn = self.search_filter
+        self.search_filter = update_filter(self.search_filter, user_prompt)
+
+    def _discard_pending_prompt(self, user_prompt: str):
+        # Si se canceló o falló la petición, el prompt sin respuesta no debe quedar en el
+        # historial (al reintentarlo se agregaría dos veces) ni en el filtro de búsqueda
+        self._historial_mensajes.discard_last("user", user_prompt)
+        self.search_filter = self._filter_before_turn
+
+    async def get_ai_response(self, user_prompt: str) -> str:
         """
         Obtiene una respuesta de la IA basándose en el prompt del usuario y el contexto.
         """
+        self._start_turn(user_prompt)
+        turn_span = metrics.span("turn", mode="blocking")
         try:
-            self._historial_mensajes.append({"role": "user", "content": user_prompt})
-            
-            relevant_context = self._find_relevant_context(user_prompt)
-            
-            system_content = f"{BASE_PROMPT}\n\n--- CONTEXTO RELEVANTE ---\n{relevant_context}"
-            system_message = {"role": "system", "content": system_content}
-            
-            messages_to_send = [system_message] + self._historial_mensajes
+            with turn_span:
+                cached, pending = await self._lookup_cached_response(user_prompt)
+                turn_span.tag(cached="yes" if cached is not None else "no")
+                if cached is not None:
+                    return cached
+                messages_to_send = await self._build_messages(user_prompt)
+                prompt_size = metrics.prompt_tokens(messages_to_send)
 
-            response = self._client.chat.completions.create(
-                model="deepseek-coder",
-                messages=messages_to_send,
-                max_tokens=4096,
-                temperature=0.7,
-            )
+                queued = time.perf_counter()
+                async with _get_llm_semaphore():
+                    metrics.record("llm_queue", time.perf_counter() - queued)
+                    with metrics.span("llm_response", prompt_tokens=prompt_size):
+                        response = await self._client.chat.completions.create(
+                            model=MODEL_NAME,
+                            messages=messages_to_send,
+                            max_tokens=MAX_TOKENS,
+                            temperature=TEMPERATURE,
+                        )
             
-            ai_response = response.choices[0].message.content
-            self._historial_mensajes.append({"role": "assistant", "content": ai_response})
+                self._report_prefix_reuse(messages_to_send, response.usage)
+                ai_response = response.choices[0].message.content
+                self._historial_mensajes.add("assistant", ai_response)
+                await self._store_response(pending, ai_response)
             
-            return ai_response
+                return ai_response
+
+        except asyncio.CancelledError:
+            self._discard_pending_prompt(user_prompt)
+            raise
+        except Exception as e:
+            self.last_error = e
+            self._discard_pending_prompt(user_prompt)
+            error_message = f"Ocurrió un error: {e}"
+            logger.error(error_message)
+            return error_message
+
+    async def stream_ai_response(self, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Igual que `get_ai_response`, pero produce los fragmentos de texto (deltas)
+        conforme la API los va enviando. La respuesta completa se guarda en el
+        historial al terminar el stream. Si la tarea se cancela, el stream se cierra
+        y el prompt se retira del historial.
+        """
+        partes = []
+        self._start_turn(user_prompt)
+        turn_span = metrics.span("turn", mode="stream")
+        try:
+            with turn_span:
+                cached, pending = await self._lookup_cached_response(user_prompt)
+                turn_span.tag(cached="yes" if cached is not None else "no")
+                if cached is not None:
+                    yield cached
+                    return
+                messages_to_send = await self._build_messages(user_prompt)
+                prompt_size = metrics.prompt_tokens(messages_to_send)
+
+                queued = time.perf_counter()
+                async with _get_llm_semaphore():
+                    metrics.record("llm_queue", time.perf_counter() - queued)
+                    with metrics.span("llm_stream", prompt_tokens=prompt_size):
+                        started = time.perf_counter()
+                        usage = None
+                        stream = await self._client.chat.completions.create(
+                            model=MODEL_NAME,
+                            messages=messages_to_send,
+                            max_tokens=MAX_TOKENS,
+                            temperature=TEMPERATURE,
+                            stream=True,
+                            # El último evento trae `usage`, con los tokens que salieron de la caché de prefijos
+                            stream_options={"include_usage": True},
+                        )
+                        try:
+                            async for chunk in stream:
+                                if getattr(chunk, "usage", None) is not None:
+                                    usage = chunk.usage
+                                if not chunk.choices:
+                                    continue
+                                delta = chunk.choices[0].delta.content
+                                if delta:
+                                    if not partes:
+                                        metrics.record("llm_first_token", time.perf_counter() - started, prompt_tokens=prompt_size)
+                                    partes.append(delta)
+                                    yield delta
+                        finally:
+                            await stream.close()
+
+                self._report_prefix_reuse(messages_to_send, usage)
+                self._historial_mensajes.add("assistant", "".join(partes))
+                await self._store_response(pending, "".join(partes))
 
+        except asyncio.CancelledError:
+            self._discard_pending_prompt(user_prompt)
+            raise
         except Exception as e:
+            self.last_error = e
+            self._discard_pending_prompt(user_prompt)
             error_message = f"Ocurrió un error: {e}"
-            print(error_message)
-            return error_message
\ No newline at end of file
+            logger.error(error_message)
+            # Si ya se mostró parte de la respuesta, el error se agrega en un párrafo aparte
+            yield f"\n\n{error_message}" if partes else error_message
@@ -1,7 +1,18 @@
 import os
+import logging
+import threading
 import flet as ft
 from views.chat_view import ChatView
 from views.home_view import HomeView
+from services.retrieval_engine import get_retrieval_engine
+from services.session_registry import get_session_registry
+from services.metrics import start_metrics_exporters
+
+# Vistas disponibles por ruta. Cada una se construye la primera vez que la sesión la visita.
+VIEW_FACTORIES = {
+    "/": HomeView,
+    "/chat": ChatView,
+}
 
 def main(page: ft.Page):
     page.title = "Scout Program Builder"
@@ -9,24 +20,66 @@ def main(page: ft.Page):
     page.vertical_alignment = ft.MainAxisAlignment.SPACE_BETWEEN
     page.theme_mode = ft.ThemeMode.DARK
 
-    # Diccionario de vistas para el enrutamiento
-    views = {
-        "/": HomeView(page),
-        "/chat": ChatView(page),
-    }
+    # Vistas ya construidas en esta sesión
+    views = {}
+    views_lock = threading.Lock()  # Los cambios de ruta pueden llegar en hilos distintos
+    registry = get_session_registry()
+
+    def get_view(route: str) -> ft.View:
+        # Obtiene la vista correspondiente a la ruta, o la de inicio si no se encuentra
+        if route not in VIEW_FACTORIES:
+            route = "/"
+        with views_lock:
+            if route not in views:
+                views[route] = VIEW_FACTORIES[route](page)
+            return views[route]
+
+    def cancel_chat():
+        chat_view = views.get("/chat")
+        if chat_view:
+            chat_view.cancel_pending()
+
+    def release_session():
+        # Suelta el historial y los controles de la sesión para que se puedan recolectar
+        with views_lock:
+            released = list(views.values())
+            views.clear()
+        for view in released:
+            if hasattr(view, "dispose"):
+                view.dispose()
 
     def route_change(route):
+        # Si el usuario sale del chat, se cancela la respuesta que esté en curso
+        if page.route != "/chat":
+            cancel_chat()
         page.views.clear()
-        # Obtiene la vista correspondiente a la ruta, o la de inicio si no se encuentra
-        view = views.get(page.route, views["/"])
-        page.views.append(view)
+        page.views.append(get_view(page.route))
         page.go(page.route)
 
+    def on_connect(e):
+        registry.mark_connected(page.session_id)
+
+    def on_disconnect(e):
+        cancel_chat()
+        registry.mark_disconnected(page.session_id)
+
+    def on_close(e):
+        registry.release(page.session_id)
+
+    registry.register(page.session_id, release_session)
     page.on_route_change = route_change
+    page.on_connect = on_connect
+    page.on_disconnect = on_disconnect
+    page.on_close = on_close
     page.go(page.route)
 
 if __name__ == "__main__":
     # Para despliegue web, es crucial especificar el host y el puerto.
     # Railway usará la variable de entorno PORT, pero definimos un valor por defecto.
     port = int(os.getenv("PORT", 8502))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # El modelo y el índice se cargan en segundo plano: la página de inicio se sirve de inmediato
+    get_retrieval_engine().warmup_in_background()
+    get_session_registry().start_reaper()
+    start_metrics_exporters()
     ft.app(target=main, port=port, host="0.0.0.0")
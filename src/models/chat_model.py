@@ -1,8 +1,80 @@
+from typing import Optional
+
+
 class Message:
     """
-    Una clase de datos simple para representar un mensaje en el chat.
+    Una clase de datos simple para representar un mensaje en el chat. Con
+    `__slots__` cada instancia ocupa lo mismo que sus tres referencias, sin
+    diccionario propio.
     """
+    __slots__ = ("user_name", "text", "message_type")
+
     def __init__(self, user_name: str, text: str, message_type: str):
         self.user_name = user_name
         self.text = text
-        self.message_type = message_type
\ No newline at end of file
+        self.message_type = message_type
+
+
+class ChatTranscript:
+    """
+    Todos los mensajes de una conversación, en orden. La vista solo mantiene
+    controles para los más recientes y pide aquí los anteriores cuando se necesitan.
+
+    Con un almacén (`services.session_store.SessionStore`) la conversación se
+    puede retomar: `resume()` carga solo los últimos mensajes y `before()` lee del
+    almacén, página por página, los que todavía no están en memoria. Las
+    posiciones siempre cuentan desde el primer mensaje de la conversación.
+    """
+    def __init__(self):
+        self._messages: list[Message] = []
+        self._store = None
+        self.session_id: Optional[str] = None
+        self._unloaded = 0  # Mensajes guardados anteriores a los que están en memoria
+        self._oldest_id: Optional[int] = None  # Id en el almacén del primero en memoria
+
+    def __len__(self) -> int:
+        return self._unloaded + len(self._messages)
+
+    def append(self, message: Message):
+        self._messages.append(message)
+
+    def attach(self, store, session_id: str):
+        """Empieza a guardar en `store` los mensajes que se pasen a `persist()`."""
+        self._store = store
+        self.session_id = session_id
+
+    def persist(self, *messages: Message):
+        """Encola los mensajes para guardarlos (no bloquea; ver `SessionStore.append`)."""
+        if self._store is not None:
+            self._store.append(self.session_id, messages)
+
+    def resume(self, store, session_id: str, count: int) -> list[Message]:
+        """
+        Retoma una conversación guardada: reemplaza los mensajes en memoria por sus
+        últimos `count` y los devuelve (vacío si no hay nada guardado).
+        """
+        self.attach(store, session_id)
+        page = store.load_before(session_id, None, count)
+        if page:
+            self._messages = [message for _, message in page]
+            self._oldest_id = page[0][0]
+            self._unloaded = store.count(session_id) - len(page)
+        return [message for _, message in page]
+
+    def before(self, index: int, count: int) -> list[Message]:
+        """Hasta `count` mensajes anteriores a la posición `index`."""
+        start = max(0, index - count)
+        if start < self._unloaded and self._store is not None:
+            page = self._store.load_before(self.session_id, self._oldest_id, self._unloaded - start)
+            self._messages[0:0] = [message for _, message in page]
+            if page:
+                self._oldest_id = page[0][0]
+            # Si el almacén ya no tiene más (p. ej. se borró), no se vuelve a pedir
+            self._unloaded = self._unloaded - len(page) if page else 0
+        local_end = index - self._unloaded
+        return self._messages[max(0, local_end - count):max(0, local_end)]
+
+    def clear(self):
+        self._messages = []
+        self._unloaded = 0
+        self._oldest_id = None
@@ -0,0 +1,70 @@
+"""
+Servidor web con varios workers: levanta el sidecar de búsqueda
+(`services/retrieval_sidecar.py`), que es el único proceso que carga el modelo y el
+índice, y después uvicorn con WEB_WORKERS procesos que sirven la app de Flet
+(`asgi.py`) y le piden las búsquedas por un socket Unix, autenticados con una clave
+que se genera en cada arranque (RETRIEVAL_AUTHKEY).
+
+    WEB_WORKERS=4 python src/serve.py
+
+Las sesiones de Flet viven en el worker que abrió el websocket; con un solo
+worker conviene seguir usando `python src/main.py`.
+"""
+import os
+import sys
+import secrets
+import logging
+import subprocess
+import time
+from pathlib import Path
+
+from services.retrieval_sidecar import DEFAULT_SOCKET, prepare_socket_folder
+
+logger = logging.getLogger(__name__)
+
+SRC_FOLDER = Path(__file__).parent
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+# Cuánto se espera a que el sidecar cree su socket antes de arrancar los workers
+SIDECAR_START_TIMEOUT = 30
+
+
+def start_sidecar(socket_path: str) -> subprocess.Popen:
+    prepare_socket_folder(socket_path)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    sidecar = subprocess.Popen(
+        [sys.executable, "-m", "services.retrieval_sidecar", "--socket", socket_path], cwd=SRC_FOLDER
+    )
+    deadline = time.monotonic() + SIDECAR_START_TIMEOUT
+    while not os.path.exists(socket_path):
+        if sidecar.poll() is not None:
+            raise RuntimeError(f"El sidecar de búsqueda terminó al arrancar (código {sidecar.returncode}).")
+        if time.monotonic() > deadline:
+            sidecar.terminate()
+            raise RuntimeError("El sidecar de búsqueda no creó su socket a tiempo.")
+        time.sleep(0.1)
+    return sidecar
+
+
+def main():
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    port = int(os.getenv("PORT", 8502))
+    socket_path = os.getenv("RETRIEVAL_SOCKET", DEFAULT_SOCKET)
+    # El sidecar y los workers heredan las variables; los workers usan el cliente del
+    # sidecar (ver get_retrieval_engine). La clave es nueva en cada arranque salvo que se fije.
+    os.environ["RETRIEVAL_SOCKET"] = socket_path
+    os.environ.setdefault("RETRIEVAL_AUTHKEY", secrets.token_hex(32))
+
+    sidecar = start_sidecar(socket_path)
+    logger.info("Sirviendo con %d workers en el puerto %d", WEB_WORKERS, port)
+    try:
+        uvicorn.run("asgi:app", host="0.0.0.0", port=port, workers=WEB_WORKERS, app_dir=str(SRC_FOLDER))
+    finally:
+        sidecar.terminate()
+        sidecar.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from services.chunking import Chunk
+from services.column_file import open_column_file, write_column_file
+
+# Columnas (una fila por fragmento, ordenadas por id): ids, offsets (N+1) de cada texto
+# dentro del bloque UTF-8, página (-1 = sin página), archivo de origen (posición en la
+# lista `sources` del encabezado) y etiquetas (bits de la lista `tags` del encabezado).
+# Ver services/column_file.py. El formato 2 es el mismo sin etiquetas.
+_MAGIC = b"SCOUTCHK"
+_FORMAT = 3
+_READABLE_FORMATS = (2, 3)
+MAX_TAGS = 64
+
+
+class ChunkStoreWriter:
+    """
+    Escribe un archivo de fragmentos sin tenerlos todos en memoria: cada texto se
+    agrega a un archivo temporal en cuanto llega y solo se guardan las columnas
+    (unos cuantos enteros por fragmento) hasta `close()`, que arma el archivo final.
+    Los fragmentos deben llegar con ids crecientes.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._texts_path = path.with_name(path.name + ".texts.tmp")
+        self._texts = open(self._texts_path, "wb")
+        self._ids = array("q")
+        self._lengths = array("q")
+        self._pages = array("i")
+        self._source_ids = array("i")
+        self._tags = array("Q")
+        self._sources: dict[str, int] = {}
+        self._tag_bits: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def tagged(self) -> int:
+        """Fragmentos con al menos una etiqueta."""
+        return sum(1 for mask in self._tags if mask)
+
+    def add(self, chunk_id: int, chunk: Chunk, tags: Iterable[str] = ()):
+        """Agrega un fragmento con sus etiquetas "campo:valor" (ver services/scout_metadata.py)."""
+        if self._ids and chunk_id <= self._ids[-1]:
+            raise ValueError(f"Los ids deben ser crecientes ({chunk_id} después de {self._ids[-1]}).")
+        mask = 0
+        for tag in tags:
+            if tag not in self._tag_bits:
+                if len(self._tag_bits) == MAX_TAGS:
+                    raise ValueError(f"Demasiadas etiquetas distintas (el máximo es {MAX_TAGS}).")
+                self._tag_bits[tag] = len(self._tag_bits)
+            mask |= 1 << self._tag_bits[tag]
+        text = chunk.text.encode("utf-8")
+        self._texts.write(text)
+        self._ids.append(chunk_id)
+        self._lengths.append(len(text))
+        self._pages.append(-1 if chunk.page is None else chunk.page)
+        self._source_ids.append(self._sources.setdefault(chunk.source, len(self._sources)))
+        self._tags.append(mask)
+
+    def close(self):
+        """Escribe el archivo final (reemplaza el anterior) y borra el temporal."""
+        self._texts.close()
+        offsets = np.zeros(len(self._ids) + 1, dtype="<i8")
+        np.cumsum(np.frombuffer(self._lengths, dtype=np.int64), out=offsets[1:])
+        columns = {
+            "ids": np.frombuffer(self._ids, dtype=np.int64).astype("<i8"),
+            "offsets": offsets,
+            "pages": np.frombuffer(self._pages, dtype=np.int32).astype("<i4"),
+            "sources": np.frombuffer(self._source_ids, dtype=np.int32).astype("<i4"),
+            "tags": np.frombuffer(self._tags, dtype=np.uint64).astype("<u8"),
+        }
+        # Los diccionarios conservan el orden: la posición de cada fuente y etiqueta es su índice o bit
+        header = {"format": _FORMAT, "sources": list(self._sources), "tags": list(self._tag_bits)}
+        try:
+            with open(self._texts_path, "rb") as texts:
+                write_column_file(self.path, _MAGIC, header, columns, iter(lambda: texts.read(1024 * 1024), b""))
+        finally:
+            self._texts_path.unlink(missing_ok=True)
+
+    def abort(self):
+        """Descarta lo escrito sin tocar el archivo anterior."""
+        self._texts.close()
+        self._texts_path.unlink(missing_ok=True)
+
+
+def write_chunk_store(path: Path, chunks: dict[int, Chunk], tags: Optional[dict[int, Iterable[str]]] = None):
+    """
+    Escribe los fragmentos (por id) en `path`, reemplazando el archivo anterior.
+    `tags` son las etiquetas "campo:valor" de cada fragmento (ver services/scout_metadata.py).
+    """
+    tags = tags or {}
+    writer = ChunkStoreWriter(path)
+    try:
+        for chunk_id in sorted(chunks):
+            writer.add(chunk_id, chunks[chunk_id], tags.get(chunk_id, ()))
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+
+class ChunkStore:
+    """
+    Fragmentos del índice en un archivo de solo lectura abierto con mmap. Las
+    columnas (ids, offsets, páginas) son arrays de numpy sobre el propio archivo y
+    el texto se decodifica solo al pedir un fragmento, así que abrirlo es casi
+    instantáneo y todos los procesos que lo abren comparten las mismas páginas de
+    memoria del sistema operativo.
+
+    Se usa como un diccionario de solo lectura: `store[chunk_id]` devuelve un `Chunk`.
+    """
+    def __init__(self, path: Path):
+        store = open_column_file(path, _MAGIC)
+        if store.header.get("format") not in _READABLE_FORMATS:
+            raise ValueError(f"Formato de fragmentos no soportado: {store.header.get('format')}.")
+        self._mmap = store.mmap
+        self._sources: list[str] = store.header["sources"]
+        self._ids = store.columns["ids"]
+        self._offsets = store.columns["offsets"]
+        self._pages = store.columns["pages"]
+        self._source_ids = store.columns["sources"]
+        # None en archivos del formato 2 (generados antes de las etiquetas)
+        self._tags = store.columns.get("tags")
+        self._tag_names: list[str] = store.header.get("tags", [])
+        self._texts_start = store.blob_start
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _row(self, chunk_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self._ids, chunk_id))
+        if row < len(self._ids) and self._ids[row] == chunk_id:
+            return row
+        return None
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return self._row(chunk_id) is not None
+
+    def __getitem__(self, chunk_id: int) -> Chunk:
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self._chunk_at(row)
+
+    def _chunk_at(self, row: int) -> Chunk:
+        start = self._texts_start + int(self._offsets[row])
+        end = self._texts_start + int(self._offsets[row + 1])
+        page = int(self._pages[row])
+        return Chunk(self._mmap[start:end].decode("utf-8"), self._sources[self._source_ids[row]], None if page < 0 else page)
+
+    def get(self, chunk_id: int, default=None):
+        row = self._row(chunk_id)
+        return default if row is None else self._chunk_at(row)
+
+    def ids(self) -> list[int]:
+        return self._ids.tolist()
+
+    def items(self) -> Iterator[tuple[int, Chunk]]:
+        for row, chunk_id in enumerate(self._ids.tolist()):
+            yield chunk_id, self._chunk_at(row)
+
+    @property
+    def has_tags(self) -> bool:
+        return self._tags is not None
+
+    def tags(self, chunk_id: int) -> set[str]:
+        """Etiquetas del fragmento (vacío si no tiene o si el archivo no guarda etiquetas)."""
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        mask = 0 if self._tags is None else int(self._tags[row])
+        return {tag for bit, tag in enumerate(self._tag_names) if mask >> bit & 1}
+
+    def matching_ids(self, wanted: Iterable[str]) -> Optional[np.ndarray]:
+        """
+        Ids (ordenados) de los fragmentos compatibles con las etiquetas `wanted`: para
+        cada una ("campo:valor"), los que la tienen o no tienen ninguna de ese campo.
+        None si el archivo no guarda etiquetas.
+        """
+        if self._tags is None:
+            return None
+        allowed = np.ones(len(self._ids), dtype=bool)
+        for tag in wanted:
+            field = tag.split(":", 1)[0] + ":"
+            field_bits = sum(1 << bit for bit, name in enumerate(self._tag_names) if name.startswith(field))
+            if not field_bits:
+                continue
+            wanted_bit = 1 << self._tag_names.index(tag) if tag in self._tag_names else 0
+            allowed &= ((self._tags & np.uint64(field_bits)) == 0) | ((self._tags & np.uint64(wanted_bit)) != 0)
+        return self._ids[allowed]
+
+    def close(self):
+        # Los arrays exportan el buffer del mmap: hay que soltarlos antes de cerrarlo
+        self._ids = self._offsets = self._pages = self._source_ids = self._tags = None
+        self._mmap.close()
@@ -0,0 +1,159 @@
+import re
+from typing import Iterable, NamedTuple, Optional
+
+from services.tokens import count_tokens, split_by_tokens
+
+# Tamaño de los fragmentos en tokens (estimados con `count_tokens`). El máximo deja
+# margen bajo las 256 piezas que acepta all-MiniLM-L6-v2; las secciones más cortas
+# que el mínimo se juntan con la siguiente en vez de quedar como fragmento suelto.
+CHUNK_MAX_TOKENS = 180
+CHUNK_MIN_TOKENS = 40
+
+# Encabezados: "1.- BRÚJULA.", "3.2 Juegos de pista", "# Título" o una línea corta en mayúsculas
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(\.\d+)*\.?-?|[IVXLC]+\.-?)\s+[A-ZÁÉÍÓÚÑ]")
+_MARKDOWN_HEADING_RE = re.compile(r"^#{1,6}\s")
+_HEADING_MAX_CHARS = 90
+# Elementos de lista o filas de tabla: se conservan en su propia línea
+_LIST_ITEM_RE = re.compile(r"^([-•*·▪]|\d+[.)]|[a-z]\))\s")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;:])\s+(?=[\"“¿¡(A-ZÁÉÍÓÚÑ0-9])")
+_SPACES_RE = re.compile(r"[ \t ]+")
+
+
+class Chunk(NamedTuple):
+    """Fragmento de un documento, con el archivo y la página (1 en adelante) donde empieza."""
+    text: str
+    source: str
+    page: Optional[int] = None
+
+
+class _Block(NamedTuple):
+    text: str
+    page: Optional[int]
+    is_heading: bool
+
+
+def is_heading(line: str) -> bool:
+    """True si la línea parece un título de sección o de actividad."""
+    if not line or len(line) > _HEADING_MAX_CHARS:
+        return False
+    if _MARKDOWN_HEADING_RE.match(line) or _NUMBERED_HEADING_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and sum(c.isupper() for c in letters) / len(letters) > 0.8
+
+
+def _iter_blocks(pages: Iterable[tuple[Optional[int], str]]) -> Iterable[_Block]:
+    """
+    Convierte el texto de cada página en encabezados y párrafos. Las líneas que el
+    PDF cortó por el ancho de la página se vuelven a unir; los párrafos terminan en
+    una línea vacía y las listas o tablas conservan un elemento por línea.
+    """
+    for page, text in pages:
+        lines: list[str] = []
+        for raw_line in text.splitlines():
+            line = _SPACES_RE.sub(" ", raw_line).strip()
+            if not line:
+                if lines:
+                    yield _Block("\n".join(lines), page, False)
+                    lines = []
+            elif is_heading(line):
+                if lines:
+                    yield _Block("\n".join(lines), page, False)
+                    lines = []
+                yield _Block(line, page, True)
+            elif lines and not _LIST_ITEM_RE.match(line):
+                lines[-1] = f"{lines[-1]} {line}"
+            else:
+                lines.append(line)
+        if lines:
+            yield _Block("\n".join(lines), page, False)
+
+
+def _split_long(text: str, max_tokens: int) -> list[str]:
+    """Divide un párrafo demasiado largo por oraciones y, si hace falta, en ventanas de tokens."""
+    pieces: list[str] = []
+    for sentence in _SENTENCE_SPLIT_RE.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+        else:
+            pieces.extend(split_by_tokens(sentence, max_tokens))
+    return pieces
+
+
+def chunk_document(
+    pages: Iterable[tuple[Optional[int], str]],
+    source: str,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    min_tokens: int = CHUNK_MIN_TOKENS,
+) -> list[Chunk]:
+    """
+    Divide un documento en fragmentos que respetan su estructura: un fragmento nunca
+    corta una oración y una sección nueva (un encabezado) empieza un fragmento nuevo.
+    Las secciones largas se reparten en varios fragmentos por párrafos u oraciones,
+    y cada uno repite el encabezado de su sección para no perder el contexto.
+
+    `pages` son pares (número de página, texto); para archivos sin páginas el número es None.
+    """
+    chunks: list[Chunk] = []
+    heading = ""
+    parts: list[str] = []
+    tokens = 0
+    page: Optional[int] = None
+
+    def flush():
+        nonlocal parts, tokens
+        body = "\n".join(parts).strip()
+        if body:
+            chunks.append(Chunk(body, source, page))
+        parts, tokens = [], 0
+
+    def start_part(first_page: Optional[int]):
+        nonlocal page, tokens
+        page = first_page
+        if heading:
+            parts.append(heading)
+            tokens += count_tokens(heading)
+
+    for block in _iter_blocks(pages):
+        if block.is_heading:
+            # Las secciones muy cortas se quedan con la siguiente
+            if tokens >= min_tokens:
+                flush()
+            heading = block.text
+            if parts and tokens + count_tokens(heading) > max_tokens:
+                flush()
+            if parts:
+                parts.append(heading)
+                tokens += count_tokens(heading)
+            else:
+                start_part(block.page)
+            continue
+
+        pieces = [block.text]
+        heading_tokens = count_tokens(heading)
+        if count_tokens(block.text) + heading_tokens > max_tokens:
+            pieces = _split_long(block.text, max_tokens - heading_tokens)
+        continues_paragraph = False
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if parts and tokens + piece_tokens > max_tokens:
+                flush()
+                continues_paragraph = False
+            if not parts:
+                start_part(block.page)
+            if continues_paragraph:
+                parts[-1] = f"{parts[-1]} {piece}"
+            else:
+                parts.append(piece)
+            tokens += piece_tokens
+            continues_paragraph = True
+    flush()
+    return chunks
+
+
+def format_chunk(chunk) -> str:
+    """Texto del fragmento para el prompt, con su origen ("[archivo, pág. N]") si se conoce."""
+    if isinstance(chunk, str):
+        return chunk
+    origin = chunk.source if chunk.page is None else f"{chunk.source}, pág. {chunk.page}"
+    return f"[{origin}]\n{chunk.text}"
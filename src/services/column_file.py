@@ -0,0 +1,71 @@
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+# Archivos de solo lectura con columnas de numpy y un bloque de bytes, pensados para
+# abrirse con mmap (ver `ChunkStore` y `LexicalIndex`). Formato:
+#   magic (8 bytes) | largo del encabezado (uint64) | encabezado JSON | columnas | bloque de bytes
+# El encabezado guarda el tipo, la cantidad y la posición de cada columna (relativa al
+# final del encabezado; todo empieza en un múltiplo de 8), además de los campos propios
+# de cada archivo.
+
+
+class ColumnFile(NamedTuple):
+    mmap: mmap.mmap
+    header: dict
+    columns: dict[str, np.ndarray]
+    blob_start: int
+
+
+def _align(position: int) -> int:
+    return (position + 7) & ~7
+
+
+def write_column_file(
+    path: Path, magic: bytes, header: dict, columns: dict[str, np.ndarray], blob: Iterable[bytes] = ()
+):
+    """
+    Escribe el archivo en un temporal y luego lo reemplaza: los procesos que tienen
+    abierto (con mmap) el archivo anterior lo siguen leyendo sin problemas.
+    """
+    layout, position = {}, 0
+    for name, column in columns.items():
+        layout[name] = {"dtype": column.dtype.str, "count": len(column), "offset": position}
+        position = _align(position + column.nbytes)
+    encoded = json.dumps({**header, "columns": layout, "blob_offset": position}, ensure_ascii=False).encode("utf-8")
+    data_start = _align(len(magic) + 8 + len(encoded))
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(magic)
+        f.write(np.uint64(len(encoded)).tobytes())
+        f.write(encoded)
+        for name, column in columns.items():
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(column.tobytes())
+        f.write(b"\0" * (data_start + position - f.tell()))
+        for part in blob:
+            f.write(part)
+    os.replace(tmp_path, path)
+
+
+def open_column_file(path: Path, magic: bytes) -> ColumnFile:
+    """Abre el archivo con mmap; las columnas son arrays de numpy sobre el propio archivo."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(magic)] != magic:
+        mapped.close()
+        raise ValueError(f"'{path.name}' no tiene el formato esperado.")
+    header_length = int(np.frombuffer(mapped, dtype="<u8", count=1, offset=len(magic))[0])
+    start = len(magic) + 8
+    header = json.loads(mapped[start:start + header_length].decode("utf-8"))
+    data_start = _align(start + header_length)
+    columns = {
+        name: np.frombuffer(mapped, dtype=spec["dtype"], count=spec["count"], offset=data_start + spec["offset"])
+        for name, spec in header["columns"].items()
+    }
+    return ColumnFile(mapped, header, columns, data_start + header["blob_offset"])
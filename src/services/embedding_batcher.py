@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones que llegan casi al mismo tiempo para procesarlas en un solo
+    lote (una pasada del modelo de embeddings y una búsqueda FAISS multi-consulta).
+
+    Un hilo propio toma la primera petición en espera, junta las que lleguen en
+    los siguientes `max_wait_ms` milisegundos (hasta `max_batch_size`) y llama a
+    `process_batch` con todas. Cada quien recibe su resultado en el `Future` que
+    devolvió `submit()`. Con poca carga los lotes son de uno y la espera extra es
+    de `max_wait_ms` como máximo.
+    """
+    def __init__(
+        self,
+        process_batch: Callable[[list[Any]], list[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        name: str = "micro-batcher",
+    ):
+        self._process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[tuple[Any, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Encola `item` y devuelve un `Future` con su resultado."""
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _next_batch(self) -> list[tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Primero se toma lo que ya está en la cola; luego se espera hasta el límite
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(item, future) for item, future in self._next_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self._process_batch([item for item, _ in batch])
+            except Exception as e:
+                logger.exception("Falló el procesamiento de un lote de %d peticiones.", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
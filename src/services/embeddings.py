@@ -0,0 +1,266 @@
+"""
+Modelo de embeddings, el mismo al indexar (`preprocess_files.py`) y al buscar
+(`RetrievalEngine`), con el backend que indique EMBEDDING_BACKEND:
+
+- torch: `SentenceTransformer` con PyTorch (el de siempre);
+- onnx: el mismo modelo exportado a ONNX, con ONNX Runtime y el tokenizador del
+  modelo (`tokenizers`); no importa torch, así que carga y codifica más rápido en CPU;
+- onnx-int8: igual, con los pesos cuantizados a int8.
+
+Los archivos ONNX se buscan en la carpeta `onnx/` del modelo (el repositorio de
+all-MiniLM-L6-v2 ya los publica). Para otro modelo se generan con:
+
+    python src/services/embeddings.py export --output models/mi-modelo
+
+y se usa EMBEDDING_MODEL=models/mi-modelo. Para comprobar que un backend da los
+mismos embeddings que torch (sale con error si no):
+
+    EMBEDDING_BACKEND=onnx-int8 python src/services/embeddings.py check
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Archivo de cada backend ONNX dentro de la carpeta del modelo (mismos nombres que en Hugging Face)
+ONNX_MODEL_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx"),
+}
+# Similitud coseno mínima, texto por texto, entre un backend y torch
+EMBEDDING_MIN_COSINE = float(os.getenv("EMBEDDING_MIN_COSINE", 0.99))
+# Repositorio de los modelos que se piden por nombre corto (como hace SentenceTransformer)
+DEFAULT_MODEL_ORGANIZATION = "sentence-transformers"
+
+_MODEL_CONFIG_FILES = ("tokenizer.json", "tokenizer_config.json", "sentence_bert_config.json", "modules.json")
+
+
+class EmbeddingDriftError(RuntimeError):
+    """Los embeddings de un backend se alejan de los de torch más de lo permitido."""
+
+
+def _model_folder(model_name: str, files: list[str]) -> Path:
+    """Carpeta local del modelo; si es un nombre del Hub, descarga solo los archivos indicados."""
+    if Path(model_name).is_dir():
+        return Path(model_name)
+    from huggingface_hub import snapshot_download
+
+    repo_id = model_name if "/" in model_name else f"{DEFAULT_MODEL_ORGANIZATION}/{model_name}"
+    return Path(snapshot_download(repo_id, allow_patterns=files))
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _pooling_mode(folder: Path) -> str:
+    """Agregación de los tokens según la configuración del módulo Pooling del modelo."""
+    modules = _read_json(folder / "modules.json") or []
+    pooling_path = next((m["path"] for m in modules if "Pooling" in m.get("type", "")), "1_Pooling")
+    config = _read_json(folder / pooling_path / "config.json")
+    if "pooling_mode" in config:
+        return config["pooling_mode"]
+    # Formato anterior de sentence-transformers: una bandera por modo
+    for mode in ("cls", "max", "mean"):
+        if config.get(f"pooling_mode_{mode}_token" if mode == "cls" else f"pooling_mode_{mode}_tokens"):
+            return mode
+    return "mean"
+
+
+class OnnxEmbeddingModel:
+    """
+    Lo que hace `SentenceTransformer` con este tipo de modelo, sobre ONNX Runtime:
+    tokenización con el mismo `tokenizer.json` (truncada a max_seq_length), la
+    agregación del módulo Pooling y la normalización si el modelo la incluye. Tiene
+    el mismo `encode()` que se usa de `SentenceTransformer`.
+    """
+    def __init__(self, model_name: str, onnx_file: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        folder = _model_folder(model_name, [onnx_file, *_MODEL_CONFIG_FILES, "*/config.json"])
+        onnx_path = folder / onnx_file
+        if not onnx_path.exists():
+            raise FileNotFoundError(
+                f"El modelo '{model_name}' no tiene {onnx_file}; genéralo con "
+                f"`python src/services/embeddings.py export --output <carpeta>`."
+            )
+        max_length = _read_json(folder / "sentence_bert_config.json").get("max_seq_length", 256)
+        pad_token = _read_json(folder / "tokenizer_config.json").get("pad_token", "[PAD]")
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content", "[PAD]")
+
+        self._tokenizer = Tokenizer.from_file(str(folder / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length)
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+        self._pooling = _pooling_mode(folder)
+        modules = _read_json(folder / "modules.json") or []
+        self._normalize_output = any("Normalize" in m.get("type", "") for m in modules)
+        self._session = onnxruntime.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+    def encode(self, texts: list[str], batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        # Como SentenceTransformer: ordenados por largo, cada lote se rellena lo menos posible
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        ordered = [texts[i] for i in order]
+        batches = [self._encode_batch(ordered[start:start + batch_size]) for start in range(0, len(ordered), batch_size)]
+        if not batches:
+            return np.zeros((0, 0), dtype="float32")
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=batches[0].dtype)
+        embeddings[order] = np.concatenate(batches)
+        if normalize_embeddings or self._normalize_output:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings.astype("float32", copy=False)
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype="int64")
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype="int64")
+        hidden = self._session.run(None, feeds)[0]
+
+        if self._pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[:, :, None].astype(hidden.dtype)
+        if self._pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def load_embedding_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+    """Modelo de embeddings con el backend indicado; todos tienen `encode(textos, batch_size, normalize_embeddings)`."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Backend de embeddings desconocido: '{backend}' (opciones: {', '.join(EMBEDDING_BACKENDS)}).")
+    if backend in ONNX_MODEL_FILES:
+        return OnnxEmbeddingModel(model_name, ONNX_MODEL_FILES[backend])
+    # Importación pesada (torch) diferida hasta que de verdad se necesita
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def check_embedding_equivalence(model, reference, texts: list[str], min_cosine: float = EMBEDDING_MIN_COSINE) -> float:
+    """
+    Compara los embeddings normalizados de `model` y `reference` (el backend torch)
+    para cada texto. Devuelve la similitud más baja, o lanza `EmbeddingDriftError`
+    si alguna queda por debajo de `min_cosine`.
+    """
+    encoded = model.encode(texts, batch_size=32, normalize_embeddings=True)
+    expected = reference.encode(texts, batch_size=32, normalize_embeddings=True)
+    cosines = np.sum(np.asarray(encoded) * np.asarray(expected), axis=1)
+    worst = float(cosines.min())
+    if worst < min_cosine:
+        raise EmbeddingDriftError(
+            f"Los embeddings difieren de los de torch: similitud mínima {worst:.6f} "
+            f"(se exige {min_cosine}) en \"{texts[int(cosines.argmin())][:80]}\"."
+        )
+    return worst
+
+
+def export_onnx(model_name: str, output: Path):
+    """
+    Guarda el modelo en `output` (con su tokenizador y configuración) y lo exporta a
+    ONNX en `output/onnx/`, también cuantizado a int8. Requiere torch, onnx y onnxruntime.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    model.save(str(output))
+    transformer = model[0].auto_model.eval()
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    example = model.tokenizer(["Ejemplo para exportar"], return_tensors="pt", return_token_type_ids=True)
+    onnx_path = output / ONNX_MODEL_FILES["onnx"]
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.onnx.export(
+        _LastHiddenState(transformer),
+        tuple(example[name] for name in names),
+        str(onnx_path),
+        input_names=names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+        opset_version=17,
+        dynamo=False,
+    )
+    quantize_dynamic(str(onnx_path), str(output / ONNX_MODEL_FILES["onnx-int8"]), weight_type=QuantType.QUInt8)
+
+
+def _sample_texts(cache_folder: Path, limit: int) -> list[str]:
+    """Fragmentos del índice (si existe) para la comprobación de equivalencia."""
+    from services.chunk_store import ChunkStore
+
+    path = cache_folder / "chunks.bin"
+    if not path.exists():
+        return []
+    store = ChunkStore(path)
+    ids = store.ids()
+    step = max(1, len(ids) // limit)
+    return [store[chunk_id].text for chunk_id in ids[::step][:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Herramientas de los backends de embeddings.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Exporta el modelo a ONNX (normal e int8).")
+    export_parser.add_argument("--model", default=EMBEDDING_MODEL)
+    export_parser.add_argument("--output", type=Path, required=True)
+    check_parser = subparsers.add_parser("check", help="Compara los embeddings de un backend con los de torch.")
+    check_parser.add_argument("--model", default=EMBEDDING_MODEL)
+    check_parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    check_parser.add_argument("--samples", type=int, default=200)
+    check_parser.add_argument("--cache", type=Path, default=None, help="Carpeta del índice con los textos de prueba.")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model, args.output)
+        print(f"Modelo exportado a {args.output / 'onnx'}.")
+        return
+
+    from services.settings import CACHE_FOLDER
+
+    texts = _sample_texts(args.cache or CACHE_FOLDER, args.samples) or [
+        "Programa de actividades para una reunión de tropa",
+        "Requisitos de la insignia de especialidad en primeros auxilios",
+        "Juegos de desfogue para la manada",
+    ]
+    try:
+        worst = check_embedding_equivalence(
+            load_embedding_model(args.model, args.backend), load_embedding_model(args.model, "torch"), texts
+        )
+    except EmbeddingDriftError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Backend '{args.backend}' equivalente a torch en {len(texts)} textos (similitud mínima {worst:.4f}).")
+
+
+if __name__ == "__main__":
+    main()
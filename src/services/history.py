@@ -0,0 +1,111 @@
+import os
+import re
+from services.tokens import count_tokens
+
+# Tokens máximos que se reenvían de la conversación en cada turno (sin contar el
+# prompt base ni el contexto recuperado).
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+# Tokens máximos del resumen de los turnos antiguos.
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 600))
+# Mensajes recientes que se conservan completos aunque excedan el presupuesto.
+MIN_RECENT_MESSAGES = 2
+
+# Longitud máxima (en caracteres) de cada línea del resumen
+_SUMMARY_LINE_CHARS = 240
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?:])\s")
+_NON_ALNUM_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+class ConversationHistory:
+    """
+    Historial de la conversación con presupuesto de tokens.
+
+    Los turnos más recientes se envían completos. Cuando exceden el presupuesto,
+    los más antiguos se pliegan en un resumen que se va acumulando (y se guarda,
+    así que cada turno solo se resume una vez). El resumen es extractivo: las
+    respuestas del usuario (sección, progresión, insignia, etc.) se conservan casi
+    íntegras y de las del asistente solo la primera oración.
+    """
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, summary_budget: int = SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self._messages: list[dict] = []
+        self._message_tokens: list[int] = []
+        self._summary_lines: list[str] = []
+        self._summary_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self._summary_lines)
+
+    def add(self, role: str, content: str):
+        self._messages.append({"role": role, "content": content})
+        self._message_tokens.append(count_tokens(content) + 4)
+        self._fold()
+
+    def discard_last(self, role: str, content: str):
+        """Quita el último mensaje si coincide (p. ej. un prompt cuya petición se canceló)."""
+        if self._messages and self._messages[-1] == {"role": role, "content": content}:
+            self._messages.pop()
+            self._message_tokens.pop()
+
+    def clear(self):
+        self._messages = []
+        self._message_tokens = []
+        self._summary_lines = []
+        self._summary_tokens = 0
+
+    def messages(self) -> list[dict]:
+        """Mensajes a enviar: el resumen (si lo hay) seguido de los turnos recientes."""
+        if not self._summary_lines:
+            return list(self._messages)
+        summary_message = {
+            "role": "system",
+            "content": "--- RESUMEN DE LA CONVERSACIÓN ANTERIOR ---\n" + self.summary,
+        }
+        return [summary_message] + self._messages
+
+    def token_count(self) -> int:
+        """Tokens que ocupa `messages()`."""
+        summary = count_tokens(self.summary) + 12 if self._summary_lines else 0
+        return summary + sum(self._message_tokens)
+
+    def _fold(self):
+        while sum(self._message_tokens) > self.token_budget and len(self._messages) > MIN_RECENT_MESSAGES:
+            message = self._messages.pop(0)
+            self._message_tokens.pop(0)
+            self._add_summary_line(message)
+
+    def _add_summary_line(self, message: dict):
+        content = " ".join(message["content"].split())
+        if message["role"] == "user":
+            line = f"Usuario: {content[:_SUMMARY_LINE_CHARS]}"
+        else:
+            first_sentence = _SENTENCE_END_RE.split(content, maxsplit=1)[0]
+            line = f"Asistente: {first_sentence[:_SUMMARY_LINE_CHARS]}"
+        self._summary_lines.append(line)
+        self._summary_tokens += count_tokens(line)
+        # Si el resumen excede su presupuesto se descartan sus líneas más antiguas
+        while self._summary_tokens > self.summary_budget and len(self._summary_lines) > 1:
+            self._summary_tokens -= count_tokens(self._summary_lines.pop(0))
+
+
+def dedupe_context(chunks: list[str]) -> list[str]:
+    """
+    Quita los fragmentos repetidos del contexto recuperado. Dos fragmentos se
+    consideran iguales si coinciden al ignorar espacios, mayúsculas y puntuación
+    (el corpus tiene el mismo texto en varios archivos y formatos), o si uno está
+    contenido en otro ya elegido.
+    """
+    kept, kept_keys = [], []
+    for chunk in chunks:
+        # Los saltos de línea escapados (\n literal) vienen de las copias en JSON
+        key = _NON_ALNUM_RE.sub("", chunk.replace("\\n", " ").lower())
+        if not key or any(key in other for other in kept_keys):
+            continue
+        kept.append(chunk)
+        kept_keys.append(key)
+    return kept
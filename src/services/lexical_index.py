@@ -0,0 +1,144 @@
+import hashlib
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from services.column_file import open_column_file, write_column_file
+
+LEXICAL_INDEX_FILE = "lexical.bin"
+
+# Parámetros de BM25: saturación de la frecuencia del término y normalización por largo
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_MAGIC = b"SCOUTBM2"
+_FORMAT = 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Palabras vacías del español (ya sin acentos): no ayudan a distinguir un fragmento de otro
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales cuando
+de del desde donde durante e el ella ellas ellos en entre era es esa esas ese eso esos esta
+estan estar estas este esto estos fue ha hay la las le les lo los mas me mi mis muy nada ni
+no nos o otra otras otro otros para pero poco por porque puede que quien quienes se sea ser
+si sin sobre son su sus tambien tiene todo todos tu tus un una unas uno unos y ya yo
+""".split())
+
+
+def fold_accents(text: str) -> str:
+    """Quita acentos y diéresis ("Ajolote de Xochimilco" y "xochimilco" coinciden igual que "brújula" y "brujula")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stem(word: str) -> str:
+    # Solo plurales: "lobatos" -> "lobato", "reuniones" -> "reunion", "actividades" -> "actividad"
+    if len(word) > 4 and word.endswith("es") and word[-3] in "lnrdj":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Términos de un texto: en minúsculas, sin acentos, sin palabras vacías y sin plurales."""
+    words = _WORD_RE.findall(fold_accents(text.lower()))
+    return [_stem(w) for w in words if len(w) > 1 and w not in STOPWORDS]
+
+
+def _term_hash(term: str) -> int:
+    # El vocabulario se guarda como hashes de 64 bits ordenados para buscarlos con searchsorted
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_lexical_index(path: Path, chunks: Iterable[tuple[int, str]]):
+    """
+    Construye el índice invertido BM25 de los fragmentos (id, texto) y lo guarda en
+    `path`. Cada posting guarda el peso BM25 del término en el fragmento ya calculado
+    (frecuencia saturada y normalizada por largo), así que al buscar solo se suman pesos.
+    """
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    lengths: dict[int, int] = {}
+    for chunk_id, text in chunks:
+        terms = tokenize(text)
+        lengths[chunk_id] = len(terms)
+        for term, frequency in Counter(terms).items():
+            postings[term].append((chunk_id, frequency))
+
+    count = len(lengths)
+    average_length = (sum(lengths.values()) / count) if count else 0.0
+    entries = sorted((_term_hash(term), term) for term in postings)
+    term_hashes = np.array([h for h, _ in entries], dtype="<u8")
+    idf = np.zeros(len(entries), dtype="<f4")
+    offsets = np.zeros(len(entries) + 1, dtype="<i8")
+    posting_ids, posting_weights = [], []
+    for row, (_, term) in enumerate(entries):
+        term_postings = postings[term]
+        df = len(term_postings)
+        idf[row] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+        offsets[row + 1] = offsets[row] + df
+        for chunk_id, frequency in term_postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[chunk_id] / average_length)
+            posting_ids.append(chunk_id)
+            posting_weights.append(frequency * (BM25_K1 + 1) / (frequency + norm))
+
+    columns = {
+        "terms": term_hashes,
+        "idf": idf,
+        "offsets": offsets,
+        "ids": np.array(posting_ids, dtype="<i8"),
+        "weights": np.array(posting_weights, dtype="<f4"),
+    }
+    write_column_file(path, _MAGIC, {"format": _FORMAT, "chunks": count}, columns)
+
+
+class LexicalIndex:
+    """
+    Búsqueda BM25 sobre el índice invertido de `build_lexical_index`, abierto con
+    mmap. Una búsqueda solo lee las listas de los términos de la consulta, así que
+    su costo depende de esos términos y no del tamaño del corpus.
+    """
+    def __init__(self, path: Path):
+        index = open_column_file(path, _MAGIC)
+        if index.header.get("format") != _FORMAT:
+            raise ValueError(f"Formato de índice léxico no soportado: {index.header.get('format')}.")
+        self._mmap = index.mmap
+        self._terms = index.columns["terms"]
+        self._idf = index.columns["idf"]
+        self._offsets = index.columns["offsets"]
+        self._ids = index.columns["ids"]
+        self._weights = index.columns["weights"]
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def search(self, query: str, top_k: int, allowed: Optional[np.ndarray] = None) -> list[tuple[int, float]]:
+        """
+        Los `top_k` fragmentos con mayor puntaje BM25 para la consulta, como (id, puntaje).
+        Con `allowed` (ids ordenados) solo se consideran esos fragmentos.
+        """
+        ids, scores = [], []
+        for term in set(tokenize(query)):
+            key = _term_hash(term)
+            row = int(np.searchsorted(self._terms, key))
+            if row == len(self._terms) or self._terms[row] != key:
+                continue
+            start, end = self._offsets[row], self._offsets[row + 1]
+            ids.append(self._ids[start:end])
+            scores.append(self._weights[start:end] * self._idf[row])
+        if not ids:
+            return []
+
+        # Suma los puntajes de cada fragmento en todos los términos de la consulta
+        unique_ids, positions = np.unique(np.concatenate(ids), return_inverse=True)
+        totals = np.bincount(positions, weights=np.concatenate(scores))
+        if allowed is not None:
+            keep = np.isin(unique_ids, allowed, assume_unique=True)
+            unique_ids, totals = unique_ids[keep], totals[keep]
+        best = np.argsort(-totals, kind="stable")[:top_k]
+        return [(int(unique_ids[i]), float(totals[i])) for i in best]
@@ -0,0 +1,45 @@
+import os
+import logging
+import threading
+from typing import Optional
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+# La URL base se puede cambiar para apuntar a cualquier servidor compatible con la
+# API de OpenAI (p. ej. un servidor local de pruebas).
+API_BASE_URL = os.getenv("API_BASE_URL", "https://api.deepseek.com/v1")
+# Límite de peticiones simultáneas al modelo de lenguaje por proceso. También fija
+# el tamaño del pool de conexiones HTTP compartido.
+MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("MAX_CONCURRENT_LLM_REQUESTS", 16))
+
+_client: Optional[AsyncOpenAI] = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> AsyncOpenAI:
+    """
+    Devuelve el cliente de la API compartido por todos los controladores del proceso.
+    Un solo cliente significa un solo pool de conexiones HTTP (keep-alive) en lugar
+    de uno por sesión.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def _create_client() -> AsyncOpenAI:
+    api_key = os.getenv("API_KEY")
+    if not api_key:
+        error_msg = "---\n--- FATAL ERROR: La variable de entorno API_KEY no fue encontrada. Por favor, configúrala en Railway. ---\n---"
+        logger.critical(error_msg)
+        raise ValueError(error_msg)
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONCURRENT_LLM_REQUESTS,
+            max_keepalive_connections=MAX_CONCURRENT_LLM_REQUESTS,
+        )
+    )
+    return AsyncOpenAI(api_key=api_key, base_url=API_BASE_URL, http_client=http_client)
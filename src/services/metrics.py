@@ -0,0 +1,240 @@
+import os
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from services.tokens import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tiempos por etapa de cada turno (búsqueda, prompt, modelo, UI) en histogramas en
+# memoria. Apagado por defecto; apagado, cada medición es una comparación.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+# Puerto local con el texto en formato Prometheus en /metrics (0: sin endpoint)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Cada cuántos segundos se escribe un resumen en el log (0: nunca)
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", 0))
+
+STAGE_SECONDS = "scout_stage_seconds"
+PROMPT_TOKENS = "scout_prompt_tokens"
+PREFIX_REUSE = "scout_prompt_prefix_reuse"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1.0)
+
+
+class Histogram:
+    """Conteos por cubeta (límites superiores), suma y total, como un histograma de Prometheus."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # La última es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimación del cuantil `q`: el límite superior de la cubeta donde cae."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Span:
+    """Mide el bloque `with` como una etapa; `tag()` agrega etiquetas sobre la marcha."""
+    __slots__ = ("_metrics", "_stage", "_labels", "_start")
+
+    def __init__(self, metrics: "Metrics", stage: str, labels: dict):
+        self._metrics = metrics
+        self._stage = stage
+        self._labels = labels
+
+    def tag(self, **labels):
+        self._labels.update(labels)
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            status = "ok"
+        elif issubclass(exc_type, Exception):
+            status = "error"
+        else:
+            status = "cancelled"  # CancelledError o GeneratorExit (el stream se cerró antes)
+        self._metrics.record(self._stage, time.perf_counter() - self._start, status=status, **self._labels)
+        return False
+
+
+class _NoSpan:
+    """El `Span` cuando las métricas están apagadas: no mide nada."""
+    __slots__ = ()
+
+    def tag(self, **labels):
+        pass
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _format_labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+
+def token_bucket(tokens: int) -> str:
+    """Etiqueta del tamaño del prompt: el límite de su cubeta en TOKEN_BUCKETS."""
+    index = bisect.bisect_left(TOKEN_BUCKETS, tokens)
+    return str(TOKEN_BUCKETS[index]) if index < len(TOKEN_BUCKETS) else "+Inf"
+
+
+class Metrics:
+    """
+    Histogramas por nombre y etiquetas. `span(etapa)` mide un bloque y lo guarda en
+    `scout_stage_seconds{stage=...}`; `render()` da el texto para Prometheus y
+    `summary()` un resumen (p50/p99 por etapa) para el log.
+    """
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, **labels):
+        if not self.enabled:
+            return _NO_SPAN
+        return Span(self, stage, labels)
+
+    def record(self, stage: str, seconds: float, **labels):
+        """Registra una etapa medida a mano (p. ej. hasta el primer token de un stream)."""
+        if self.enabled:
+            self.observe(STAGE_SECONDS, seconds, LATENCY_BUCKETS, stage=stage, **labels)
+
+    def prompt_tokens(self, messages: list[dict]) -> str:
+        """Registra los tokens del prompt y devuelve su etiqueta de tamaño ('' si está apagado)."""
+        if not self.enabled:
+            return ""
+        tokens = count_message_tokens(messages)
+        self.observe(PROMPT_TOKENS, tokens, TOKEN_BUCKETS)
+        return token_bucket(tokens)
+
+    def prefix_reuse(self, ratio: float, source: str):
+        """Registra qué fracción del prompt salió de la caché de prefijos del proveedor."""
+        if self.enabled:
+            self.observe(PREFIX_REUSE, ratio, RATIO_BUCKETS, source=source)
+
+    def observe(self, name: str, value: float, buckets: tuple, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        """Todos los histogramas en el formato de texto de Prometheus."""
+        lines = []
+        with self._lock:
+            series = sorted(self._histograms.items())
+            last_name = None
+            for (name, labels), histogram in series:
+                if name != last_name:
+                    lines.append(f"# TYPE {name} histogram")
+                    last_name = name
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{{{_format_labels(labels + (('le', bound),))}}} {cumulative}")
+                suffix = f"{{{_format_labels(labels)}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {histogram.sum}")
+                lines.append(f"{name}_count{suffix} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list[str]:
+        """Una línea por etapa (sumando sus etiquetas): cuántas, p50 y p99 en ms."""
+        stages: dict[str, Histogram] = {}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                if name != STAGE_SECONDS:
+                    continue
+                stage = dict(labels)["stage"]
+                merged = stages.setdefault(stage, Histogram(histogram.buckets))
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.sum += histogram.sum
+                merged.count += histogram.count
+        return [
+            f"{stage}: {h.count} veces, p50 <= {h.quantile(0.5) * 1000:.0f} ms, p99 <= {h.quantile(0.99) * 1000:.0f} ms"
+            for stage, h in sorted(stages.items())
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# Instancia compartida del proceso: se consulta en cada etapa, así que es un
+# atributo del módulo y no pasa por un getter con lock
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Prometheus consulta seguido; no se llena el log
+
+
+def _log_periodically(interval: float):
+    while True:
+        time.sleep(interval)
+        lines = metrics.summary()
+        if lines:
+            logger.info("Latencia por etapa:\n  %s", "\n  ".join(lines))
+
+
+def start_metrics_exporters(port: int = METRICS_PORT, log_interval: float = METRICS_LOG_INTERVAL) -> Optional[ThreadingHTTPServer]:
+    """
+    Si las métricas están activas, abre el endpoint /metrics en 127.0.0.1:`port` y/o
+    escribe el resumen en el log cada `log_interval` segundos. Devuelve el servidor, si lo hay.
+    """
+    if not metrics.enabled:
+        return None
+    if log_interval > 0:
+        threading.Thread(target=_log_periodically, args=(log_interval,), name="metrics-log", daemon=True).start()
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    except OSError as e:
+        # Con varios workers solo el primero obtiene el puerto; los demás quedan en el log
+        logger.warning("No se pudo abrir el endpoint de métricas en el puerto %d: %s", port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Métricas en http://127.0.0.1:%d/metrics", port)
+    return server
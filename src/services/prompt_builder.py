@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+from services.tokens import CHARS_PER_TOKEN, count_message_tokens, count_tokens
+
+CONTEXT_HEADER = "--- CONTEXTO RELEVANTE ---"
+QUESTION_HEADER = "--- PREGUNTA ---"
+
+# El proveedor guarda en caché prefijos de la petición en bloques de ~64 tokens;
+# la simulación local usa bloques del mismo tamaño (en caracteres estimados).
+PREFIX_BLOCK_TOKENS = 64
+# Bloques que recuerda la simulación (el proveedor los conserva unas horas)
+PREFIX_SIMULATION_BLOCKS = 50_000
+
+
+def build_messages(base_prompt: str, history: list[dict], context: str) -> list[dict]:
+    """
+    Mensajes de un turno en el orden que más aprovecha la caché de prefijos del
+    proveedor: el prompt base (idéntico en todas las peticiones), la conversación
+    anterior y, al final, el contexto recuperado junto con la pregunta.
+    `history` termina con la pregunta del usuario.
+
+    El historial guarda cada pregunta sin su contexto, así que la pregunta anterior
+    no se reenvía como se envió: el prefijo en común con el turno anterior llega
+    hasta justo antes de esa pregunta. Cuando el historial resume los mensajes
+    viejos (ver `ConversationHistory`), el resumen cambia y solo se reutiliza el
+    prompt base. Guardar el contexto en el historial alargaría el prefijo, pero
+    también cada petición y el historial que se resume.
+    """
+    *previous, question = history
+    final_message = {
+        "role": "user",
+        "content": f"{CONTEXT_HEADER}\n{context}\n\n{QUESTION_HEADER}\n{question['content']}",
+    }
+    return [{"role": "system", "content": base_prompt}] + previous + [final_message]
+
+
+def _serialize(messages: list[dict]) -> str:
+    return "".join(f"<{message['role']}>\n{message['content']}\n" for message in messages)
+
+
+class PrefixReuse(NamedTuple):
+    """Tokens del prompt de un turno y cuántos de ellos salieron de la caché de prefijos."""
+    prompt_tokens: int
+    cached_tokens: int
+    # "provider" si lo reportó la API, "simulated" si es la estimación local
+    source: str
+
+    @property
+    def ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def provider_prefix_reuse(usage: Any) -> Optional[PrefixReuse]:
+    """
+    Lee los tokens en caché del campo `usage` de la respuesta: `prompt_cache_hit_tokens`
+    en DeepSeek o `prompt_tokens_details.cached_tokens` en OpenAI. None si no vienen.
+    """
+    if usage is None:
+        return None
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+    if cached is None or not usage.prompt_tokens:
+        return None
+    return PrefixReuse(usage.prompt_tokens, cached, "provider")
+
+
+class PrefixCacheSimulator:
+    """
+    Estimación local de la caché de prefijos del proveedor, compartida por todas
+    las conversaciones del proceso (como la del proveedor, que es por cuenta).
+
+    Cada petición se corta en bloques de PREFIX_BLOCK_TOKENS y se identifica cada
+    bloque por el hash de todo lo anterior; los tokens reutilizados son los de los
+    bloques iniciales que ya se habían visto.
+    """
+    def __init__(self, block_tokens: int = PREFIX_BLOCK_TOKENS, max_blocks: int = PREFIX_SIMULATION_BLOCKS):
+        self.block_chars = block_tokens * CHARS_PER_TOKEN
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, messages: list[dict]) -> PrefixReuse:
+        text = _serialize(messages)
+        prefix_hash = 0
+        cached_chars = 0
+        reusing = True
+        with self._lock:
+            for start in range(0, len(text) - self.block_chars + 1, self.block_chars):
+                prefix_hash = hash((prefix_hash, text[start:start + self.block_chars]))
+                if reusing and prefix_hash in self._blocks:
+                    self._blocks.move_to_end(prefix_hash)
+                    cached_chars = start + self.block_chars
+                    continue
+                reusing = False
+                self._blocks[prefix_hash] = None
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return PrefixReuse(count_message_tokens(messages), count_tokens(text[:cached_chars]), "simulated")
+
+
+_simulator: Optional[PrefixCacheSimulator] = None
+_simulator_lock = threading.Lock()
+
+def get_prefix_cache_simulator() -> PrefixCacheSimulator:
+    """Simulación compartida de la caché de prefijos (una por proceso)."""
+    global _simulator
+    if _simulator is None:
+        with _simulator_lock:
+            if _simulator is None:
+                _simulator = PrefixCacheSimulator()
+    return _simulator
@@ -0,0 +1,123 @@
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Optional
+
+from services.retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Segunda etapa de la búsqueda: un cross-encoder reordena los candidatos de FAISS/BM25.
+# Está apagada por defecto (RERANK_ENABLED=1 la activa) porque descarga un segundo modelo.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+# Multilingüe (entrenado con mMARCO, incluye español) y pequeño: 12 capas de 384
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+# Candidatos de la primera etapa que se reordenan por consulta
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))
+# Tiempo máximo de la etapa por lote de consultas; si se pasa, se usa el orden de la primera etapa
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 150))
+# Puntaje mínimo (0 a 1) para que un fragmento llegue al prompt; siempre se conserva el mejor
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", 0))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 20_000))
+RERANK_MAX_LENGTH = 256
+RERANK_BATCH_SIZE = 32
+
+
+class Reranker:
+    """
+    Reordena candidatos con un cross-encoder, que lee la consulta y el fragmento
+    juntos y es más preciso que comparar embeddings.
+
+    Todos los pares (consulta, fragmento) de un lote se puntúan en una sola llamada al
+    modelo, en un hilo aparte, y cada puntaje se guarda en una caché LRU. Si el modelo
+    no termina dentro del presupuesto, `rerank` devuelve None para las consultas que
+    faltan (se usa el orden de la primera etapa) y el cálculo sigue en segundo plano:
+    la próxima vez esos puntajes ya están en la caché. Mientras un cálculo sigue en
+    curso no se inicia otro, para no acumular trabajo atrasado.
+    """
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        budget_ms: float = RERANK_BUDGET_MS,
+        min_score: float = RERANK_MIN_SCORE,
+        cache_size: int = RERANK_CACHE_SIZE,
+    ):
+        self.model_name = model_name
+        self.budget = budget_ms / 1000
+        self.min_score = min_score
+        self._cache_size = cache_size
+        self._scores: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        self._busy = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def load(self):
+        """Carga el cross-encoder (lo descarga la primera vez)."""
+        from sentence_transformers import CrossEncoder
+
+        self._model = CrossEncoder(self.model_name, max_length=RERANK_MAX_LENGTH)
+
+    def rerank(
+        self, version: str, queries: list[str], candidates: list[list[tuple[int, str]]]
+    ) -> list[Optional[list[int]]]:
+        """
+        Para cada consulta, los ids de sus candidatos (id, texto) del más al menos
+        relevante, sin los que no alcanzan `min_score`; None si no se pudo a tiempo.
+        """
+        deadline = time.monotonic() + self.budget
+        keys = [[(version, normalize_query(q), chunk_id) for chunk_id, _ in c] for q, c in zip(queries, candidates)]
+
+        pending: dict[tuple, tuple[str, str]] = {}
+        with self._lock:
+            for query, query_keys, query_candidates in zip(queries, keys, candidates):
+                for key, (_, text) in zip(query_keys, query_candidates):
+                    if key in self._scores:
+                        self._scores.move_to_end(key)
+                        self.hits += 1
+                    elif key not in pending:
+                        pending[key] = (query, text)
+                        self.misses += 1
+
+        if pending and not self._busy.is_set():
+            self._busy.set()
+            future = self._executor.submit(self._score, pending)
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                pass
+            except Exception as e:
+                logger.error("No se pudo reordenar con el cross-encoder: %s", e)
+
+        results: list[Optional[list[int]]] = []
+        with self._lock:
+            for query_keys, query_candidates in zip(keys, candidates):
+                scores = [self._scores.get(key) for key in query_keys]
+                if any(score is None for score in scores):
+                    self.fallbacks += 1
+                    results.append(None)
+                    continue
+                ranked = sorted(zip(scores, (chunk_id for chunk_id, _ in query_candidates)), key=lambda pair: pair[0], reverse=True)
+                kept = [chunk_id for score, chunk_id in ranked if score >= self.min_score]
+                results.append(kept or [chunk_id for _, chunk_id in ranked[:1]])
+        return results
+
+    def _score(self, pending: dict[tuple, tuple[str, str]]):
+        try:
+            scores = self._model.predict(list(pending.values()), batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+            with self._lock:
+                for key, score in zip(pending, scores):
+                    self._scores[key] = float(score)
+                while len(self._scores) > self._cache_size:
+                    self._scores.popitem(last=False)
+        finally:
+            self._busy.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "fallbacks": self.fallbacks, "size": len(self._scores)}
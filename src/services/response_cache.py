@@ -0,0 +1,216 @@
+import os
+import re
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from services.settings import CACHE_FOLDER
+from services.retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Caché de respuestas completas del modelo para los primeros turnos de la conversación,
+# que casi siempre son las mismas preguntas de `prompt.txt`. Apagada por defecto.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_PATH = Path(os.getenv("RESPONSE_CACHE_PATH", CACHE_FOLDER / "responses.sqlite3"))
+# Similitud coseno mínima entre el prompt y el de una entrada guardada
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 5000))
+# Turnos del usuario a partir de los cuales la conversación ya es personal y no se usa la caché
+RESPONSE_CACHE_MAX_TURNS = int(os.getenv("RESPONSE_CACHE_MAX_TURNS", 4))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    parent_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    response TEXT NOT NULL,
+    generation_seconds REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+# Entradas del primer turno (sin respuesta anterior)
+ROOT = 0
+
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def response_cache_key(prompt: str) -> str:
+    """Texto del prompt que se guarda (y se codifica) para la entrada."""
+    return normalize_query(prompt)
+
+
+def response_scope(*parts: str) -> str:
+    """
+    Ámbito de las entradas (modelo, prompt base, etc.): una respuesta guardada solo
+    sirve mientras no cambie nada de lo que la produjo.
+    """
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class CachedResponse(NamedTuple):
+    id: int
+    text: str
+    similarity: float
+    # Lo que tardó el modelo en generarla (lo que se ahorra cada vez que se reutiliza)
+    generation_seconds: float
+
+
+class ResponseCache:
+    """
+    Respuestas del modelo guardadas en SQLite como un árbol de turnos: cada entrada
+    apunta a la del turno anterior (`parent_id`, ROOT en el primero). Mientras una
+    conversación sigue en la caché, su historial es exactamente el de la entrada a
+    la que llegó, así que solo el prompt nuevo se compara por similitud del
+    embedding (normalizado) entre los hijos de esa entrada. Dos prompts con números
+    distintos ("2 horas" y "3 horas") nunca se consideran iguales.
+
+    Los embeddings vigentes del ámbito en uso se mantienen en una matriz en memoria,
+    así que buscar es un producto matriz-vector; el texto solo se lee de SQLite
+    cuando hay acierto. Si otro proceso escribió en la base (`PRAGMA data_version`
+    cambió), la matriz se vuelve a leer. Las entradas caducan a los `ttl` segundos
+    y, por encima de `max_entries`, se descartan las usadas hace más tiempo.
+    """
+    def __init__(
+        self,
+        path: Path = RESPONSE_CACHE_PATH,
+        threshold: float = RESPONSE_CACHE_THRESHOLD,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._loaded: Optional[tuple[str, int]] = None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._parents = np.zeros(0, dtype=np.int64)
+        self._created = np.zeros(0, dtype=np.float64)
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _refresh(self, scope: str):
+        # data_version solo cambia cuando escribe otra conexión (otro proceso)
+        loaded = (scope, self._db.execute("PRAGMA data_version").fetchone()[0])
+        if loaded == self._loaded:
+            return
+        self._loaded = loaded
+        rows = self._db.execute(
+            "SELECT id, parent_id, created_at, embedding FROM responses WHERE scope = ? AND created_at > ?",
+            (scope, time.time() - self.ttl),
+        ).fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._parents = np.array([row[1] for row in rows], dtype=np.int64)
+        self._created = np.array([row[2] for row in rows], dtype=np.float64)
+        self._embeddings = (
+            np.stack([np.frombuffer(row[3], dtype="<f4") for row in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def lookup(self, scope: str, parent_id: int, key: str, embedding: np.ndarray) -> Optional[CachedResponse]:
+        """
+        La respuesta guardada para el prompt `key` después de la entrada `parent_id`,
+        si alguna supera el umbral de similitud y sigue vigente.
+        """
+        with self._lock:
+            self._refresh(scope)
+            row = None
+            if len(self._ids) and self._embeddings.shape[1] == len(embedding):
+                similarities = self._embeddings @ np.asarray(embedding, dtype=np.float32)
+                similarities[(self._parents != parent_id) | (self._created <= time.time() - self.ttl)] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row = self._db.execute(
+                        "SELECT id, key, response, generation_seconds FROM responses WHERE id = ?", (int(self._ids[best]),)
+                    ).fetchone()
+            if row is None or _NUMBER_RE.findall(row[1]) != _NUMBER_RE.findall(key):
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE id = ?", (time.time(), row[0]))
+            self.hits += 1
+            self.saved_seconds += row[3]
+            return CachedResponse(row[0], row[2], float(similarities[best]), row[3])
+
+    def put(
+        self, scope: str, parent_id: int, key: str, embedding: np.ndarray, response: str, generation_seconds: float
+    ) -> int:
+        """
+        Guarda la respuesta al prompt `key` después de la entrada `parent_id` y descarta
+        las caducadas, las que excedan `max_entries` y las que quedaron sin padre.
+        Devuelve el id de la entrada nueva.
+        """
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN")
+                cursor = self._db.execute(
+                    "INSERT INTO responses "
+                    "(scope, parent_id, key, embedding, response, generation_seconds, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (scope, parent_id, key, np.asarray(embedding, dtype="<f4").tobytes(), response, generation_seconds, now, now),
+                )
+                self._db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM responses WHERE id IN "
+                    "(SELECT id FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE parent_id != ? AND parent_id NOT IN (SELECT id FROM responses)", (ROOT,)
+                )
+            # Las escrituras propias no cambian data_version: se fuerza la relectura
+            self._loaded = None
+            return cursor.lastrowid
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": len(self),
+        }
+
+    def close(self):
+        self._db.close()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Instancia compartida de la caché de respuestas, o None si está desactivada."""
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ResponseCache()
+                except sqlite3.Error as e:
+                    logger.error("No se pudo abrir la caché de respuestas (%s): %s", RESPONSE_CACHE_PATH, e)
+                    return None
+    return _cache
@@ -0,0 +1,102 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# Entradas máximas y segundos de vida de la caché de búsquedas.
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 2048))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", 6 * 3600))
+
+_SPACES_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " .,;:!?¡¿\"'()"
+
+
+def normalize_query(query: str) -> str:
+    """Clave de la caché: minúsculas, espacios colapsados y sin puntuación en los extremos."""
+    return _SPACES_RE.sub(" ", query.lower()).strip(_EDGE_PUNCTUATION)
+
+
+class _Entry:
+    __slots__ = ("embedding", "ids", "expires_at")
+
+    def __init__(self, embedding: np.ndarray, ids: list[int], expires_at: float):
+        self.embedding = embedding
+        self.ids = ids
+        self.expires_at = expires_at
+
+
+class RetrievalCache:
+    """
+    Caché LRU con caducidad de las búsquedas: para cada consulta normalizada guarda
+    su embedding y los ids de los fragmentos encontrados.
+
+    Las entradas pertenecen a una versión del índice; `set_version()` con una
+    versión distinta (el índice se reconstruyó) vacía la caché.
+    """
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set_version(self, version: Optional[str]):
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def get(self, query: str, top_k: int) -> Optional[list[int]]:
+        """Ids de los `top_k` fragmentos de la consulta, o None si no hay una entrada válida."""
+        entry = self._lookup(normalize_query(query))
+        if entry is None or len(entry.ids) < top_k:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.ids[:top_k]
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Embedding guardado de la consulta (sirve aunque se pidan más resultados que antes)."""
+        entry = self._lookup(normalize_query(query))
+        return entry.embedding if entry else None
+
+    def put(self, query: str, embedding: np.ndarray, ids: list[int], version: Optional[str]):
+        with self._lock:
+            # Resultados de una versión anterior del índice ya no se guardan
+            if version != self.version:
+                return
+            key = normalize_query(query)
+            self._entries[key] = _Entry(embedding, ids, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "version": self.version,
+        }
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
@@ -0,0 +1,470 @@
+import os
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+
+from services.settings import CACHE_FOLDER
+from services.chunking import format_chunk
+from services.chunk_store import ChunkStore
+from services.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from services.reranker import RERANK_CANDIDATES, RERANK_ENABLED, Reranker
+from services.embedding_batcher import MicroBatcher
+from services.retrieval_cache import RetrievalCache
+from services.metrics import metrics
+from services.embeddings import EMBEDDING_BACKEND, EMBEDDING_MODEL, load_embedding_model
+from services.scout_metadata import SearchFilter
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_UNAVAILABLE = "El sistema de búsqueda de contexto no está disponible."
+
+# Micro-lotes de consultas: cuántas se juntan como máximo y cuánto se espera por más.
+# Con EMBEDDING_BATCH_SIZE=1 cada consulta se procesa sola.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 2))
+# Cada cuántos segundos se revisa si `preprocess_files.py` generó una versión nueva del índice.
+INDEX_VERSION_CHECK_INTERVAL = float(os.getenv("INDEX_VERSION_CHECK_INTERVAL", 10))
+
+# Búsqueda híbrida: candidatos que aporta cada método (embeddings y BM25) antes de
+# combinarlos con Reciprocal Rank Fusion. RRF_K suaviza el peso de los primeros lugares.
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+RRF_K = 60
+
+# Con INDEX_MMAP=1 el índice FAISS se abre con mmap: los procesos comparten sus páginas
+# y solo se cargan las que se consultan. Con 0 se lee completo a memoria.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") != "0"
+
+# Con METADATA_FILTERS=1 las búsquedas con filtro (sección, progresión, insignia de la
+# conversación) solo consideran los fragmentos compatibles. Si el filtro deja menos de
+# MIN_FILTERED_CANDIDATES fragmentos, se relaja (sin insignia, luego sin progresión...).
+METADATA_FILTERS = os.getenv("METADATA_FILTERS", "1") != "0"
+MIN_FILTERED_CANDIDATES = int(os.getenv("MIN_FILTERED_CANDIDATES", 20))
+# Conjuntos de candidatos (uno por filtro distinto) que se conservan armados
+CANDIDATE_SETS_SIZE = 256
+
+INDEX_FILE = "context.faiss"
+CHUNKS_FILE = "chunks.bin"
+INDEX_META_FILE = "index_meta.json"
+
+
+class _Corpus(NamedTuple):
+    """Índice y fragmentos de una misma versión; se reemplazan juntos al recargar."""
+    index: Any
+    # `ChunkStore`: fragmentos por id, con mmap
+    chunks: Any
+    version: str
+    # True si el índice guarda embeddings normalizados (producto interno = coseno)
+    normalized: bool = False
+    # Índice BM25 (`LexicalIndex`); None en índices generados antes de existir
+    lexical: Any = None
+    # Tipo de índice y parámetros de búsqueda (nprobe, efSearch) de `index_meta.json`
+    index_type: Optional[str] = None
+    search_params: Optional[dict] = None
+
+
+class _Candidates:
+    """Fragmentos que deja pasar un filtro: sus ids y los parámetros de FAISS que restringen la búsqueda a ellos."""
+    __slots__ = ("search_filter", "ids", "selector", "params")
+
+    def __init__(self, faiss, corpus: _Corpus, search_filter: SearchFilter, ids: np.ndarray):
+        self.search_filter = search_filter
+        self.ids = ids
+        # Los parámetros solo guardan un puntero al selector: se conserva aquí para que no se libere
+        self.selector = faiss.IDSelectorBatch(ids)
+        search_params = corpus.search_params or {}
+        if corpus.index_type in ("ivf_flat", "ivf_pq"):
+            self.params = faiss.SearchParametersIVF(sel=self.selector, **search_params)
+        elif corpus.index_type == "hnsw":
+            self.params = faiss.SearchParametersHNSW(sel=self.selector, **search_params)
+        else:
+            self.params = faiss.SearchParameters(sel=self.selector)
+
+
+# Marca de un filtro que deja muy pocos fragmentos (se relaja)
+_TOO_FEW = object()
+
+
+def _cache_query(query: str, search_filter: Optional[SearchFilter]) -> str:
+    # Los resultados de una consulta filtrada se guardan aparte de los de la misma consulta sin filtro
+    return query if search_filter is None else f"{query} [filtro {search_filter.key()}]"
+
+
+def read_index_meta(cache_folder: Path) -> dict:
+    """Contenido de `index_meta.json`, o un diccionario vacío si no existe."""
+    try:
+        return json.loads((cache_folder / INDEX_META_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _index_io_flags(faiss, index_type: Optional[str]) -> int:
+    """Banderas de `faiss.read_index` para abrir el índice con mmap según su tipo."""
+    if not INDEX_MMAP:
+        return 0
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # Mapea las listas invertidas
+        return faiss.IO_FLAG_MMAP
+    # Mapea los vectores de los índices planos y HNSW (no existe en versiones viejas de faiss)
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = RRF_K) -> list[int]:
+    """
+    Combina varias listas de ids ordenadas por relevancia: cada id suma 1 / (k + lugar)
+    por cada lista en la que aparece. No depende de la escala de los puntajes de cada método.
+    """
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def read_index_version(cache_folder: Path, meta: Optional[dict] = None) -> str:
+    """
+    Versión del índice escrita por `preprocess_files.py` en `index_meta.json`. Para
+    índices generados antes de existir ese archivo se usa la fecha y el tamaño del índice.
+    """
+    meta = read_index_meta(cache_folder) if meta is None else meta
+    if "version" in meta:
+        return meta["version"]
+    stat = (cache_folder / INDEX_FILE).stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class RetrievalEngine:
+    """
+    Búsqueda de contexto (RAG) sobre el índice FAISS y los fragmentos generados
+    por `preprocess_files.py`.
+
+    Nada se carga al crear el objeto: el índice, los fragmentos y el modelo de
+    embeddings se cargan en `warmup()`, que se puede llamar por adelantado (p. ej.
+    en un hilo al arrancar la app) o se ejecuta solo en la primera búsqueda.
+    Una misma instancia se comparte entre todas las sesiones y es segura para
+    usarse desde varios hilos: las consultas se encolan en un `MicroBatcher`, cuyo
+    hilo las codifica y busca por lotes.
+    """
+    def __init__(
+        self,
+        cache_folder: Path = CACHE_FOLDER,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        reranker: Optional[Reranker] = None,
+        embedding_backend: str = EMBEDDING_BACKEND,
+    ):
+        self._cache_folder = cache_folder
+        self._model_name = model_name
+        self._embedding_backend = embedding_backend
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loaded = False
+        self._error: Optional[str] = None
+        self._corpus: Optional[_Corpus] = None
+        self._model = None
+        self.cache = RetrievalCache()
+        # Segunda etapa opcional (cross-encoder); ver services/reranker.py
+        self.reranker = reranker if reranker is not None else (Reranker() if RERANK_ENABLED else None)
+        self._next_version_check = 0.0
+        self._reloading = False
+        self._batcher = MicroBatcher(self._search_batch, batch_size, batch_wait_ms, name="retrieval-batcher")
+        self._embedding_batcher = MicroBatcher(self._embed_batch, batch_size, batch_wait_ms, name="embedding-batcher")
+        # (versión, filtro) -> `_Candidates`, o None si el filtro deja muy pocos fragmentos.
+        # Solo los usa el hilo del MicroBatcher.
+        self._candidate_sets: dict[tuple[str, SearchFilter], Optional[_Candidates]] = {}
+        # False si esta versión de FAISS no acepta el selector en la búsqueda (antes de 1.7.4)
+        self._filtered_search = True
+
+    @property
+    def is_ready(self) -> bool:
+        """True cuando la carga terminó con éxito y las búsquedas ya no esperan."""
+        return self._ready.is_set()
+
+    @property
+    def error(self) -> Optional[str]:
+        """Mensaje del error de carga, si lo hubo."""
+        return self._error
+
+    def warmup(self) -> bool:
+        """
+        Carga el índice, los fragmentos y el modelo. Es idempotente: si otro hilo
+        ya está cargando, espera a que termine. Devuelve True si quedó listo.
+        """
+        if self._loaded:
+            return self.is_ready
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        return self.is_ready
+
+    def warmup_in_background(self) -> threading.Thread:
+        """Lanza `warmup()` en un hilo daemon y lo devuelve."""
+        thread = threading.Thread(target=self.warmup, name="retrieval-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            corpus = self._read_corpus()
+            # Con el backend torch aquí se importa torch; con onnx, solo ONNX Runtime
+            model = load_embedding_model(self._model_name, self._embedding_backend)
+            if self.reranker is not None:
+                try:
+                    self.reranker.load()
+                except Exception as e:
+                    # Sin cross-encoder la búsqueda sigue funcionando con el orden de la primera etapa
+                    logger.error("No se pudo cargar el modelo para reordenar (%s): %s", self.reranker.model_name, e)
+                    self.reranker = None
+
+            self._corpus, self._model = corpus, model
+            self.cache.set_version(corpus.version)
+            self._next_version_check = time.monotonic() + INDEX_VERSION_CHECK_INTERVAL
+            self._ready.set()
+            logger.info(
+                "Motor de búsqueda listo: %d fragmentos en %.1fs (embeddings con %s).",
+                len(corpus.chunks), time.perf_counter() - start, self._embedding_backend,
+            )
+        except Exception as e:
+            self._error = str(e)
+            logger.error("No se pudo cargar el motor de búsqueda: %s", e)
+        finally:
+            self._loaded = True
+
+    def _read_corpus(self) -> _Corpus:
+        import faiss
+
+        meta = read_index_meta(self._cache_folder)
+        version = read_index_version(self._cache_folder, meta)
+        index = faiss.read_index(str(self._cache_folder / INDEX_FILE), _index_io_flags(faiss, meta.get("index_type")))
+        if not (self._cache_folder / CHUNKS_FILE).exists():
+            # Los índices anteriores guardaban los fragmentos en chunks.pkl, que ya no se lee
+            raise FileNotFoundError(
+                f"No existe {self._cache_folder / CHUNKS_FILE}; ejecuta `preprocess_files.py` para generarlo."
+            )
+        chunks = ChunkStore(self._cache_folder / CHUNKS_FILE)
+        if not len(chunks):
+            raise ValueError("El archivo de fragmentos está vacío.")
+        lexical_path = self._cache_folder / LEXICAL_INDEX_FILE
+        lexical = LexicalIndex(lexical_path) if lexical_path.exists() else None
+
+        # nprobe (IVF) o efSearch (HNSW), tal como los guardó `preprocess_files.py`
+        search_params = meta.get("search_params") or {}
+        if search_params:
+            faiss.ParameterSpace().set_index_parameters(
+                index, ",".join(f"{name}={value}" for name, value in search_params.items())
+            )
+        return _Corpus(
+            index, chunks, version, bool(meta.get("normalized")), lexical, meta.get("index_type"), search_params,
+        )
+
+    def _check_index_version(self):
+        """
+        Si el índice en disco cambió de versión, vacía la caché de inmediato y lo
+        recarga en segundo plano (mientras tanto se sigue buscando en el anterior).
+        """
+        now = time.monotonic()
+        if not self.is_ready or now < self._next_version_check or self._reloading:
+            return
+        self._next_version_check = now + INDEX_VERSION_CHECK_INTERVAL
+        try:
+            version = read_index_version(self._cache_folder)
+        except OSError:
+            return
+        if version != self._corpus.version:
+            self._reloading = True
+            self.cache.set_version(version)
+            threading.Thread(target=self._reload, name="retrieval-reload", daemon=True).start()
+
+    def _reload(self):
+        try:
+            corpus = self._read_corpus()
+            self._corpus = corpus
+            self.cache.set_version(corpus.version)
+            logger.info("Índice recargado (versión %s): %d fragmentos.", corpus.version, len(corpus.chunks))
+        except Exception as e:
+            logger.error("No se pudo recargar el índice: %s", e)
+        finally:
+            self._reloading = False
+
+    def submit_search(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> Future:
+        """
+        Encola una búsqueda y devuelve un `Future` con la lista de fragmentos.
+        Desde código async se puede esperar con `asyncio.wrap_future`. Las consultas
+        que ya están en la caché se resuelven al momento, sin pasar por el modelo.
+        Con `search_filter` solo se buscan los fragmentos de esa sección, progresión
+        e insignia (ver services/scout_metadata.py).
+        """
+        if not METADATA_FILTERS or search_filter is None or search_filter.is_empty:
+            search_filter = None
+        self._check_index_version()
+        corpus = self._corpus
+        if corpus is not None:
+            ids = self.cache.get(_cache_query(query, search_filter), top_k)
+            if ids is not None:
+                future: Future = Future()
+                future.set_result([format_chunk(corpus.chunks[i]) for i in ids])
+                return future
+        return self._batcher.submit((query, top_k, search_filter))
+
+    def search(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> list[str]:
+        """Devuelve los `top_k` fragmentos más parecidos a la consulta, con su archivo y página."""
+        return self.submit_search(query, top_k, search_filter).result()
+
+    def submit_embedding(self, text: str) -> Future:
+        """
+        Encola el cálculo del embedding normalizado de `text` (lo usa la caché de
+        respuestas) y devuelve un `Future` con el vector.
+        """
+        return self._embedding_batcher.submit(text)
+
+    def _embed_batch(self, texts: list[str]) -> list[np.ndarray]:
+        if not self.warmup():
+            raise RuntimeError(self._error or "El motor de búsqueda no está disponible.")
+        return list(self._model.encode(texts, batch_size=len(texts), normalize_embeddings=True))
+
+    def _candidates(self, corpus: _Corpus, search_filter: Optional[SearchFilter]) -> Optional[_Candidates]:
+        """
+        Fragmentos a los que se restringe la búsqueda con el filtro, o None si se busca
+        en todo el índice (sin filtro, índice sin etiquetas o filtro que no descarta nada).
+        """
+        if search_filter is None or not corpus.chunks.has_tags or not self._filtered_search:
+            return None
+        import faiss
+
+        while search_filter is not None:
+            key = (corpus.version, search_filter)
+            if key not in self._candidate_sets:
+                if len(self._candidate_sets) >= CANDIDATE_SETS_SIZE:
+                    self._candidate_sets.clear()
+                ids = corpus.chunks.matching_ids(search_filter.tags())
+                if len(ids) == len(corpus.chunks):
+                    candidates = None
+                elif len(ids) >= MIN_FILTERED_CANDIDATES:
+                    candidates = _Candidates(faiss, corpus, search_filter, ids)
+                else:
+                    candidates = _TOO_FEW
+                self._candidate_sets[key] = candidates
+            candidates = self._candidate_sets[key]
+            if candidates is not _TOO_FEW:
+                return candidates
+            search_filter = search_filter.relaxed()
+        return None
+
+    def _search_batch(self, requests: list[tuple[str, int, Optional[SearchFilter]]]) -> list[list[str]]:
+        """
+        Codifica todas las consultas en una pasada y las busca con una llamada a FAISS
+        por cada filtro distinto del lote (restringida a los fragmentos que el filtro
+        deja pasar). Si hay índice BM25, cada consulta también se busca por palabras y
+        ambas listas se combinan con `reciprocal_rank_fusion`: así no se pierden
+        coincidencias exactas (nombres de insignias, juegos) que los embeddings a veces
+        no priorizan.
+        """
+        if not self.warmup():
+            return [[] for _ in requests]
+        corpus = self._corpus
+        cache_queries = [_cache_query(query, search_filter) for query, _, search_filter in requests]
+
+        # Las consultas con embedding en caché (pero que piden más resultados) no se recodifican
+        embeddings = [self.cache.get_embedding(key) for key in cache_queries]
+        pending = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if pending:
+            with metrics.span("embed"):
+                encoded = self._model.encode(
+                    [requests[i][0] for i in pending], batch_size=len(pending), normalize_embeddings=corpus.normalized
+                )
+            for i, embedding in zip(pending, encoded):
+                embeddings[i] = embedding
+
+        reranker = self.reranker
+        depth = max(top_k for _, top_k, _ in requests)
+        if corpus.lexical is not None:
+            depth = max(depth, HYBRID_CANDIDATES)
+        if reranker is not None:
+            depth = max(depth, RERANK_CANDIDATES)
+
+        candidates = [self._candidates(corpus, search_filter) for _, _, search_filter in requests]
+        groups: dict[Optional[_Candidates], list[int]] = {}
+        for i, group in enumerate(candidates):
+            groups.setdefault(group, []).append(i)
+        indices: list = [None] * len(requests)
+        for group, rows in groups.items():
+            queries = np.asarray([embeddings[i] for i in rows], dtype="float32")
+            with metrics.span("faiss_search", filtered="no" if group is None else "yes"):
+                try:
+                    _, found = corpus.index.search(queries, depth, params=None if group is None else group.params)
+                except RuntimeError as e:
+                    if group is None:
+                        raise
+                    # Antes de FAISS 1.7.4, IndexIDMap2 rechaza los parámetros ("search params
+                    # not supported for this index"): se busca sin filtro de aquí en adelante
+                    logger.warning("FAISS no permite filtrar la búsqueda (%s); se buscará en todo el índice.", e)
+                    self._filtered_search = False
+                    self._candidate_sets.clear()
+                    _, found = corpus.index.search(queries, depth)
+                    for i in rows:
+                        candidates[i] = None
+            for i, row in zip(rows, found):
+                indices[i] = row
+
+        rankings = []
+        with metrics.span("lexical_fusion"):
+            for (query, _, _), row, group in zip(requests, indices, candidates):
+                # FAISS devuelve -1 cuando hay menos resultados que los pedidos
+                ids = [int(i) for i in row if i >= 0]
+                if corpus.lexical is not None:
+                    allowed = None if group is None else group.ids
+                    lexical_ids = [chunk_id for chunk_id, _ in corpus.lexical.search(query, depth, allowed)]
+                    ids = reciprocal_rank_fusion([ids, lexical_ids])
+                rankings.append(ids)
+
+        reranked: list[Optional[list[int]]] = [None] * len(requests)
+        if reranker is not None:
+            texts = [[(i, corpus.chunks[i].text) for i in ids[:RERANK_CANDIDATES]] for ids in rankings]
+            with metrics.span("rerank") as span:
+                reranked = reranker.rerank(corpus.version, [query for query, _, _ in requests], texts)
+                span.tag(fallback="yes" if None in reranked else "no")
+
+        results = []
+        for (_, top_k, _), key, embedding, ids, order in zip(requests, cache_queries, embeddings, rankings, reranked):
+            ids = (order if order is not None else ids)[:top_k]
+            # Si el reordenamiento no llegó a tiempo no se guarda en caché: la próxima vez sí estará listo
+            if reranker is None or order is not None:
+                self.cache.put(key, embedding, ids, corpus.version)
+            results.append([format_chunk(corpus.chunks[i]) for i in ids])
+        return results
+
+    def find_relevant_context(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> str:
+        """Igual que `search`, pero devuelve el texto listo para el prompt."""
+        relevant_chunks = self.search(query, top_k, search_filter)
+        if not self.is_ready:
+            return CONTEXT_UNAVAILABLE
+        return "\n---\n".join(relevant_chunks)
+
+
+_engine: Optional[RetrievalEngine] = None
+_engine_lock = threading.Lock()
+
+def get_retrieval_engine() -> RetrievalEngine:
+    """
+    Devuelve la instancia compartida del motor de búsqueda (una por proceso). Con
+    RETRIEVAL_SOCKET (varios workers, ver `serve.py`) es un cliente del sidecar que
+    tiene el modelo y el índice, con la misma interfaz.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                socket_path = os.getenv("RETRIEVAL_SOCKET")
+                if socket_path:
+                    from services.retrieval_sidecar import RetrievalClient
+                    _engine = RetrievalClient(socket_path)
+                else:
+                    _engine = RetrievalEngine()
+    return _engine
@@ -0,0 +1,259 @@
+"""
+Proceso aparte que es dueño del modelo de embeddings y del índice, para el modo de
+varios workers web (ver `serve.py`). Los workers se conectan por un socket Unix con
+`RetrievalClient`, así que solo este proceso carga torch y el modelo, y las
+consultas de todos los workers se agrupan en los mismos micro-lotes.
+
+Los mensajes van con pickle, así que el socket se crea en una carpeta privada (0700)
+y cada conexión se autentica con la clave de RETRIEVAL_AUTHKEY, que `serve.py`
+genera al arrancar y hereda a los workers:
+
+    RETRIEVAL_AUTHKEY=... python -m services.retrieval_sidecar
+"""
+import os
+import sys
+import stat
+import tempfile
+import argparse
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Optional
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.scout_metadata import SearchFilter
+
+logger = logging.getLogger(__name__)
+
+# Carpeta privada del socket: en XDG_RUNTIME_DIR si existe (ya es del usuario) o en
+# el directorio temporal, con el uid en el nombre
+SOCKET_FOLDER = Path(os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()) / f"scout-retrieval-{os.getuid()}"
+DEFAULT_SOCKET = str(SOCKET_FOLDER / "retrieval.sock")
+# Cada cuántos segundos pregunta el cliente si el sidecar ya terminó de cargar
+STATUS_POLL_INTERVAL = 0.5
+
+# Resultado de una búsqueda cuando no se pudo hablar con el sidecar: sin contexto,
+# igual que el motor cuando no está cargado
+_NO_RESULTS: list = []
+_RAISE = object()
+
+
+def get_authkey() -> bytes:
+    """Clave compartida del sidecar y sus workers (RETRIEVAL_AUTHKEY)."""
+    authkey = os.getenv("RETRIEVAL_AUTHKEY")
+    if not authkey:
+        raise RuntimeError("Falta RETRIEVAL_AUTHKEY: el sidecar de búsqueda no acepta conexiones sin clave.")
+    return authkey.encode()
+
+
+def prepare_socket_folder(socket_path: str):
+    """
+    Crea la carpeta del socket con permisos 0700, o verifica que la existente sea del
+    usuario y nadie más tenga acceso. Así nadie más puede llegar al socket, ni
+    siquiera entre que se crea y se le cambian los permisos.
+    """
+    folder = Path(socket_path).parent
+    folder.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = folder.lstat()
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"La carpeta del socket '{folder}' no es privada (debe ser del usuario y con permisos 0700).")
+
+
+class RetrievalSidecar:
+    """
+    Atiende las peticiones de los workers con un `RetrievalEngine`. Cada conexión
+    tiene un hilo que lee peticiones (operación, id, argumentos) y las encola en el
+    motor; las respuestas se envían al completarse cada `Future`, en cualquier
+    orden, junto con el estado del motor.
+    """
+    def __init__(self, socket_path: str, authkey: bytes, engine=None):
+        from services.retrieval_engine import RetrievalEngine
+
+        self.socket_path = socket_path
+        self.authkey = authkey
+        self.engine = engine or RetrievalEngine()
+
+    def serve_forever(self):
+        prepare_socket_folder(self.socket_path)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        listener = Listener(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(self.socket_path, 0o600)
+        self.engine.warmup_in_background()
+        logger.info("Sidecar de búsqueda escuchando en %s", self.socket_path)
+        try:
+            while True:
+                try:
+                    # Con authkey, accept() rechaza a quien no conoce la clave antes de leer nada con pickle
+                    connection = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    logger.warning("Conexión rechazada en el sidecar de búsqueda: %s", e)
+                    continue
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_connection(self, connection: Connection):
+        send_lock = threading.Lock()
+
+        def reply(kind: str, request_id: int, payload: Any):
+            try:
+                with send_lock:
+                    connection.send((kind, request_id, payload, self.engine.is_ready, self.engine.error))
+            except (OSError, ValueError):
+                pass  # El worker se desconectó
+
+        def on_done(request_id: int, future: Future):
+            try:
+                reply("ok", request_id, future.result())
+            except Exception as e:
+                reply("error", request_id, str(e))
+
+        while True:
+            try:
+                operation, request_id, args = connection.recv()
+            except (EOFError, OSError):
+                break
+            if operation == "search":
+                future = self.engine.submit_search(*args)
+            elif operation == "embed":
+                future = self.engine.submit_embedding(*args)
+            elif operation == "status":
+                reply("ok", request_id, None)
+                continue
+            else:
+                reply("error", request_id, f"Operación desconocida: {operation}")
+                continue
+            future.add_done_callback(lambda f, request_id=request_id: on_done(request_id, f))
+        connection.close()
+
+
+class RetrievalClient:
+    """
+    Lo que usan `ChatController`, `ChatView` y `main.py` de `RetrievalEngine`, pero
+    atendido por el sidecar. Una sola conexión por proceso: las peticiones se envían
+    con un id y un hilo lector resuelve el `Future` de cada respuesta. Si el sidecar
+    no está disponible, las búsquedas devuelven una lista vacía (sin contexto).
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, authkey: Optional[bytes] = None):
+        self.socket_path = socket_path
+        self.authkey = authkey if authkey is not None else get_authkey()
+        self._lock = threading.Lock()
+        self._connection: Optional[Connection] = None
+        self._pending: dict[int, tuple[Future, Any]] = {}
+        self._ids = itertools.count()
+        self._ready = False
+        self._error: Optional[str] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._error
+
+    def _request(self, operation: str, args: tuple, fallback: Any = _RAISE) -> Future:
+        future: Future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = (future, fallback)
+        try:
+            with self._lock:
+                if self._connection is None:
+                    self._connection = Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+                    threading.Thread(
+                        target=self._read_responses, args=(self._connection,), name="retrieval-client", daemon=True
+                    ).start()
+                self._connection.send((operation, request_id, args))
+        except (OSError, EOFError, AuthenticationError) as e:
+            self._pending.pop(request_id, None)
+            self._fail(f"No se pudo conectar con el sidecar de búsqueda: {e}", [(future, fallback)])
+        return future
+
+    def _read_responses(self, connection: Connection):
+        while True:
+            try:
+                kind, request_id, payload, ready, error = connection.recv()
+            except (EOFError, OSError):
+                break
+            self._ready, self._error = ready, error
+            future, _ = self._pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            if kind == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+        # El sidecar se cayó: la próxima petición vuelve a conectarse
+        with self._lock:
+            if self._connection is connection:
+                self._connection = None
+        pending = [self._pending.pop(request_id) for request_id in list(self._pending)]
+        self._fail("Se perdió la conexión con el sidecar de búsqueda.", pending)
+
+    def _fail(self, message: str, requests: list[tuple[Future, Any]]):
+        # Queda como error del motor hasta que el sidecar vuelva a responder
+        if self._error != message:
+            logger.error(message)
+        self._ready, self._error = False, message
+        for future, fallback in requests:
+            if fallback is _RAISE:
+                future.set_exception(ConnectionError(message))
+            else:
+                future.set_result(fallback)
+
+    def submit_search(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> Future:
+        return self._request("search", (query, top_k, search_filter), fallback=_NO_RESULTS)
+
+    def search(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> list[str]:
+        return self.submit_search(query, top_k, search_filter).result()
+
+    def submit_embedding(self, text: str) -> Future:
+        return self._request("embed", (text,))
+
+    def warmup(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el sidecar termine de cargar (o falle). Devuelve True si quedó listo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready and not self._error:
+            try:
+                self._request("status", ()).result(timeout)
+            except Exception:
+                pass
+            if self._ready or self._error or (deadline is not None and time.monotonic() >= deadline):
+                break
+            time.sleep(STATUS_POLL_INTERVAL)
+        return self._ready
+
+    def warmup_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warmup, name="retrieval-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sidecar de búsqueda para el modo de varios workers.")
+    parser.add_argument("--socket", default=os.getenv("RETRIEVAL_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--cache", type=Path, default=None, help="Carpeta del índice (por defecto, la de la app).")
+    parser.add_argument("--model", default=None, help="Modelo de embeddings (por defecto, el de la app).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from services.metrics import start_metrics_exporters
+    from services.retrieval_engine import RetrievalEngine
+
+    # Las etapas de la búsqueda (embeddings, FAISS, BM25) se miden aquí, no en los workers
+    start_metrics_exporters()
+    engine_kwargs = {k: v for k, v in (("cache_folder", args.cache), ("model_name", args.model)) if v is not None}
+    RetrievalSidecar(args.socket, get_authkey(), RetrievalEngine(**engine_kwargs)).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import re
+from collections import Counter
+from typing import Iterable, NamedTuple, Optional
+
+from services.chunking import Chunk
+from services.lexical_index import fold_accents
+
+# Campos de las etiquetas de los fragmentos; cada etiqueta es "campo:valor" (p. ej. "section:tropa")
+FIELDS = ("section", "progression", "insignia")
+
+# Secciones con sus progresiones e insignias de aventura, las mismas que ofrece `prompt.txt`.
+# Cada valor lleva, además de su nombre, otros nombres con que aparece en los manuales (sin acentos).
+SCOUT_PROGRAM = {
+    "manada": {
+        "section": ("lobatos", "lobatas"),
+        "progression": {"raksha": (), "baloo": (), "hermano gris": (), "bagheera": ()},
+        "insignia": {"mowha": (), "dhak": (), "tregua del agua": (), "flor roja": ()},
+    },
+    "tropa": {
+        "section": (),
+        "progression": {"tortuga lora": (), "venado cola blanca": (), "quetzal": (), "ocelote": ()},
+        "insignia": {
+            "ajolote de xochimilco": ("ajolote",),
+            "jaguar": (),
+            "aguila solitaria": ("aguila",),
+            "mapache de cozumel": ("mapache",),
+        },
+    },
+    "comunidad": {
+        "section": ("caminantes",),
+        "progression": {"cima": (), "cumbre": (), "cuspide": (), "cenit": ()},
+        "insignia": {"terranova": (), "kon-tiki": ("kon tiki", "kontiki"), "discovery": (), "7 cumbres": ("siete cumbres",)},
+    },
+}
+# Nombres que también son palabras comunes ("servicio a la comunidad", "llegar a la cima"):
+# en un mensaje largo solo cuentan si empiezan con mayúscula
+AMBIGUOUS_NAMES = {"comunidad", "cima", "cumbre", "cenit", "aguila", "discovery"}
+# Un mensaje de hasta estas palabras se toma como respuesta a las preguntas del asistente
+SHORT_ANSWER_WORDS = 6
+# Sección de un documento sin sección en su nombre: la que aparece en al menos esta
+# fracción de sus fragmentos que mencionan alguna (y en un mínimo de fragmentos)
+DOCUMENT_SECTION_SHARE = 0.6
+DOCUMENT_SECTION_MIN_CHUNKS = 3
+
+
+class _Term(NamedTuple):
+    field: str
+    value: str
+    section: str
+
+
+def _terms() -> dict[str, _Term]:
+    names = {}
+    for section, program in SCOUT_PROGRAM.items():
+        for name in (section, *program["section"]):
+            names[name] = _Term("section", section, section)
+        for field in ("progression", "insignia"):
+            for value, aliases in program[field].items():
+                for name in (value, *aliases):
+                    names[name] = _Term(field, value, section)
+    return names
+
+
+_TERMS = _terms()
+TAG_NAMES = [f"{field}:{term.value}" for field in FIELDS for term in dict.fromkeys(_TERMS.values()) if term.field == field]
+
+
+def _pattern(names: Iterable[str], capitalized) -> re.Pattern:
+    # Los nombres más largos primero, para que "ajolote de xochimilco" gane sobre "ajolote"
+    parts = []
+    for name in sorted(names, key=len, reverse=True):
+        words = r"\s+".join(re.escape(word) for word in name.split())
+        if capitalized(name) and name[0].isalpha():
+            # Primera letra en mayúscula y el resto como venga ("Comunidad", "COMUNIDAD")
+            parts.append(f"{name[0].upper()}(?i:{words[1:]})")
+        else:
+            parts.append(f"(?i:{words})")
+    return re.compile(r"(?<!\w)(?:" + "|".join(parts) + r")(?!\w)")
+
+
+# En los manuales, todo nombre debe empezar con mayúscula; en la conversación, solo los ambiguos
+_DOCUMENT_RE = _pattern(_TERMS, lambda name: True)
+_MESSAGE_RE = _pattern(_TERMS, lambda name: name in AMBIGUOUS_NAMES)
+_ANSWER_RE = _pattern(_TERMS, lambda name: False)
+
+
+def tag_name(field: str, value: str) -> str:
+    return f"{field}:{value}"
+
+
+def find_terms(text: str, document: bool = False) -> list[_Term]:
+    """Secciones, progresiones e insignias que menciona el texto, en orden de aparición."""
+    folded = fold_accents(text)
+    if document:
+        pattern = _DOCUMENT_RE
+    else:
+        pattern = _ANSWER_RE if len(folded.split()) <= SHORT_ANSWER_WORDS else _MESSAGE_RE
+    return [_TERMS[" ".join(match.group().lower().split())] for match in pattern.finditer(folded)]
+
+
+def text_tags(text: str, document: bool = False) -> set[str]:
+    """Etiquetas de un texto; una progresión o insignia también etiqueta su sección."""
+    tags = set()
+    for term in find_terms(text, document):
+        tags.add(tag_name(term.field, term.value))
+        tags.add(tag_name("section", term.section))
+    return tags
+
+
+def _document_section(source: str, chunk_tags: list[set[str]]) -> Optional[str]:
+    # Primero el nombre del archivo ("Manual_de_Tropa.pdf")...
+    sections = {term.section for term in find_terms(re.sub(r"[_\-.]+", " ", source), document=False)}
+    if len(sections) == 1:
+        return sections.pop()
+    # ...y si no lo dice, la sección que predomina en sus fragmentos
+    counts = Counter(tag for tags in chunk_tags for tag in tags if tag.startswith("section:"))
+    mentioning = sum(1 for tags in chunk_tags if any(tag.startswith("section:") for tag in tags))
+    if counts:
+        tag, count = counts.most_common(1)[0]
+        if count >= DOCUMENT_SECTION_MIN_CHUNKS and count >= DOCUMENT_SECTION_SHARE * mentioning:
+            return tag.split(":", 1)[1]
+    return None
+
+
+def tag_chunks(chunks: dict[int, Chunk]) -> dict[int, set[str]]:
+    """
+    Etiquetas de cada fragmento: las secciones, progresiones e insignias que menciona
+    y la sección de su documento (de su nombre o de la que predomina en él), así que
+    un fragmento de un manual de Tropa que no nombra la sección también queda como Tropa.
+    Los fragmentos sin etiquetas son material general.
+    """
+    tags = {chunk_id: text_tags(chunk.text, document=True) for chunk_id, chunk in chunks.items()}
+    by_source: dict[str, list[int]] = {}
+    for chunk_id, chunk in chunks.items():
+        by_source.setdefault(chunk.source, []).append(chunk_id)
+    for source, ids in by_source.items():
+        section = _document_section(source, [tags[i] for i in ids])
+        if section is not None:
+            for i in ids:
+                tags[i].add(tag_name("section", section))
+    return tags
+
+
+class SearchFilter(NamedTuple):
+    """
+    Sección, progresión e insignia de la conversación con que se filtra la búsqueda
+    (None = sin filtrar por ese campo). Deja los fragmentos que tienen ese valor o no
+    tienen ninguno de ese campo (ver `ChunkStore.matching_ids`).
+    """
+    section: Optional[str] = None
+    progression: Optional[str] = None
+    insignia: Optional[str] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(self)
+
+    def tags(self) -> list[str]:
+        return [tag_name(field, value) for field, value in zip(FIELDS, self) if value]
+
+    def relaxed(self) -> Optional["SearchFilter"]:
+        """El mismo filtro sin su campo más específico (insignia, luego progresión); None si ya no queda nada."""
+        for field in reversed(FIELDS):
+            if getattr(self, field):
+                relaxed = self._replace(**{field: None})
+                return None if relaxed.is_empty else relaxed
+        return None
+
+    def key(self) -> str:
+        return "|".join(value or "" for value in self)
+
+
+def update_filter(current: SearchFilter, message: str) -> SearchFilter:
+    """
+    Actualiza el filtro con lo que dice un mensaje del usuario: lo último que se
+    menciona manda. Si cambia la sección, se olvidan la progresión y la insignia de
+    la sección anterior.
+    """
+    values = current._asdict()
+    for term in find_terms(message):
+        if values["section"] != term.section:
+            values = {"section": term.section, "progression": None, "insignia": None}
+        values[term.field] = term.value
+    return SearchFilter(**values)
+
+
+def filter_from_messages(messages: Iterable[str]) -> SearchFilter:
+    """Filtro de una conversación a partir de los mensajes del usuario, en orden."""
+    search_filter = SearchFilter()
+    for message in messages:
+        search_filter = update_filter(search_filter, message)
+    return search_filter
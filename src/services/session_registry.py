@@ -0,0 +1,108 @@
+import os
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se conserva una sesión desconectada (por si el navegador se reconecta)
+# antes de liberar su historial y sus controles.
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", 300))
+# Cada cuántos segundos revisa el recolector las sesiones inactivas.
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", 30))
+
+
+class _Session:
+    __slots__ = ("release", "disconnected_at")
+
+    def __init__(self, release: Callable[[], None]):
+        self.release = release
+        self.disconnected_at: Optional[float] = None
+
+
+class SessionRegistry:
+    """
+    Lleva la cuenta de las sesiones (páginas) conectadas y libera los recursos de
+    las que se desconectaron y no volvieron en `idle_timeout` segundos.
+
+    Cada sesión se registra con una función `release` que suelta lo que la sesión
+    tenga en memoria (historial del controlador, controles de la UI, etc.).
+    """
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT, sweep_interval: float = SESSION_SWEEP_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._sessions: dict[str, _Session] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def register(self, session_id: str, release: Callable[[], None]):
+        with self._lock:
+            self._sessions[session_id] = _Session(release)
+
+    def mark_connected(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session:
+            session.disconnected_at = None
+
+    def mark_disconnected(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session:
+            session.disconnected_at = time.monotonic()
+
+    def release(self, session_id: str):
+        """Libera una sesión de inmediato (p. ej. cuando Flet la cierra)."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session:
+            self._release(session_id, session)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Libera las sesiones desconectadas hace más de `idle_timeout`. Devuelve cuántas."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                (session_id, session) for session_id, session in self._sessions.items()
+                if session.disconnected_at is not None and now - session.disconnected_at >= self.idle_timeout
+            ]
+            for session_id, _ in expired:
+                del self._sessions[session_id]
+        for session_id, session in expired:
+            self._release(session_id, session)
+        return len(expired)
+
+    def start_reaper(self):
+        """Arranca (una sola vez) el hilo que ejecuta `sweep()` periódicamente."""
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_forever, name="session-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            released = self.sweep()
+            if released:
+                logger.info("Se liberaron %d sesiones inactivas; quedan %d.", released, len(self))
+
+    def _release(self, session_id: str, session: _Session):
+        try:
+            session.release()
+        except Exception as e:
+            logger.warning("Error al liberar la sesión %s: %s", session_id, e)
+
+
+_registry: Optional[SessionRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_session_registry() -> SessionRegistry:
+    """Devuelve el registro de sesiones del proceso."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = SessionRegistry()
+    return _registry
@@ -0,0 +1,123 @@
+import os
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from models.chat_model import Message
+from services.settings import CACHE_FOLDER
+from services.embedding_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Conversaciones guardadas para retomarlas al recargar la página o en otra réplica
+# (SESSION_STORE_PATH debe estar en un volumen compartido). Apagado por defecto.
+SESSION_STORE_ENABLED = os.getenv("SESSION_STORE_ENABLED", "0") == "1"
+SESSION_STORE_PATH = Path(os.getenv("SESSION_STORE_PATH", CACHE_FOLDER / "sessions.sqlite3"))
+# Cuánto se esperan más mensajes para escribirlos juntos, y cuántos como máximo por transacción
+SESSION_STORE_FLUSH_MS = float(os.getenv("SESSION_STORE_FLUSH_MS", 200))
+SESSION_STORE_BATCH_SIZE = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    message_type TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_session ON messages (session_id, id);
+"""
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # En modo WAL basta con sincronizar en los checkpoints
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class SessionStore:
+    """
+    Registro de solo agregar de los mensajes de cada conversación, en SQLite (WAL).
+
+    `append()` no toca la base: encola los mensajes en un `MicroBatcher`, cuyo hilo
+    los escribe en una sola transacción por lote (los que lleguen en
+    SESSION_STORE_FLUSH_MS). Las lecturas son por páginas desde el final, con el
+    índice (session_id, id), así que retomar una conversación no depende de su largo.
+    """
+    def __init__(self, path: Path = SESSION_STORE_PATH, flush_ms: float = SESSION_STORE_FLUSH_MS):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._reader = _connect(path)
+        self._reader.executescript(_SCHEMA)
+        self._reader_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None  # Solo la usa el hilo del batcher
+        self._batcher = MicroBatcher(self._write_batch, SESSION_STORE_BATCH_SIZE, flush_ms, name="session-store-writer")
+
+    def append(self, session_id: str, messages: Iterable[Message]):
+        """Encola los mensajes de la conversación para guardarlos; no espera a que se escriban."""
+        now = time.time()
+        for message in messages:
+            self._batcher.submit((session_id, message.message_type, message.user_name, message.text, now))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Espera a que se escriba todo lo encolado hasta ahora."""
+        self._batcher.submit(None).result(timeout)
+
+    def _write_batch(self, rows: list[Optional[tuple]]) -> list[None]:
+        if self._writer is None:
+            self._writer = _connect(self.path)
+        rows_to_write = [row for row in rows if row is not None]
+        if rows_to_write:
+            with self._writer:
+                self._writer.execute("BEGIN")
+                self._writer.executemany(
+                    "INSERT INTO messages (session_id, message_type, user_name, text, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows_to_write,
+                )
+        return [None] * len(rows)
+
+    def count(self, session_id: str) -> int:
+        with self._reader_lock:
+            return self._reader.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def load_before(self, session_id: str, before_id: Optional[int], limit: int) -> list[tuple[int, Message]]:
+        """
+        Hasta `limit` mensajes de la conversación anteriores al id `before_id` (o los
+        últimos, si es None), en orden, como (id, mensaje).
+        """
+        query = "SELECT id, user_name, text, message_type FROM messages WHERE session_id = ?"
+        params: tuple = (session_id,)
+        if before_id is not None:
+            query += " AND id < ?"
+            params += (before_id,)
+        with self._reader_lock:
+            rows = self._reader.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [(row[0], Message(row[1], row[2], row[3])) for row in reversed(rows)]
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> Optional[SessionStore]:
+    """Instancia compartida del almacén de conversaciones, o None si está desactivado."""
+    global _store
+    if not SESSION_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = SessionStore()
+                    # Lo que quede en cola al salir del proceso no se pierde
+                    atexit.register(_store.flush, 5)
+                except sqlite3.Error as e:
+                    logger.error("No se pudo abrir el almacén de conversaciones (%s): %s", SESSION_STORE_PATH, e)
+                    return None
+    return _store
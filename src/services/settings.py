@@ -0,0 +1,30 @@
+import logging
+from functools import lru_cache
+from pathlib import Path
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# --- RUTAS DEL PROYECTO ---
+ROOT_FOLDER = Path(__file__).parent.parent.parent
+CACHE_FOLDER = ROOT_FOLDER / 'cache'
+PROMPT_PATH = ROOT_FOLDER / 'prompt.txt'
+ENV_PATH = ROOT_FOLDER / '.env'
+
+DEFAULT_PROMPT = "Eres un asistente servicial."
+
+# Cargar variables de entorno (es barato, así que se hace al importar para que
+# cualquier os.getenv posterior ya vea los valores del archivo .env)
+try:
+    load_dotenv(dotenv_path=ENV_PATH)
+except Exception as e:
+    logger.warning("No se pudo cargar el archivo .env: %s", e)
+
+@lru_cache(maxsize=1)
+def get_base_prompt() -> str:
+    """Lee `prompt.txt` la primera vez que se necesita y lo conserva en memoria."""
+    try:
+        return PROMPT_PATH.read_text(encoding='utf-8')
+    except Exception as e:
+        logger.warning("No se pudo cargar el prompt (%s). Se usará uno por defecto.", e)
+        return DEFAULT_PROMPT
@@ -0,0 +1,43 @@
+import re
+
+# Aproximación local del tokenizador BPE del modelo: cada palabra cuenta como un
+# token por cada ~4 caracteres y cada signo de puntuación como uno. No es exacto,
+# pero sirve para presupuestar el prompt sin depender de la API.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+CHARS_PER_TOKEN = 4
+
+def count_tokens(text: str) -> int:
+    """Estima cuántos tokens ocupa `text`."""
+    if not text:
+        return 0
+    return sum((len(piece) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN for piece in _TOKEN_RE.findall(text))
+
+def split_by_tokens(text: str, max_tokens: int) -> list[str]:
+    """
+    Corta `text` en trozos de hasta `max_tokens` tokens (según `count_tokens`), entre
+    palabras o signos. Una palabra que sola pasa del límite (p. ej. una línea de
+    puntos o una URL) se corta por caracteres.
+    """
+    max_tokens = max(1, max_tokens)
+    pieces: list[str] = []
+    start, used = 0, 0
+    for match in _TOKEN_RE.finditer(text):
+        begin, end = match.span()
+        while True:
+            tokens = (end - begin + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+            if used + tokens <= max_tokens:
+                used += tokens
+                break
+            if used:
+                pieces.append(text[start:begin])
+                start, used = begin, 0
+                continue
+            begin = begin + max_tokens * CHARS_PER_TOKEN
+            pieces.append(text[start:begin])
+            start = begin
+    pieces.append(text[start:])
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+def count_message_tokens(messages: list[dict]) -> int:
+    """Estima los tokens de una lista de mensajes (incluye ~4 por mensaje de formato)."""
+    return sum(count_tokens(m["content"]) + 4 for m in messages)
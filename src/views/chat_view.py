@@ -1,8 +1,30 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
 import flet as ft
-from models.chat_model import Message
+from models.chat_model import ChatTranscript, Message
 from components.message_component import ChatMessage
 from controllers.chat_controller import ChatController
 from components.app_bar import main_app_bar
+from services.retrieval_engine import get_retrieval_engine
+from services.metrics import metrics
+from services.session_store import SessionStore, get_session_store
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos se refresca la página mientras llega una respuesta en streaming.
+# Agrupa varios tokens en una sola actualización en lugar de enviar una por token.
+STREAM_UPDATE_INTERVAL = 0.1
+# Cada cuántos segundos se revisa si el motor de búsqueda ya terminó de cargar.
+ENGINE_STATUS_POLL_INTERVAL = 0.5
+# Mensajes que se mantienen como controles en la página; los anteriores se quitan y
+# se vuelven a mostrar (de OLDER_MESSAGES_PAGE en OLDER_MESSAGES_PAGE) a petición.
+CHAT_WINDOW_SIZE = max(2, int(os.getenv("CHAT_WINDOW_SIZE", 40)))
+OLDER_MESSAGES_PAGE = 20
+# Clave del almacenamiento local del navegador con el id de la conversación guardada
+CONVERSATION_ID_KEY = "scout.conversation_id"
 
 class ChatView(ft.View):
     def __init__(self, page: ft.Page):
@@ -10,9 +32,18 @@ class ChatView(ft.View):
         self.page = page
         self.route = "/chat"
         self.controller = ChatController()
+        self._pending_task = None  # Tarea de la respuesta en curso (para poder cancelarla)
+        self.transcript = ChatTranscript()
+        self._first_shown = 0  # Posición en `transcript` del primer mensaje con control en la página
 
         # UI Controls
         self.chat_list = ft.ListView(expand=True, spacing=10, auto_scroll=True)
+        self.load_older_button = ft.TextButton(
+            "Mostrar mensajes anteriores",
+            icon=ft.Icons.HISTORY,
+            visible=False,
+            on_click=self.load_older_click,
+        )
         self.new_message_field = ft.TextField(
             hint_text="Escribe tu mensaje...",
             autofocus=True,
@@ -24,10 +55,20 @@ class ChatView(ft.View):
             on_submit=self.send_message_click,
         )
 
+        # Aviso mientras el modelo de embeddings y el índice se cargan en segundo plano
+        self.engine_status = ft.Row(
+            [
+                ft.ProgressRing(width=16, height=16, stroke_width=2),
+                ft.Text("Cargando la base de conocimiento Scout...", size=12),
+            ],
+            visible=not get_retrieval_engine().is_ready,
+        )
+
         self.controls = [
             main_app_bar(),
+            self.engine_status,
             ft.Container(
-                content=self.chat_list,
+                content=ft.Column([self.load_older_button, self.chat_list], spacing=0, expand=True),
                 border=ft.border.all(1, ft.Colors.OUTLINE),
                 border_radius=5,
                 padding=10,
@@ -46,31 +87,151 @@ class ChatView(ft.View):
         ]
         # Iniciar con un mensaje de bienvenida
         self.add_message("bot_message", "Scout Program Builder", "¡Hola! Para comenzar, escribe algo como 'Quiero empezar a diseñar un programa'.")
+        self._engine_status_task = None
+        if self.engine_status.visible:
+            self.page.run_task(self._watch_engine_status)
+        store = get_session_store()
+        if store is not None:
+            # El campo se habilita al terminar de retomar la conversación, para no mezclarla con una nueva
+            self.new_message_field.disabled = True
+            self.page.run_task(self._resume_conversation, store)
 
-    def send_message_click(self, e):
+    async def _resume_conversation(self, store: SessionStore):
+        """
+        Retoma la conversación guardada de este navegador (su id está en el
+        almacenamiento local), o crea una nueva. Solo se cargan los últimos mensajes.
+        """
+        try:
+            conversation_id = await self.page.client_storage.get_async(CONVERSATION_ID_KEY)
+            if not conversation_id:
+                conversation_id = uuid.uuid4().hex
+                await self.page.client_storage.set_async(CONVERSATION_ID_KEY, conversation_id)
+            messages = await asyncio.to_thread(self.transcript.resume, store, conversation_id, CHAT_WINDOW_SIZE)
+            if messages:
+                self.controller.restore(messages)
+                self.chat_list.controls = [ChatMessage(message) for message in messages]
+                self._first_shown = len(self.transcript) - len(messages)
+                self.load_older_button.visible = self._first_shown > 0
+        except Exception as e:
+            logger.error("No se pudo retomar la conversación guardada: %s", e)
+        finally:
+            self.new_message_field.disabled = False
+            self.page.update()
+
+    async def _watch_engine_status(self):
+        """Oculta el aviso de carga cuando el motor de búsqueda está listo (o informa si falló)."""
+        self._engine_status_task = asyncio.current_task()
+        engine = get_retrieval_engine()
+        while not engine.is_ready and not engine.error:
+            await asyncio.sleep(ENGINE_STATUS_POLL_INTERVAL)
+        if engine.error:
+            self.engine_status.controls = [
+                ft.Icon(ft.Icons.WARNING_AMBER_ROUNDED, size=16, color=ft.Colors.AMBER),
+                ft.Text("La base de conocimiento no está disponible; se responderá sin contexto.", size=12),
+            ]
+        else:
+            self.engine_status.visible = False
+        self.page.update()
+
+    async def send_message_click(self, e):
         user_message = self.new_message_field.value
-        if user_message.strip() == "":
+        if user_message.strip() == "" or self._pending_task:
             return
 
-        # Limpiar el campo de texto y deshabilitar mientras se procesa
-        self.new_message_field.value = ""
-        self.new_message_field.disabled = True
-        self.page.update()
+        clicked = time.perf_counter()
+        # Limpiar y deshabilitar el campo, mostrar el mensaje del usuario y la burbuja
+        # (vacía) de la respuesta: todo en una sola actualización de la página
+        with metrics.span("ui_prepare"):
+            self.new_message_field.value = ""
+            self.new_message_field.disabled = True
+            user_chat_message = self.add_message("user_message", "Tú", user_message)
+            bot_message = self.add_message("bot_message", "Scout Program Builder", "")
+            self.page.update()
 
-        # Mostrar mensaje del usuario
-        self.add_message("user_message", "Tú", user_message)
+        # La respuesta corre en su propia tarea para poder cancelarla sin afectar a Flet
+        self._pending_task = asyncio.create_task(self._stream_response(bot_message, user_message, clicked))
+        try:
+            await self._pending_task
+        except asyncio.CancelledError:
+            return
+        finally:
+            self._pending_task = None
+            # Reactivar el campo de texto (también si se canceló, para cuando el usuario regrese)
+            self.new_message_field.disabled = False
+
+        # Como en el historial del controlador, un turno cancelado o con error no se guarda
+        # (al retomar la conversación, el texto del error volvería al modelo como respuesta)
+        if self.controller.last_error is None:
+            self.transcript.persist(user_chat_message.message, bot_message.message)
+        with metrics.span("ui_finish"):
+            self.page.update()
+        self.new_message_field.focus()
+        metrics.record("ui_turn", time.perf_counter() - clicked)
 
-        # Obtener y mostrar respuesta de la IA
-        ai_response = self.controller.get_ai_response(user_message)
-        self.add_message("bot_message", "Scout Program Builder", ai_response)
+    async def _stream_response(self, bot_message: ChatMessage, user_message: str, clicked: float):
+        # Mostrar la respuesta de la IA conforme va llegando. Solo cambia la burbuja de
+        # la respuesta, así que solo se actualiza ella (sin recorrer toda la página);
+        # el texto final se envía con la actualización que reactiva el campo.
+        last_update = time.monotonic()
+        first_update = True
+        async for delta in self.controller.stream_ai_response(user_message):
+            bot_message.append_text(delta)
+            now = time.monotonic()
+            if now - last_update >= STREAM_UPDATE_INTERVAL:
+                with metrics.span("ui_stream_update"):
+                    bot_message.update()
+                last_update = now
+                if first_update:
+                    # Desde el clic hasta que el usuario ve el primer texto de la respuesta
+                    metrics.record("ui_first_text", time.perf_counter() - clicked)
+                    first_update = False
 
-        # Reactivar el campo de texto
-        self.new_message_field.disabled = False
+    async def load_older_click(self, e):
+        """Vuelve a mostrar los mensajes anteriores a la ventana actual, una página a la vez."""
+        # Puede leer del almacén de conversaciones: fuera del event loop
+        older = await asyncio.to_thread(self.transcript.before, self._first_shown, OLDER_MESSAGES_PAGE)
+        self._first_shown -= len(older)
+        self.chat_list.controls[0:0] = [ChatMessage(message) for message in older]
+        self.load_older_button.visible = self._first_shown > 0
+        # Sin esto la lista saltaría al final en lugar de quedarse donde el usuario está leyendo
+        self.chat_list.auto_scroll = False
         self.page.update()
-        self.new_message_field.focus()
 
+    def cancel_pending(self):
+        """
+        Cancela la respuesta en curso, si la hay. Se usa cuando el usuario sale de
+        /chat o se desconecta. Puede llamarse desde cualquier hilo.
+        """
+        self._cancel_task(self._pending_task)
 
-    def add_message(self, msg_type: str, user_name: str, text: str):
+    def _cancel_task(self, task: asyncio.Task):
+        if task and not task.done():
+            self.page.loop.call_soon_threadsafe(task.cancel)
+
+    def dispose(self):
+        """Libera el historial y los controles de la conversación al cerrar la sesión."""
+        self.cancel_pending()
+        self._cancel_task(self._engine_status_task)
+        self.controller.clear()
+        self.transcript.clear()
+        self._first_shown = 0
+        self.chat_list.controls.clear()
+
+
+    def add_message(self, msg_type: str, user_name: str, text: str) -> ChatMessage:
+        """
+        Agrega el mensaje a la conversación y su control al final de la lista, y quita
+        los controles que quedan fuera de la ventana de CHAT_WINDOW_SIZE mensajes. No
+        llama a `update()`: quien lo use junta sus cambios en una sola actualización.
+        """
         message = Message(user_name=user_name, text=text, message_type=msg_type)
-        self.chat_list.controls.append(ChatMessage(message))
-        self.page.update()
+        self.transcript.append(message)
+        chat_message = ChatMessage(message)
+        self.chat_list.controls.append(chat_message)
+        self.chat_list.auto_scroll = True
+        overflow = len(self.chat_list.controls) - CHAT_WINDOW_SIZE
+        if overflow > 0:
+            del self.chat_list.controls[:overflow]
+            self._first_shown += overflow
+        self.load_older_button.visible = self._first_shown > 0
+        return chat_message